@@ -0,0 +1,30 @@
+import asyncio
+import os
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on one agent run before the request gives up with a 504
+AGENT_TIMEOUT_SECONDS = float(os.getenv("AGENT_TIMEOUT_SECONDS", "30"))
+
+# Agent runs allowed in flight per worker; extra requests wait their turn
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "32"))
+
+_agent_slots = asyncio.Semaphore(AGENT_MAX_CONCURRENCY)
+
+
+class AgentTimeoutError(Exception):
+    pass
+
+
+# Run the LangChain agent without blocking the event loop
+async def run_agent(agent, context: str, timeout: float = AGENT_TIMEOUT_SECONDS, callbacks: Optional[List] = None) -> str:
+    """Await the agent's async interface, bounded by a semaphore and a per-request timeout"""
+    async with _agent_slots:
+        try:
+            # Sync-only tools are pushed to the default executor by LangChain itself
+            return await asyncio.wait_for(agent.arun(context, callbacks=callbacks), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Agent run exceeded {timeout}s timeout")
+            raise AgentTimeoutError(f"Agent did not respond within {timeout:g}s")
@@ -0,0 +1,6 @@
+"""Load testing against the servers without an OpenAI key
+
+fake_llm provides deterministic stand-ins for ChatOpenAI and OpenAIEmbeddings
+(selected with LLM_BACKEND=fake); load_test boots an entry point on them and
+replays a scenario file concurrently.
+"""
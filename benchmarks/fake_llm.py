@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import math
+import os
+import re
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from intent_matcher import detect_intent
+
+# Delay before the first token, then the pace of the rest; roughly what gpt-4 feels like by default
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "40"))
+
+# Have the agent call CustomerLookup before answering, so tools and retrieval are exercised too
+FAKE_LLM_TOOL_CALLS = os.getenv("FAKE_LLM_TOOL_CALLS", "1") == "1"
+
+# Delay per embedding call (not per text), and vector size
+FAKE_EMBEDDING_LATENCY_MS = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "5"))
+FAKE_EMBEDDING_DIMENSIONS = 256
+
+# Final answers by detected intent; the keywords in them drive the servers' action parsing
+FAKE_ANSWERS = {
+    "cancel": "I'm sorry to hear you're thinking of leaving. I can offer you a 20% discount for the next 3 months so you can keep everything you've set up. Offer: 20% discount for 3 months",
+    "pricing_confusion": "I understand the price matters. Here's an offer to keep your account: 20% off for 3 months plus a free account review. Offer: 20% discount for 3 months",
+    "feature_relevance": "Based on your usage you would get a lot from an upgrade to Premium: unlimited contacts, advanced segmentation and priority support, with 15% off the first year.",
+    "discount_request": "Good news, there is an offer for you: 15% off for 2 months if you keep your current plan. Offer: 15% discount for 2 months",
+    "trust_issue": "I'm sorry things aren't working. This needs a specialist, so I'm escalating it to a human agent who will contact you today.",
+    "escalation": "Of course. I'm connecting you with a human specialist now; expect a call within the hour.",
+    "greeting": "Hello! How can I help with your account today?",
+    "general_inquiry": "Happy to help. Your current plan covers email campaigns, analytics and automation; let me know what you'd like to look at.",
+}
+
+# Answer for non-agent prompts, e.g. the RetrievalQA chain behind CustomerLookup
+FAKE_QA_ANSWER = "The customer is on the plan listed in the retrieved profile, with the usage and churn risk shown there."
+
+_LOOKUP_THOUGHT = "I should look up this customer's profile before answering."
+_USER_MESSAGE = re.compile(r'User message: "(.*?)"', re.DOTALL)
+_CUSTOMER_ID = re.compile(r"Customer ID: (\S+)")
+_TOKENS = re.compile(r"\s*\S+")
+_WORDS = re.compile(r"[a-z0-9']+")
+
+
+def fake_completion(prompt: str, tool_calls: bool = FAKE_LLM_TOOL_CALLS) -> str:
+    """The deterministic completion for a prompt, in the ReAct format the agents parse"""
+    if "Action Input" not in prompt:
+        return FAKE_QA_ANSWER
+    messages = _USER_MESSAGE.findall(prompt)
+    answer = FAKE_ANSWERS.get(detect_intent(messages[-1] if messages else ""), FAKE_ANSWERS["general_inquiry"])
+    if tool_calls and _LOOKUP_THOUGHT not in prompt:
+        customer = _CUSTOMER_ID.search(prompt)
+        return f" {_LOOKUP_THOUGHT}\nAction: CustomerLookup\nAction Input: {customer.group(1) if customer else 'customer'}"
+    return f" I now know the final answer.\nFinal Answer: {answer}"
+
+
+def _apply_stop(text: str, stop: Optional[List[str]]) -> str:
+    for marker in stop or []:
+        index = text.find(marker)
+        if index >= 0:
+            text = text[:index]
+    return text
+
+
+class FakeChatModel(BaseChatModel):
+    """Stand-in for ChatOpenAI: canned ReAct completions at a configurable latency and token rate"""
+
+    model_name: str = "fake-gpt"
+    streaming: bool = False
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND
+    tool_calls: bool = FAKE_LLM_TOOL_CALLS
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "latency_ms": self.latency_ms, "tokens_per_second": self.tokens_per_second}
+
+    def _tokens(self, messages: List[BaseMessage], stop: Optional[List[str]]) -> List[str]:
+        prompt = "\n".join(str(message.content) for message in messages)
+        return _TOKENS.findall(_apply_stop(fake_completion(prompt, self.tool_calls), stop))
+
+    def _token_delay(self) -> float:
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency_ms / 1000)
+        for i, token in enumerate(self._tokens(messages, stop)):
+            if i:
+                time.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        for i, token in enumerate(self._tokens(messages, stop)):
+            if i:
+                await asyncio.sleep(self._token_delay())
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        if self.streaming:
+            text = "".join(chunk.message.content for chunk in self._stream(messages, stop, run_manager))
+        else:
+            tokens = self._tokens(messages, stop)
+            time.sleep(self.latency_ms / 1000 + max(len(tokens) - 1, 0) * self._token_delay())
+            text = "".join(tokens)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        if self.streaming:
+            text = "".join([chunk.message.content async for chunk in self._astream(messages, stop, run_manager)])
+        else:
+            tokens = self._tokens(messages, stop)
+            await asyncio.sleep(self.latency_ms / 1000 + max(len(tokens) - 1, 0) * self._token_delay())
+            text = "".join(tokens)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+class FakeEmbeddings(Embeddings):
+    """Stand-in for OpenAIEmbeddings: hashed bag-of-words vectors, so similar texts land close together"""
+
+    def __init__(self, dimensions: int = FAKE_EMBEDDING_DIMENSIONS, latency_ms: float = FAKE_EMBEDDING_LATENCY_MS):
+        self.dimensions = dimensions
+        self.latency_ms = latency_ms
+        # Read by the embedding cache and vector index, keeping fake vectors apart from real ones
+        self.model = f"fake-embedding-{dimensions}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for word in _WORDS.findall(text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector))
+        return [value / norm for value in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self.latency_ms / 1000)
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self.latency_ms / 1000)
+        return self._embed(text)
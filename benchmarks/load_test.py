@@ -0,0 +1,314 @@
+"""Boot one of the servers against the fake LLM and drive concurrent chat traffic at it
+
+    python -m benchmarks.load_test simple_server --concurrency 16 --requests 500
+    python -m benchmarks.load_test langchain_server --fake-latency-ms 800 --tokens-per-second 30
+    python -m benchmarks.load_test main_langchain --stream --json results.json
+    python -m benchmarks.load_test --url http://localhost:8000 --duration 60
+
+Run from the repository root. Scenario lines are replayed in order, so two
+runs with the same flags send the same requests.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from telemetry import LatencyHistogram
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_SCENARIO = Path(__file__).resolve().parent / "scenarios" / "chat_mix.jsonl"
+
+# How each entry point is started; the FastAPI apps need a built dist/ (npm run build)
+ENTRY_POINTS = {
+    "simple_server": ["{python}", "simple_server.py"],
+    "langchain_server": ["{python}", "langchain_server.py"],
+    "main": ["{python}", "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", "{port}"],
+    "main_langchain": ["{python}", "-m", "uvicorn", "main_langchain:app", "--host", "127.0.0.1", "--port", "{port}"],
+    "main_simple": ["{python}", "-m", "uvicorn", "main_simple:app", "--host", "127.0.0.1", "--port", "{port}"],
+}
+LANGCHAIN_ENTRY_POINTS = {"langchain_server", "main", "main_langchain"}
+
+RSS_SAMPLE_SECONDS = 0.25
+
+
+def load_scenario(path: Path) -> List[Dict]:
+    """Chat requests, one JSON object per line ({"userId": ..., "message": ...}); blank and # lines are skipped"""
+    requests = []
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            request = json.loads(line)
+            if "message" not in request:
+                raise ValueError(f"{path}:{line_number}: scenario lines need a message")
+            requests.append(request)
+    if not requests:
+        raise ValueError(f"{path} has no requests")
+    return requests
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process in MB, from /proc (Linux) or psutil when installed"""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+
+class RSSSampler:
+    """Samples a process's RSS in the background; reports start, peak and end"""
+
+    def __init__(self, pid: Optional[int]):
+        self.pid = pid
+        self.samples: List[float] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = read_rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._stop.wait(RSS_SAMPLE_SECONDS)
+
+    def __enter__(self):
+        if self.pid is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def summary(self) -> Optional[Dict[str, float]]:
+        if not self.samples:
+            return None
+        return {"start": round(self.samples[0], 1), "peak": round(max(self.samples), 1), "end": round(self.samples[-1], 1)}
+
+
+def start_server(entry_point: str, port: int, env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    command = [part.format(python=sys.executable, port=port) for part in ENTRY_POINTS[entry_point]]
+    log = open(log_path, "wb")
+    return subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(base_url: str, process: Optional[subprocess.Popen], needs_agent: bool, timeout: float):
+    """Poll /api/health until the server answers (and, for LangChain servers, the agent is up)"""
+    deadline = time.monotonic() + timeout
+    last_error = None
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode} during startup")
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/health", timeout=2) as response:
+                health = json.loads(response.read())
+            if not needs_agent or health.get("langchain_initialized"):
+                return
+            last_error = "LangChain agent not initialized yet"
+        except OSError as e:
+            last_error = e
+        time.sleep(0.25)
+    raise RuntimeError(f"Server not ready after {timeout:g}s: {last_error}")
+
+
+class LoadResult:
+    """Per-worker tallies, merged once the run is over"""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.first_token = LatencyHistogram()
+        self.statuses: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def merge(self, other: "LoadResult"):
+        self.latency.merge(other.latency)
+        self.first_token.merge(other.first_token)
+        self.statuses.update(other.statuses)
+        self.errors.update(other.errors)
+
+
+def send_chat(connection: http.client.HTTPConnection, path: str, body: bytes, result: LoadResult, stream: bool):
+    started = time.perf_counter()
+    connection.request("POST", path, body=body, headers={"Content-Type": "application/json"})
+    response = connection.getresponse()
+    if stream and response.status == 200:
+        # Time to the first token event, then drain the rest of the stream
+        first_token_seen = False
+        for line in iter(response.readline, b""):
+            if not first_token_seen and line.startswith(b"event: token"):
+                result.first_token.record((time.perf_counter() - started) * 1000)
+                first_token_seen = True
+            elif line.startswith(b"event: error"):
+                result.errors["stream error event"] += 1
+    else:
+        response.read()
+    result.latency.record((time.perf_counter() - started) * 1000)
+    result.statuses[response.status] += 1
+    if response.will_close:
+        connection.close()
+
+
+def run_load(base_url: str, scenario: List[Dict], concurrency: int, total_requests: Optional[int], duration: Optional[float], stream: bool = False) -> Dict:
+    """Replay the scenario from `concurrency` threads until total_requests are sent or duration runs out"""
+    url = urllib.parse.urlsplit(base_url)
+    path = "/api/chat/stream" if stream else "/api/chat"
+    bodies = [json.dumps({"userId": request.get("userId", "user_001"), "message": request["message"]}).encode("utf-8") for request in scenario]
+    next_index = itertools.count()
+    deadline = time.monotonic() + duration if duration else None
+    results = [LoadResult() for _ in range(concurrency)]
+
+    def worker(result: LoadResult):
+        connection = http.client.HTTPConnection(url.hostname, url.port, timeout=120)
+        while True:
+            i = next(next_index)
+            if (total_requests is not None and i >= total_requests) or (deadline is not None and time.monotonic() >= deadline):
+                break
+            try:
+                send_chat(connection, path, bodies[i % len(bodies)], result, stream)
+            except (OSError, http.client.HTTPException) as e:
+                result.errors[type(e).__name__] += 1
+                connection.close()
+        connection.close()
+
+    threads = [threading.Thread(target=worker, args=(result,), name=f"load-{i}") for i, result in enumerate(results)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    merged = LoadResult()
+    for result in results:
+        merged.merge(result)
+    completed = sum(merged.statuses.values())
+    failed = sum(count for status, count in merged.statuses.items() if status >= 400) + sum(merged.errors.values())
+    attempted = completed + sum(count for reason, count in merged.errors.items() if reason != "stream error event")
+    report = {
+        "requests": attempted,
+        "duration_s": round(elapsed, 2),
+        "throughput_rps": round(completed / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(failed / attempted, 4) if attempted else 0.0,
+        "statuses": {str(status): count for status, count in sorted(merged.statuses.items())},
+        "errors": dict(merged.errors),
+        "latency_ms": merged.latency.summary(),
+    }
+    if stream:
+        report["first_token_ms"] = merged.first_token.summary()
+    return report
+
+
+def format_report(report: Dict) -> str:
+    lines = [
+        f"Entry point   {report.get('entry_point', report.get('url'))}",
+        f"Requests      {report['requests']} in {report['duration_s']}s ({report['throughput_rps']} req/s)",
+        f"Error rate    {report['error_rate']:.2%}  statuses={report['statuses']}" + (f" errors={report['errors']}" if report["errors"] else ""),
+    ]
+    for key, label in (("latency_ms", "Latency"), ("first_token_ms", "First token")):
+        summary = report.get(key)
+        if summary and summary.get("count"):
+            lines.append(f"{label:<13} p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms p99={summary['p99_ms']}ms max={summary['max_ms']}ms avg={summary['avg_ms']}ms")
+    rss = report.get("rss_mb")
+    if rss:
+        lines.append(f"Server RSS    start={rss['start']}MB peak={rss['peak']}MB end={rss['end']}MB")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("entry_point", nargs="?", choices=sorted(ENTRY_POINTS), help="server to boot (omit with --url)")
+    parser.add_argument("--url", help="drive an already-running server instead of booting one")
+    parser.add_argument("--scenario", type=Path, default=DEFAULT_SCENARIO)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=None, help="total requests (default 200 unless --duration is given)")
+    parser.add_argument("--duration", type=float, default=None, help="seconds to run for")
+    parser.add_argument("--warmup", type=int, default=10, help="requests sent before measuring")
+    parser.add_argument("--stream", action="store_true", help="use /api/chat/stream and report time to first token")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fake-latency-ms", type=float, default=None, help="fake LLM delay before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="fake LLM token rate")
+    parser.add_argument("--no-tool-calls", action="store_true", help="fake agent answers without calling CustomerLookup")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--json", type=Path, help="also write the report here")
+    args = parser.parse_args(argv)
+    if not args.entry_point and not args.url:
+        parser.error("give an entry point to boot, or --url")
+    total_requests = args.requests if args.requests is not None or args.duration else 200
+    scenario = load_scenario(args.scenario)
+
+    process = None
+    workdir = tempfile.TemporaryDirectory(prefix="bench-")
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            base_url = f"http://127.0.0.1:{args.port}"
+            # Logs, caches and indexes go to a scratch directory so runs start cold and leave the tree clean
+            scratch = Path(workdir.name)
+            env = dict(
+                os.environ,
+                PORT=str(args.port),
+                LLM_BACKEND="fake",
+                CONVERSATION_LOG_DIR=str(scratch / "logs"),
+                EMBEDDING_CACHE_PATH=str(scratch / "embeddings.sqlite3"),
+                VECTOR_INDEX_DIR=str(scratch / "vector_index"),
+                CONVERSATION_DB_PATH=str(scratch / "conversations.sqlite3"),
+                METRICS_ROLLUP_PATH=str(scratch / "metrics_rollups.sqlite3"),
+            )
+            if args.fake_latency_ms is not None:
+                env["FAKE_LLM_LATENCY_MS"] = str(args.fake_latency_ms)
+            if args.tokens_per_second is not None:
+                env["FAKE_LLM_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+            if args.no_tool_calls:
+                env["FAKE_LLM_TOOL_CALLS"] = "0"
+            log_path = scratch / "server.log"
+            process = start_server(args.entry_point, args.port, env, log_path)
+            try:
+                wait_until_ready(base_url, process, args.entry_point in LANGCHAIN_ENTRY_POINTS, args.startup_timeout)
+            except RuntimeError:
+                print(log_path.read_text(errors="replace")[-4000:], file=sys.stderr)
+                raise
+
+        if args.warmup:
+            run_load(base_url, scenario, min(args.concurrency, args.warmup), args.warmup, None, args.stream)
+        with RSSSampler(process.pid if process else None) as rss:
+            report = run_load(base_url, scenario, args.concurrency, total_requests, args.duration, args.stream)
+        report = {"entry_point": args.entry_point, "url": base_url, "concurrency": args.concurrency, "stream": args.stream, **report, "rss_mb": rss.summary()}
+    finally:
+        if process is not None:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        workdir.cleanup()
+
+    print(format_report(report))
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2) + "\n")
+    return 1 if report["error_rate"] > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
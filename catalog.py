@@ -0,0 +1,271 @@
+import bisect
+import os
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from prometheus_metrics import record_cache
+from serialization import PreEncoded, dumps, loads
+
+logger = logging.getLogger(__name__)
+
+CUSTOMERS_PATH = Path("data/customers.json")
+PRODUCTS_PATH = Path("data/products.json")
+
+# How often (seconds) a cached file is re-stat'ed to detect edits on disk
+CHECK_INTERVAL_SECONDS = float(os.getenv("CATALOG_CHECK_INTERVAL", "1.0"))
+
+
+class FrozenDict(dict):
+    """Read-only dict so one parsed snapshot can be shared by every request"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("catalog snapshots are read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value: Any) -> Any:
+    """Recursively convert parsed JSON into read-only containers"""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class EncodedJSON(FrozenDict, PreEncoded):
+    """A read-only value that carries its own JSON encoding, computed once
+
+    Anything that serializes it normally still works; serialization.dumps()
+    splices the stored bytes in instead of encoding the value again.
+    """
+
+    def __init__(self, value: Dict):
+        super().__init__(freeze(value))
+        self.encoded = dumps(value)
+
+    def __reduce__(self):
+        return (EncodedJSON, (dict(self),))
+
+
+class CachedJSONFile:
+    """A JSON file parsed once and re-parsed only when its mtime or size changes"""
+
+    def __init__(self, path: Path, check_interval: float = CHECK_INTERVAL_SECONDS):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._signature = None
+        self._snapshot = FrozenDict()
+        self._checked_at = 0.0
+        self.cache_name = f"catalog_{self.path.stem}"
+
+    def _stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def get(self) -> FrozenDict:
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked_at < self.check_interval:
+            record_cache(self.cache_name, True)
+            return self._snapshot
+
+        signature = self._stat_signature()
+        if signature is not None and signature == self._signature:
+            self._checked_at = now
+            record_cache(self.cache_name, True)
+            return self._snapshot
+
+        with self._lock:
+            # Another thread may have reloaded while we waited for the lock
+            signature = self._stat_signature()
+            if signature is None:
+                self._signature = None
+                self._snapshot = FrozenDict()
+            elif signature != self._signature:
+                with open(self.path, "rb") as f:
+                    self._snapshot = freeze(loads(f.read()))
+                self._signature = signature
+                logger.info(f"Loaded {self.path} ({signature[1]} bytes)")
+                record_cache(self.cache_name, False)
+            else:
+                record_cache(self.cache_name, True)
+            self._checked_at = now
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._signature = None
+            self._checked_at = 0.0
+
+
+class CustomerIndex:
+    """Lookup tables over the keyed customers.json, built once per load"""
+
+    def __init__(self, customers: Dict[str, Dict]):
+        self.by_id = customers
+        self.by_name: Dict[str, str] = {}
+        emails: List[tuple] = []
+        for user_id, customer in customers.items():
+            name = customer.get("name")
+            if name is not None:
+                self.by_name.setdefault(name, user_id)
+            email = customer.get("email")
+            if email:
+                emails.append((email, user_id))
+        emails.sort()
+        # Parallel sorted arrays so prefix queries are a single bisect
+        self._emails = [email for email, _ in emails]
+        self._email_ids = [user_id for _, user_id in emails]
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, user_id: str) -> Optional[Dict]:
+        return self.by_id.get(user_id)
+
+    def find_by_name(self, name: str) -> Optional[Dict]:
+        user_id = self.by_name.get(name)
+        return self.by_id[user_id] if user_id is not None else None
+
+    def find_by_email_prefix(self, prefix: str) -> Optional[Dict]:
+        if not prefix:
+            return None
+        i = bisect.bisect_left(self._emails, prefix)
+        if i < len(self._emails) and self._emails[i].startswith(prefix):
+            return self.by_id[self._email_ids[i]]
+        return None
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """Resolve a user ID, exact name or email prefix to a customer record"""
+        return self.get(key) or self.find_by_name(key) or self.find_by_email_prefix(key)
+
+
+# Plan suggested for each action; plans missing here go to the top tier for upsells and the bottom one for retention
+UPSELL_PLANS = {"basic": "professional", "professional": "premium"}
+RETENTION_PLANS = {"premium": "professional", "professional": "basic"}
+PLAN_COMPARISON_ACTIONS = ("upsell", "retention")
+
+
+def default_customer(user_id: str) -> Dict:
+    """Stand-in record for a user ID that matches no customer, so demo users get a plausible profile"""
+    return {
+        "name": user_id,
+        "email": f"{user_id}@example.com",
+        "company": "Demo Company",
+        "plan": "basic",
+        "subscription_value": 29,
+        "monthly_usage": 50,
+        "months_subscribed": 6,
+        "payment_issues": 0,
+        "support_tickets": 1,
+        "feature_usage": ["email_templates", "basic_analytics"],
+        "churn_risk": "low",
+        "upsell_potential": "medium"
+    }
+
+
+def suggested_plan(current_plan: str, action: str) -> str:
+    if action == "upsell":
+        return UPSELL_PLANS.get(current_plan, "premium")
+    return RETENTION_PLANS.get(current_plan, "basic")
+
+
+def build_plan_comparison(plans: Dict, current_plan: str, action: str) -> EncodedJSON:
+    current_plan_data = plans.get(current_plan, {})
+    suggested_plan_data = plans.get(suggested_plan(current_plan, action), {})
+    return EncodedJSON({
+        "current_plan": {
+            "name": current_plan_data.get("name", "Current Plan"),
+            "price": current_plan_data.get("price", 0),
+            "features": current_plan_data.get("features", [])
+        },
+        "suggested_plan": {
+            "name": suggested_plan_data.get("name", "Suggested Plan"),
+            "price": suggested_plan_data.get("price", 0),
+            "features": suggested_plan_data.get("features", [])
+        },
+        "action": action
+    })
+
+
+class PlanComparisonTable:
+    """Every (current_plan, action) comparison for one products.json load, already encoded"""
+
+    def __init__(self, products: Dict):
+        self.plans = products.get("plans", {})
+        self.entries = {
+            (plan, action): build_plan_comparison(self.plans, plan, action)
+            for plan in self.plans for action in PLAN_COMPARISON_ACTIONS
+        }
+
+    def get(self, current_plan: str, action: str) -> EncodedJSON:
+        entry = self.entries.get((current_plan, action))
+        if entry is None:
+            # A plan products.json doesn't list; rare enough to build on demand
+            entry = build_plan_comparison(self.plans, current_plan, action)
+        return entry
+
+
+class Catalog:
+    """Shared in-memory view of the customer and product data files"""
+
+    def __init__(self, customers_path: Path = CUSTOMERS_PATH, products_path: Path = PRODUCTS_PATH):
+        self._customers = CachedJSONFile(customers_path)
+        self._products = CachedJSONFile(products_path)
+        self._index_lock = threading.Lock()
+        self._index = CustomerIndex(FrozenDict())
+        self._index_source = None
+        self._comparisons_lock = threading.Lock()
+        self._comparisons = PlanComparisonTable(FrozenDict())
+        self._comparisons_source = None
+
+    def customers(self) -> FrozenDict:
+        return self._customers.get()
+
+    def products(self) -> FrozenDict:
+        return self._products.get()
+
+    def customer_index(self) -> CustomerIndex:
+        customers = self.customers()
+        if customers is not self._index_source:
+            with self._index_lock:
+                if customers is not self._index_source:
+                    self._index = CustomerIndex(customers)
+                    self._index_source = customers
+        return self._index
+
+    def find_customer(self, key: str) -> Optional[Dict]:
+        return self.customer_index().lookup(key)
+
+    def customer_or_default(self, key: str) -> Dict:
+        return self.find_customer(key) or default_customer(key)
+
+    def plan_comparisons(self) -> PlanComparisonTable:
+        products = self.products()
+        if products is not self._comparisons_source:
+            with self._comparisons_lock:
+                if products is not self._comparisons_source:
+                    self._comparisons = PlanComparisonTable(products)
+                    self._comparisons_source = products
+        return self._comparisons
+
+    def plan_comparison(self, current_plan: str, action: str) -> EncodedJSON:
+        return self.plan_comparisons().get(current_plan, action)
+
+    def invalidate(self):
+        self._customers.invalidate()
+        self._products.invalidate()
+
+
+catalog = Catalog()
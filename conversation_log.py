@@ -0,0 +1,375 @@
+import atexit
+import os
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from prometheus_metrics import LOG_WRITE_SECONDS
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+LOGS_DIR = Path(os.getenv("CONVERSATION_LOG_DIR", "logs"))
+
+# "jsonl" for one logs/<user_id>.jsonl file per user, "sqlite" for one indexed database (conversation_store.py)
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "jsonl")
+
+# fsync after every write (each grouped write in write-behind mode); off by default, the OS flushes on its own schedule
+FSYNC_APPENDS = os.getenv("CONVERSATION_LOG_FSYNC", "0") == "1"
+
+# Write-behind: turns are queued and appended by a background thread, so disk latency stays off the request path
+WRITE_BEHIND = os.getenv("CONVERSATION_LOG_WRITE_BEHIND", "1") == "1"
+FLUSH_INTERVAL_MS = float(os.getenv("CONVERSATION_LOG_FLUSH_INTERVAL_MS", "50"))
+# Turns allowed to wait for the writer; beyond this, appends block until it catches up
+MAX_PENDING_TURNS = int(os.getenv("CONVERSATION_LOG_QUEUE_SIZE", "10000"))
+# Per-user write ordering uses a fixed set of striped locks rather than one lock per user
+WRITER_LOCK_STRIPES = 64
+
+# Bytes read per step when scanning a log backwards for its last N turns
+TAIL_BLOCK_SIZE = 8192
+
+# Each write appends the names of the files it changed here, after the data, so tail() reads only those
+CHANGES_JOURNAL = ".changes"
+# Once tail() has read this far into the journal it starts a new one, with one full scan to cover the switch
+JOURNAL_MAX_BYTES = 16 * 1024 * 1024
+
+
+def append_lines(path: Path, lines: List[bytes], fsync: bool = False):
+    """Append encoded turns to one file with a single write"""
+    with LOG_WRITE_SECONDS.time():
+        # O_APPEND keeps concurrent writes from interleaving
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, b"".join(lines))
+            if fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class WriteBehindWriter:
+    """Background thread that hands queued turns to log.write_batch({user_id: items})
+
+    A turn waits at most flush_interval before its write starts; every turn
+    queued by then goes out in the same batch. Reads call flush_user() first,
+    so a user always sees their own latest turns. close() drains whatever is
+    still queued; turns submitted after that are written synchronously.
+    """
+
+    def __init__(self, log, flush_interval_ms: float = FLUSH_INTERVAL_MS, max_pending: int = MAX_PENDING_TURNS):
+        self.log = log
+        self.flush_interval = max(0.0, flush_interval_ms) / 1000
+        self.max_pending = max(1, max_pending)
+        self._pending: Dict[str, List[bytes]] = {}
+        self._count = 0
+        self._closing = False
+        self._cond = threading.Condition()
+        self._user_locks = [threading.Lock() for _ in range(WRITER_LOCK_STRIPES)]
+        self._thread = threading.Thread(target=self._run, name="conversation-log-writer", daemon=True)
+        self._thread.start()
+
+    def pending(self) -> int:
+        return self._count
+
+    def submit(self, user_id: str, item):
+        """Queue a turn, waiting while max_pending are queued; once close() has begun it is written here instead"""
+        with self._cond:
+            while self._count >= self.max_pending and not self._closing:
+                self._cond.wait()
+            if not self._closing:
+                self._pending.setdefault(user_id, []).append(item)
+                self._count += 1
+                self._cond.notify_all()
+                return
+        self._flush_user(user_id, [item])
+
+    def flush_user(self, user_id: str):
+        """Write the user's queued turns now; the user's lock stripe keeps their order on disk"""
+        self._flush_user(user_id, [])
+
+    def _flush_user(self, user_id: str, extra: List):
+        with self._user_locks[hash(user_id) % len(self._user_locks)]:
+            with self._cond:
+                lines = self._pending.pop(user_id, [])
+                self._count -= len(lines)
+                self._cond.notify_all()
+            lines.extend(extra)
+            if lines:
+                self._write({user_id: lines})
+
+    def _write(self, batch: Dict[str, List]):
+        try:
+            self.log.write_batch(batch)
+        except Exception as e:
+            lost = sum(len(items) for items in batch.values())
+            logger.error(f"Lost {lost} conversation turns for {len(batch)} users: {e}")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closing:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Give other turns a moment to join this write
+                if not self._closing and self.flush_interval:
+                    self._cond.wait(self.flush_interval)
+            self.flush_all()
+
+    def flush_all(self):
+        """Write everything queued as one batch"""
+        for lock in self._user_locks:
+            lock.acquire()
+        try:
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._count = 0
+                self._cond.notify_all()
+            if batch:
+                self._write(batch)
+        finally:
+            for lock in self._user_locks:
+                lock.release()
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+class ConversationLog:
+    """Append-only newline-delimited JSON log with one file per user"""
+
+    def __init__(self, logs_dir: Path = LOGS_DIR, fsync: bool = FSYNC_APPENDS, write_behind: bool = WRITE_BEHIND):
+        self.logs_dir = Path(logs_dir)
+        self.fsync = fsync
+        self._migrate_lock = threading.Lock()
+        self.writer = WriteBehindWriter(self) if write_behind else None
+        if self.writer is not None:
+            atexit.register(self.close)
+
+    def path_for(self, user_id: str) -> Path:
+        return self.logs_dir / f"{user_id}.jsonl"
+
+    def source(self) -> str:
+        """Where the turns live; tail() checkpoints only apply to the same source"""
+        return str(self.logs_dir.resolve())
+
+    @property
+    def journal_path(self) -> Path:
+        return self.logs_dir / CHANGES_JOURNAL
+
+    def _journal(self, user_ids: List[str]):
+        names = b"".join(f"{self.path_for(user_id).name}\n".encode("utf-8") for user_id in user_ids)
+        fd = os.open(self.journal_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, names)
+        finally:
+            os.close(fd)
+
+    def _migrate_legacy(self, user_id: str):
+        """Convert a pre-JSONL logs/<user_id>.json array into the append-only format"""
+        legacy = self.logs_dir / f"{user_id}.json"
+        if not legacy.exists():
+            return
+        with self._migrate_lock:
+            if not legacy.exists():
+                return
+            with open(legacy, "rb") as f:
+                turns = loads(f.read())
+            path = self.path_for(user_id)
+            tmp = path.with_suffix(".jsonl.tmp")
+            with open(tmp, "wb") as f:
+                for turn in turns:
+                    f.write(encode_turn(turn))
+                if path.exists():
+                    with open(path, "rb") as existing:
+                        f.write(existing.read())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+            legacy.rename(legacy.with_suffix(".json.migrated"))
+            self._journal([user_id])
+            logger.info(f"Migrated {len(turns)} turns from {legacy} to {path}")
+
+    def write_lines(self, user_id: str, lines: List[bytes]):
+        self.logs_dir.mkdir(exist_ok=True)
+        self._migrate_legacy(user_id)
+        append_lines(self.path_for(user_id), lines, self.fsync)
+
+    def write_batch(self, batch: Dict[str, List[bytes]]):
+        written = []
+        for user_id, lines in batch.items():
+            try:
+                self.write_lines(user_id, lines)
+                written.append(user_id)
+            except OSError as e:
+                logger.error(f"Lost {len(lines)} conversation turns for {user_id}: {e}")
+        if written:
+            try:
+                self._journal(written)
+            except OSError as e:
+                logger.error(f"Could not journal {len(written)} changed conversation logs: {e}")
+
+    def append(self, user_id: str, turn: Dict):
+        """Queue one turn for the background writer, or append it now when write-behind is off"""
+        line = encode_turn(turn)
+        if self.writer is not None:
+            self.writer.submit(user_id, line)
+        else:
+            self.write_lines(user_id, [line])
+            self._journal([user_id])
+
+    def flush(self):
+        """Write every queued turn now"""
+        if self.writer is not None:
+            self.writer.flush_all()
+
+    def close(self):
+        """Drain the queue and stop the background writer; later appends are written inline"""
+        writer, self.writer = self.writer, None
+        if writer is not None:
+            writer.close()
+
+    def load(self, user_id: str, last_n: Optional[int] = None) -> List[Dict]:
+        """Return the user's turns, or only the most recent last_n of them"""
+        if self.writer is not None:
+            self.writer.flush_user(user_id)
+        self._migrate_legacy(user_id)
+        path = self.path_for(user_id)
+        if not path.exists():
+            return []
+        if last_n is None:
+            with open(path, "rb") as f:
+                lines = f.read().splitlines()
+        elif last_n <= 0:
+            return []
+        else:
+            lines = read_tail_lines(path, last_n)
+        return decode_lines(lines)
+
+    def count_actions(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, int]:
+        """Turns per action with since <= timestamp < until (ISO strings); reads every user's file"""
+        self.flush()
+        counts: Dict[str, int] = {}
+        for path in self.logs_dir.glob("*.jsonl"):
+            with open(path, "rb") as f:
+                turns = decode_lines(f.read().splitlines())
+            for turn in turns:
+                timestamp = turn.get("timestamp", "")
+                if (since is None or timestamp >= since) and (until is None or timestamp < until):
+                    action = turn.get("action")
+                    counts[action] = counts.get(action, 0) + 1
+        return counts
+
+    def tail(self, checkpoint: Optional[Dict] = None) -> Iterator[Tuple[List[Dict], Dict]]:
+        """Turns appended since checkpoint, in chunks, each yielded with the checkpoint
+
+        The checkpoint holds a byte offset per file and one into the changes
+        journal. Only files named in the journal since then are read, so a pass
+        costs what was written rather than how many users there are. The
+        checkpoint is copied once and advanced in place; it is complete when
+        the iteration ends. A half-written last line is left for the next call.
+        """
+        checkpoint = checkpoint or {}
+        journal_offset = checkpoint.get("journal")
+        checkpoint = {"offsets": dict(checkpoint.get("offsets", {})), "journal": journal_offset}
+        offsets = checkpoint["offsets"]
+        names, journal_end = self._changed_files(journal_offset)
+        for name in sorted(names):
+            path = self.logs_dir / name
+            offset = offsets.get(name, 0)
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                continue
+            if size < offset:
+                logger.warning(f"{path} shrank since the last checkpoint; reading it from the start")
+                offset = 0
+            if size == offset:
+                continue
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read(size - offset)
+            end = data.rfind(b"\n") + 1
+            if not end:
+                continue
+            offsets[name] = offset + end
+            yield decode_lines(data[:end].splitlines()), checkpoint
+        if journal_end != journal_offset:
+            checkpoint["journal"] = journal_end
+            yield [], checkpoint
+
+    def _changed_files(self, journal_offset: Optional[int]) -> Tuple[Set[str], int]:
+        """Files named in the journal past journal_offset, and the offset after them"""
+        journal = self.journal_path
+        try:
+            size = journal.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if journal_offset is not None and journal_offset <= size:
+            data = b""
+            if size > journal_offset:
+                with open(journal, "rb") as f:
+                    f.seek(journal_offset)
+                    data = f.read(size - journal_offset)
+            end = data.rfind(b"\n") + 1
+            if journal_offset + end < JOURNAL_MAX_BYTES:
+                names = {name.decode("utf-8") for name in set(data[:end].split(b"\n")) if name.endswith(b".jsonl")}
+                return names, journal_offset + end
+            # Start a new journal; entries still landing in the old one are for data the scan below sees
+            os.replace(journal, journal.with_suffix(".old"))
+            size = 0
+        # First pass, a checkpoint from before the journal, or a new journal: read every file once.
+        # Data is written before its journal entry, so whatever was journaled before size is on disk now.
+        return {path.name for path in self.logs_dir.glob("*.jsonl")}, size
+
+
+def encode_turn(turn: Dict) -> bytes:
+    return dumps(turn) + b"\n"
+
+
+def decode_lines(lines: List[bytes]) -> List[Dict]:
+    turns = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            turns.append(loads(line))
+        except ValueError:
+            # A torn final line from a crash mid-append; everything before it is intact
+            logger.warning("Skipping unreadable conversation log line")
+    return turns
+
+
+def read_tail_lines(path: Path, n: int) -> List[bytes]:
+    """Read only as many trailing blocks as needed to recover the last n lines"""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        chunks = []
+        newlines = 0
+        # One extra newline guarantees the earliest kept line is complete
+        while pos > 0 and newlines <= n:
+            step = min(TAIL_BLOCK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            chunk = f.read(step)
+            chunks.append(chunk)
+            newlines += chunk.count(b"\n")
+    lines = b"".join(reversed(chunks)).splitlines()
+    lines = [line for line in lines if line.strip()]
+    return lines[-n:]
+
+
+# Open the store picked by CONVERSATION_STORE; both expose append/load/flush/close/count_actions/tail
+def open_conversation_log():
+    if CONVERSATION_STORE == "sqlite":
+        from conversation_store import SQLiteConversationStore
+        return SQLiteConversationStore()
+    return ConversationLog()
+
+
+conversation_log = open_conversation_log()
@@ -0,0 +1,164 @@
+import argparse
+import atexit
+import os
+import sqlite3
+import sys
+import threading
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from conversation_log import FSYNC_APPENDS, WRITE_BEHIND, WriteBehindWriter, decode_lines, encode_turn
+from prometheus_metrics import LOG_WRITE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+CONVERSATION_DB_PATH = Path(os.getenv("CONVERSATION_DB_PATH", "logs/conversations.sqlite3"))
+
+# Statements are fixed strings so each connection's statement cache keeps them prepared
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS turns (
+        id INTEGER PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        action TEXT,
+        turn BLOB NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS turns_user ON turns (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS turns_timestamp ON turns (timestamp)",
+    "CREATE INDEX IF NOT EXISTS turns_action ON turns (action, timestamp)",
+)
+_INSERT = "INSERT INTO turns (user_id, timestamp, action, turn) VALUES (?, ?, ?, ?)"
+_SELECT_ALL = "SELECT turn FROM turns WHERE user_id = ? ORDER BY id"
+_SELECT_LAST = "SELECT turn FROM turns WHERE user_id = ? ORDER BY id DESC LIMIT ?"
+_SELECT_AFTER = "SELECT id, turn FROM turns WHERE id > ? ORDER BY id LIMIT ?"
+_COUNT_ACTIONS = "SELECT action, COUNT(*) FROM turns WHERE timestamp >= ? AND timestamp < ? GROUP BY action"
+
+# Rows per chunk returned by tail()
+TAIL_CHUNK_SIZE = 1000
+
+# Bounds for count_actions when since/until are omitted; ISO timestamps sort between them
+_MIN_TIMESTAMP = ""
+_MAX_TIMESTAMP = "9999-12-31T23:59:59.999999"
+
+
+def turn_row(user_id: str, turn: Dict) -> Tuple:
+    return (user_id, turn.get("timestamp", ""), turn.get("action"), encode_turn(turn))
+
+
+class SQLiteConversationStore:
+    """Conversation turns in one SQLite database, indexed by user, time and action
+
+    Same interface as ConversationLog. Appends go through the write-behind
+    queue, and each flush inserts every queued turn in one transaction. Reads
+    use a connection per thread; in WAL mode they never wait on the writer.
+    """
+
+    def __init__(self, path: Path = CONVERSATION_DB_PATH, fsync: bool = FSYNC_APPENDS, write_behind: bool = WRITE_BEHIND):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # NORMAL only syncs at checkpoints in WAL mode; FULL syncs every commit
+        self._synchronous = "FULL" if fsync else "NORMAL"
+        self._write_lock = threading.Lock()
+        self._local = threading.local()
+        self._conn = self._connect()
+        with self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+        self.writer = WriteBehindWriter(self) if write_behind else None
+        if self.writer is not None:
+            atexit.register(self.close)
+
+    def source(self) -> str:
+        """Where the turns live; tail() checkpoints only apply to the same source"""
+        return str(self.path.resolve())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.path), check_same_thread=False, cached_statements=32)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self._synchronous}")
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def write_batch(self, batch: Dict[str, List[Dict]]):
+        rows = [turn_row(user_id, turn) for user_id, turns in batch.items() for turn in turns]
+        with self._write_lock, LOG_WRITE_SECONDS.time():
+            with self._conn:
+                self._conn.executemany(_INSERT, rows)
+
+    def append(self, user_id: str, turn: Dict):
+        """Queue one turn for the background writer, or insert it now when write-behind is off"""
+        if self.writer is not None:
+            self.writer.submit(user_id, turn)
+        else:
+            self.write_batch({user_id: [turn]})
+
+    def flush(self):
+        """Write every queued turn now"""
+        if self.writer is not None:
+            self.writer.flush_all()
+
+    def close(self):
+        """Drain the queue and stop the background writer; later appends are written inline"""
+        writer, self.writer = self.writer, None
+        if writer is not None:
+            writer.close()
+
+    def load(self, user_id: str, last_n: Optional[int] = None) -> List[Dict]:
+        """Return the user's turns, or only the most recent last_n of them"""
+        if self.writer is not None:
+            self.writer.flush_user(user_id)
+        if last_n is None:
+            rows = self._reader().execute(_SELECT_ALL, (user_id,)).fetchall()
+        elif last_n <= 0:
+            return []
+        else:
+            rows = self._reader().execute(_SELECT_LAST, (user_id, last_n)).fetchall()
+            rows.reverse()
+        return decode_lines([row[0] for row in rows])
+
+    def count_actions(self, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, int]:
+        """Turns per action with since <= timestamp < until (ISO strings); one indexed query"""
+        self.flush()
+        rows = self._reader().execute(_COUNT_ACTIONS, (since or _MIN_TIMESTAMP, until or _MAX_TIMESTAMP))
+        return {action: count for action, count in rows}
+
+    def tail(self, checkpoint: Optional[Dict] = None) -> Iterator[Tuple[List[Dict], Dict]]:
+        """Turns inserted since checkpoint (the last row id read), in chunks, each with the checkpoint that follows it"""
+        last_id = (checkpoint or {}).get("last_id", 0)
+        while True:
+            rows = self._reader().execute(_SELECT_AFTER, (last_id, TAIL_CHUNK_SIZE)).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield decode_lines([row[1] for row in rows]), {"last_id": last_id}
+
+    def import_jsonl(self, logs_dir: Path) -> int:
+        """Copy every logs_dir/<user_id>.jsonl into the database (not idempotent); returns the number of turns"""
+        total = 0
+        for path in sorted(Path(logs_dir).glob("*.jsonl")):
+            with open(path, "rb") as f:
+                turns = decode_lines(f.read().splitlines())
+            self.write_batch({path.stem: turns})
+            total += len(turns)
+        return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import JSONL conversation logs into the SQLite conversation store.")
+    parser.add_argument("logs_dir", nargs="?", default="logs", help="directory of <user_id>.jsonl files")
+    parser.add_argument("--db", default=str(CONVERSATION_DB_PATH), help="database to import into")
+    args = parser.parse_args(argv)
+
+    store = SQLiteConversationStore(Path(args.db), write_behind=False)
+    count = store.import_jsonl(Path(args.logs_dir))
+    print(f"Imported {count} turns into {args.db}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+from typing import Dict
+
+# Profile thresholds, shared by the per-request analysis and the whole-book scorer
+HIGH_USAGE_ABOVE = 80
+MEDIUM_USAGE_ABOVE = 40
+NEW_CUSTOMER_MONTHS = 3
+ESTABLISHED_MONTHS = 12
+HIGH_SUPPORT_TICKETS_ABOVE = 5
+MEDIUM_SUPPORT_TICKETS_ABOVE = 2
+
+
+# Customer data analysis
+def analyze_customer_profile(customer_data: Dict) -> Dict:
+    """Analyze customer profile to determine churn risk and upsell potential"""
+    profile = {
+        "churn_risk": "low",
+        "upsell_potential": "low",
+        "usage_level": "low",
+        "satisfaction_indicators": [],
+        "retention_strategy": "standard"
+    }
+
+    # Analyze usage patterns
+    if customer_data.get("monthly_usage", 0) > HIGH_USAGE_ABOVE:
+        profile["usage_level"] = "high"
+        profile["upsell_potential"] = "high"
+    elif customer_data.get("monthly_usage", 0) > MEDIUM_USAGE_ABOVE:
+        profile["usage_level"] = "medium"
+        profile["upsell_potential"] = "medium"
+
+    # Analyze subscription length
+    months_subscribed = customer_data.get("months_subscribed", 0)
+    if months_subscribed < NEW_CUSTOMER_MONTHS:
+        profile["churn_risk"] = "high"
+        profile["retention_strategy"] = "aggressive"
+    elif months_subscribed < ESTABLISHED_MONTHS:
+        profile["churn_risk"] = "medium"
+        profile["retention_strategy"] = "moderate"
+
+    # Analyze payment history
+    if customer_data.get("payment_issues", 0) > 0:
+        profile["churn_risk"] = "high"
+        profile["satisfaction_indicators"].append("payment_issues")
+
+    # Analyze support tickets
+    support_tickets = customer_data.get("support_tickets", 0)
+    if support_tickets > HIGH_SUPPORT_TICKETS_ABOVE:
+        profile["churn_risk"] = "high"
+        profile["satisfaction_indicators"].append("high_support_volume")
+    elif support_tickets > MEDIUM_SUPPORT_TICKETS_ABOVE:
+        profile["churn_risk"] = "medium"
+
+    return profile
@@ -0,0 +1,156 @@
+# Admin dashboard served at /api/dashboard by the stdlib servers; it renders /api/metrics/stream live
+DASHBOARD_HTML = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>AI Agent Dashboard</title>
+    <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+    <style>
+        body { 
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif; 
+            background: linear-gradient(135deg, #0a0a0a 0%, #1a1a1a 50%, #0f0f0f 100%);
+            color: white; margin: 0; padding: 20px;
+        }
+        .dashboard { max-width: 1200px; margin: 0 auto; }
+        .metrics-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(250px, 1fr)); gap: 20px; margin-bottom: 30px; }
+        .metric-card { background: rgba(255, 140, 0, 0.1); border: 1px solid rgba(255, 140, 0, 0.3); border-radius: 10px; padding: 20px; text-align: center; }
+        .metric-value { font-size: 2em; font-weight: bold; color: #ff8c00; }
+        .metric-label { color: #ccc; margin-top: 5px; }
+        .chart-container { background: rgba(0, 0, 0, 0.3); border-radius: 10px; padding: 20px; margin: 20px 0; }
+        h1 { text-align: center; color: #ff8c00; margin-bottom: 30px; }
+    </style>
+</head>
+<body>
+    <div class="dashboard">
+        <h1>🚀 AI Retention & Upsell Agent Dashboard</h1>
+        <div class="metrics-grid" id="metricsGrid"></div>
+        <div class="chart-container">
+            <canvas id="performanceChart" width="400" height="200"></canvas>
+        </div>
+        <div class="chart-container">
+            <canvas id="conversionChart" width="400" height="200"></canvas>
+        </div>
+        <div class="chart-container">
+            <canvas id="latencyChart" width="400" height="200"></canvas>
+        </div>
+    </div>
+    <script>
+        // Live metrics: a full snapshot on connect, then only the values that changed
+        const state = {};
+        let charts = null;
+
+        const cards = [
+            ['total_conversations', 'Total Conversations', s => s.total_conversations],
+            ['churn_prevented', 'Churn Prevented', s => s.churn_prevented],
+            ['upsells_completed', 'Upsells Completed', s => s.upsells_completed],
+            ['avg_latency_ms', 'Avg Response Time', s => `${s.avg_latency_ms}ms`],
+            ['recent_p95', 'p95 Chat Latency (last hour)', s => `${s.latency.recent.p95_ms}ms`],
+            ['offers_shown', 'Offers Shown', s => s.offers_shown],
+            ['offers_accepted', 'Offers Accepted', s => s.offers_accepted],
+            ['escalations', 'Escalations', s => s.escalations],
+            ['tickets_generated', 'Tickets Generated', s => s.tickets_generated]
+        ];
+        document.getElementById('metricsGrid').innerHTML = cards.map(([id, label]) => `
+            <div class="metric-card">
+                <div class="metric-value" id="metric-${id}">-</div>
+                <div class="metric-label">${label}</div>
+            </div>
+        `).join('');
+
+        function merge(into, delta) {
+            for (const [key, value] of Object.entries(delta)) {
+                if (value !== null && typeof value === 'object') {
+                    into[key] = merge(into[key] || {}, value);
+                } else {
+                    into[key] = value;
+                }
+            }
+            return into;
+        }
+
+        const axes = {
+            y: { ticks: { color: 'white' }, grid: { color: 'rgba(255, 140, 0, 0.1)' } },
+            x: { ticks: { color: 'white' }, grid: { color: 'rgba(255, 140, 0, 0.1)' } }
+        };
+        const legend = { legend: { labels: { color: 'white' } } };
+
+        function createCharts() {
+            return {
+                // Performance chart
+                performance: new Chart(document.getElementById('performanceChart').getContext('2d'), {
+                    type: 'line',
+                    data: {
+                        labels: ['Churn Risk Reduction', 'Upsell Boost', 'Response Time'],
+                        datasets: [{
+                            label: 'Performance Metrics',
+                            data: [35, 20, 0],
+                            borderColor: '#ff8c00',
+                            backgroundColor: 'rgba(255, 140, 0, 0.1)',
+                            tension: 0.4
+                        }]
+                    },
+                    options: { responsive: true, plugins: legend, scales: axes }
+                }),
+                // Conversion chart
+                conversion: new Chart(document.getElementById('conversionChart').getContext('2d'), {
+                    type: 'doughnut',
+                    data: {
+                        labels: ['Offers Accepted', 'Offers Declined', 'Escalations'],
+                        datasets: [{
+                            data: [0, 0, 0],
+                            backgroundColor: ['#ff8c00', '#666', '#ff4444']
+                        }]
+                    },
+                    options: { responsive: true, plugins: legend }
+                }),
+                // Chat latency percentiles: last hour vs all time
+                latency: new Chart(document.getElementById('latencyChart').getContext('2d'), {
+                    type: 'bar',
+                    data: {
+                        labels: ['p50', 'p95', 'p99', 'max'],
+                        datasets: [{
+                            label: 'Chat latency, last hour (ms)',
+                            data: [0, 0, 0, 0],
+                            backgroundColor: '#ff8c00'
+                        }, {
+                            label: 'Chat latency, all time (ms)',
+                            data: [0, 0, 0, 0],
+                            backgroundColor: '#666'
+                        }]
+                    },
+                    options: { responsive: true, plugins: legend, scales: axes }
+                })
+            };
+        }
+
+        function render() {
+            for (const [id, , value] of cards) {
+                document.getElementById(`metric-${id}`).textContent = value(state);
+            }
+            charts = charts || createCharts();
+            const percentiles = l => [l.p50_ms, l.p95_ms, l.p99_ms, l.max_ms];
+            // Update the existing charts in place rather than rebuilding them
+            charts.performance.data.datasets[0].data[2] = state.avg_latency_ms;
+            charts.conversion.data.datasets[0].data = [state.offers_accepted, state.offers_shown - state.offers_accepted, state.escalations];
+            charts.latency.data.datasets[0].data = percentiles(state.latency.recent);
+            charts.latency.data.datasets[1].data = percentiles(state.latency.total);
+            Object.values(charts).forEach(chart => chart.update('none'));
+        }
+
+        // EventSource reconnects by itself; each connection starts with a fresh snapshot
+        const stream = new EventSource('/api/metrics/stream');
+        stream.addEventListener('snapshot', event => {
+            Object.keys(state).forEach(key => delete state[key]);
+            merge(state, JSON.parse(event.data));
+            render();
+        });
+        stream.addEventListener('delta', event => {
+            merge(state, JSON.parse(event.data));
+            render();
+        });
+        stream.onerror = () => console.error('Metrics stream interrupted, reconnecting');
+    </script>
+</body>
+</html>
+"""
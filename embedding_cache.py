@@ -0,0 +1,111 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import logging
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from langchain.embeddings.base import Embeddings
+
+from prometheus_metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = Path(os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite3"))
+
+# SQLite caps host parameters per statement; look keys up in chunks of this size
+_LOOKUP_CHUNK = 500
+
+
+def _encode_vector(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _decode_vector(blob: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(blob)
+    return vector.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that never embeds the same text twice with the same model
+
+    Vectors are stored as float32 blobs in a local SQLite file keyed by
+    sha256(model name + text), so documents and repeated queries such as
+    "customer user_001" survive restarts without another API call.
+    """
+
+    def __init__(self, underlying: Embeddings, path: Path = EMBEDDING_CACHE_PATH, model_name: Optional[str] = None):
+        self.underlying = underlying
+        self.model = model_name or getattr(underlying, "model", None) or type(underlying).__name__
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), _LOOKUP_CHUNK):
+                chunk = keys[start:start + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk)
+                for key, blob in rows:
+                    found[key] = _decode_vector(blob)
+        return found
+
+    def _store(self, items: Dict[str, List[float]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, _encode_vector(vector)) for key, vector in items.items()]
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+
+        # Embed each distinct uncached text once, even if it repeats in the batch
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        record_cache("embeddings", True, len(texts) - len(missing))
+        record_cache("embeddings", False, len(missing))
+
+        if missing:
+            vectors = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), vectors))
+            self._store(fresh)
+            cached.update(fresh)
+        return [cached[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        cached = self._lookup([key])
+        if key in cached:
+            self.hits += 1
+            record_cache("embeddings", True)
+            return cached[key]
+        self.misses += 1
+        record_cache("embeddings", False)
+        vector = self.underlying.embed_query(text)
+        self._store({key: vector})
+        return vector
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,64 @@
+import time
+from typing import AsyncIterator, Callable, Optional
+
+from prometheus_metrics import HTTP_REQUESTS, HTTP_REQUEST_SECONDS, HTTP_IN_FLIGHT
+from telemetry import route_label
+
+# Called with (route label, elapsed milliseconds) once a request has finished
+EndpointRecorder = Callable[[str, float], None]
+
+
+class _RequestTimer:
+    """Counts one request in flight until finish() records its route, status and latency"""
+
+    def __init__(self, route: str, method: str, on_finish: Optional[EndpointRecorder]):
+        self.route = route
+        self.method = method
+        self.on_finish = on_finish
+        self.status = 500
+        self.started = time.perf_counter()
+        self.finished = False
+        HTTP_IN_FLIGHT.inc()
+
+    def finish(self) -> None:
+        if self.finished:
+            return
+        self.finished = True
+        elapsed = time.perf_counter() - self.started
+        HTTP_IN_FLIGHT.dec()
+        HTTP_REQUEST_SECONDS.observe(elapsed, route=self.route)
+        HTTP_REQUESTS.inc(route=self.route, method=self.method, status=self.status)
+        if self.on_finish:
+            self.on_finish(self.route, elapsed * 1000)
+
+
+async def _timed_body(body: AsyncIterator[bytes], timer: _RequestTimer) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        timer.finish()
+
+
+def install_http_metrics(app, on_finish: Optional[EndpointRecorder] = None) -> None:
+    """Record request counts, latency and in-flight requests for every route of a FastAPI app
+
+    A request stays in flight until its body has been sent, so SSE and other
+    streaming responses are counted for as long as the stream is open.
+    """
+
+    @app.middleware("http")
+    async def record_http_metrics(request, call_next):
+        timer = _RequestTimer(route_label(request.url.path), request.method, on_finish)
+        try:
+            response = await call_next(request)
+        except BaseException:
+            timer.finish()
+            raise
+        timer.status = response.status_code
+        body = getattr(response, "body_iterator", None)
+        if body is None:
+            timer.finish()
+        else:
+            response.body_iterator = _timed_body(body, timer)
+        return response
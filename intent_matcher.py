@@ -0,0 +1,260 @@
+import argparse
+import json
+import sys
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+from serialization import dumps
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton that finds every keyword occurring in a text in one pass
+
+    Matching is plain substring matching, exactly like ``keyword in text``,
+    but all keywords are checked together in O(len(text) + matches).
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[str, ...]] = [()]
+
+        for keyword in set(keywords):
+            state = 0
+            for char in keyword:
+                nxt = self._goto[state].get(char)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][char] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = nxt
+            self._out[state] += (keyword,)
+
+        # Breadth-first so each state's failure target is finished before its children
+        pending = deque(self._goto[0].values())
+        while pending:
+            state = pending.popleft()
+            for char, nxt in self._goto[state].items():
+                pending.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Set[str]:
+        """Return the set of keywords that occur anywhere in text"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: Set[str] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+# Intent keywords in precedence order: the first intent with a hit wins
+INTENT_RULES: List[Tuple[str, List[str]]] = [
+    ("cancel", ["cancel", "unsubscribe", "quit", "stop", "end", "leave", "not worth"]),
+    ("pricing_confusion", ["expensive", "cost", "price", "money", "afford", "budget", "cheaper"]),
+    ("feature_relevance", ["missing", "need", "want", "feature", "functionality", "capability", "more features"]),
+    ("discount_request", ["discount", "deal", "offer", "promotion", "save", "cheaper"]),
+    ("trust_issue", ["not working", "broken", "issue", "problem", "bug", "disappointed", "frustrated"]),
+    ("escalation", ["manager", "supervisor", "human", "speak to", "call me"]),
+    ("greeting", ["hi", "hello", "hey", "good morning", "good afternoon"]),
+]
+DEFAULT_INTENT = "general_inquiry"
+
+# Topics and concerns remembered per user, in the order they are reported
+MEMORY_TOPICS = ["audio", "video", "pricing", "features", "support", "billing", "upgrade", "downgrade", "cancel"]
+MEMORY_CONCERNS = ["expensive", "too much", "not working", "problem", "issue", "bug", "slow"]
+
+# Escalation summary labels: (section, label) -> keywords
+SUMMARY_RULES: List[Tuple[Tuple[str, str], List[str]]] = [
+    (("concerns", "cancellation request"), ["cancel"]),
+    (("concerns", "pricing concerns"), ["expensive", "price"]),
+    (("topics", "feature inquiry"), ["feature"]),
+    (("topics", "support request"), ["support", "help"]),
+]
+
+
+def _label_table() -> Dict[str, List[Hashable]]:
+    labels: Dict[str, List[Hashable]] = {}
+    for intent, keywords in INTENT_RULES:
+        for keyword in keywords:
+            labels.setdefault(keyword, []).append(("intent", intent))
+    for topic in MEMORY_TOPICS:
+        labels.setdefault(topic, []).append(("topic", topic))
+    for concern in MEMORY_CONCERNS:
+        labels.setdefault(concern, []).append(("concern", concern))
+    for label, keywords in SUMMARY_RULES:
+        for keyword in keywords:
+            labels.setdefault(keyword, []).append(("summary", label))
+    return labels
+
+
+# One automaton covers every intent, topic, concern and summary keyword
+KEYWORD_LABELS = _label_table()
+MESSAGE_MATCHER = KeywordMatcher(KEYWORD_LABELS)
+_INTENT_PRIORITY = [intent for intent, _ in INTENT_RULES]
+
+
+class MessageScan:
+    """Every keyword hit in one message, grouped by what the hit means"""
+
+    __slots__ = ("keywords", "intents", "topics", "concerns", "summary")
+
+    def __init__(self, keywords: Set[str]):
+        self.keywords = keywords
+        self.intents: Dict[str, List[str]] = {}
+        self.topics: Set[str] = set()
+        self.concerns: Set[str] = set()
+        self.summary: Set[Tuple[str, str]] = set()
+        for keyword in keywords:
+            for kind, name in KEYWORD_LABELS[keyword]:
+                if kind == "intent":
+                    self.intents.setdefault(name, []).append(keyword)
+                elif kind == "topic":
+                    self.topics.add(name)
+                elif kind == "concern":
+                    self.concerns.add(name)
+                else:
+                    self.summary.add(name)
+
+    @property
+    def intent(self) -> str:
+        for intent in _INTENT_PRIORITY:
+            if intent in self.intents:
+                return intent
+        return DEFAULT_INTENT
+
+    @property
+    def evidence(self) -> List[str]:
+        """Keywords that triggered the winning intent"""
+        return sorted(self.intents.get(self.intent, []))
+
+
+def scan_message(message: str) -> MessageScan:
+    return MessageScan(MESSAGE_MATCHER.find(message.lower()))
+
+
+# Intent detection
+def detect_intent(message: str) -> str:
+    """Detect customer intent from message"""
+    return scan_message(message).intent
+
+
+# Batch classification (replays of historical messages repeat a lot, hence the cache)
+@lru_cache(maxsize=65536)
+def classify_message(message: str) -> Tuple[str, Tuple[str, ...]]:
+    scan = scan_message(message)
+    return scan.intent, tuple(scan.evidence)
+
+
+def _as_record(value) -> Optional[Dict]:
+    if isinstance(value, str):
+        return {"message": value}
+    return value if isinstance(value, dict) else None
+
+
+def parse_jsonl(lines: Iterable) -> Iterator[Dict]:
+    """Read messages from JSONL: objects with "message"/"user_message", or bare strings"""
+    for number, line in enumerate(lines, 1):
+        try:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8")
+            line = line.strip()
+            if not line:
+                continue
+            value = json.loads(line)
+        except UnicodeDecodeError:
+            yield {"line": number, "error": "invalid UTF-8"}
+            continue
+        except ValueError:
+            yield {"line": number, "error": "invalid JSON"}
+            continue
+        record = _as_record(value)
+        if record is None:
+            yield {"line": number, "error": "expected an object or a string"}
+            continue
+        yield record
+
+
+def parse_json_document(data: bytes) -> Iterator[Dict]:
+    """Read messages from one JSON document: an array of them (the legacy logs/<user_id>.json format) or a single one"""
+    try:
+        value = json.loads(data)
+    except ValueError:
+        yield {"error": "invalid JSON"}
+        return
+    for number, item in enumerate(value if isinstance(value, list) else [value], 1):
+        record = _as_record(item)
+        if record is None:
+            yield {"item": number, "error": "expected an object or a string"}
+            continue
+        yield record
+
+
+def classify_records(records: Iterable[Dict]) -> Iterator[Dict]:
+    """Label each record with its intent and the keywords that decided it
+
+    Records are classified one at a time; classify_message is memoized per
+    distinct message, so a replay costs one automaton scan per unique text.
+    """
+    for record in records:
+        if "error" in record:
+            yield record
+            continue
+        intent, evidence = classify_message(str(record.get("message", record.get("user_message", ""))))
+        result = {key: record[key] for key in ("id", "user_id", "timestamp") if key in record}
+        result["intent"] = intent
+        result["evidence"] = list(evidence)
+        yield result
+
+
+def _file_records(path: Path) -> Iterator[Dict]:
+    with open(path, "rb") as f:
+        if path.suffix == ".json":
+            yield from parse_json_document(f.read())
+        else:
+            yield from parse_jsonl(f)
+
+
+def _log_records(logs_dir: Path) -> Iterator[Dict]:
+    # Legacy <user_id>.json arrays are only converted to JSONL when that user next writes, so read both
+    for path in sorted([*logs_dir.glob("*.jsonl"), *logs_dir.glob("*.json")]):
+        for record in _file_records(path):
+            record.setdefault("user_id", path.stem)
+            yield record
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify messages in bulk. Reads JSONL (or JSON arrays) and writes JSONL with intent and evidence.")
+    parser.add_argument("inputs", nargs="*", default=["-"], help="JSONL or .json files, conversation log directories, or - for stdin")
+    args = parser.parse_args(argv)
+
+    count = 0
+    out = sys.stdout
+    for source in args.inputs:
+        if source == "-":
+            records = parse_jsonl(sys.stdin)
+        elif Path(source).is_dir():
+            records = _log_records(Path(source))
+        else:
+            records = _file_records(Path(source))
+        for result in classify_records(records):
+            out.write(dumps(result).decode("utf-8") + "\n")
+            count += 1
+    print(f"Classified {count} messages", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+# "openai" for the real API; "fake" for the deterministic local models in benchmarks/fake_llm.py
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+
+
+def uses_fake_llm() -> bool:
+    return LLM_BACKEND == "fake"
+
+
+# Chat model used by the agent and the RetrievalQA chain
+def chat_model(**kwargs):
+    """ChatOpenAI(**kwargs), or the local stand-in when LLM_BACKEND=fake"""
+    if uses_fake_llm():
+        from benchmarks.fake_llm import FakeChatModel
+        logger.info("LLM_BACKEND=fake: using the local fake chat model")
+        return FakeChatModel(streaming=kwargs.get("streaming", False))
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(**kwargs)
+
+
+# Embedding model used for the vector store and the response cache
+def embedding_model(**kwargs):
+    """OpenAIEmbeddings(**kwargs), or the local stand-in when LLM_BACKEND=fake"""
+    if uses_fake_llm():
+        from benchmarks.fake_llm import FakeEmbeddings
+        return FakeEmbeddings()
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(**kwargs)
@@ -1,24 +1,37 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import json
 import os
 import uuid
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from pathlib import Path
 import logging
+import time
+
+# Shared modules
+from catalog import catalog
+from serialization import BACKEND as JSON_BACKEND
+from conversation_log import conversation_log
+from agent_runner import run_agent, AgentTimeoutError
+from prometheus_metrics import LLM_CALLS, LLM_CALL_SECONDS, CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE, render_latest
+from http_metrics import install_http_metrics
+from vector_index import load_or_build_vectorstore
+from embedding_cache import CachedEmbeddings
+from llm_backend import chat_model, embedding_model
+from churn_scoring import score_book
+from sse import SSE_CONTENT_TYPE, SSE_HEADERS, astream_turn
+from streaming_callbacks import FinalAnswerStreamHandler
 
 # LangChain imports
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.document_loaders import JSONLoader
 from langchain.tools import Tool
 from langchain.chains import RetrievalQA
 from langchain.agents import initialize_agent, AgentType
-from langchain_openai import ChatOpenAI
 from langchain.schema import Document
 from langchain.callbacks.base import BaseCallbackHandler
 
@@ -26,7 +39,8 @@ from langchain.callbacks.base import BaseCallbackHandler
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="AI Retention & Upsell Agent", version="2.0.0")
+# Encode responses with orjson when serialization picked it
+app = FastAPI(title="AI Retention & Upsell Agent", version="2.0.0", default_response_class=ORJSONResponse if JSON_BACKEND == "orjson" else JSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -37,6 +51,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus request counters, latency and in-flight gauge; streamed responses count until they end
+install_http_metrics(app)
+
 # Pydantic models
 class ChatRequest(BaseModel):
     userId: str
@@ -56,6 +73,28 @@ llm = None
 
 # Custom callback handler for logging
 class LoggingCallbackHandler(BaseCallbackHandler):
+    def __init__(self):
+        super().__init__()
+        # run_id -> (model name, start time)
+        self._llm_runs = {}
+
+    def on_llm_start(self, serialized: Dict[str, any], prompts: List[str], *, run_id=None, **kwargs) -> None:
+        params = kwargs.get('invocation_params') or {}
+        self._llm_runs[run_id] = (params.get('model_name') or params.get('model') or 'unknown', time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs) -> None:
+        self._finish_llm(run_id, "ok")
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs) -> None:
+        self._finish_llm(run_id, "error")
+
+    def _finish_llm(self, run_id, status: str) -> None:
+        started = self._llm_runs.pop(run_id, None)
+        if started:
+            model, started_at = started
+            LLM_CALLS.inc(model=model, status=status)
+            LLM_CALL_SECONDS.observe(time.perf_counter() - started_at, model=model)
+
     def on_tool_start(self, serialized: Dict[str, any], input_str: str, **kwargs) -> None:
         logger.info(f"Tool started: {serialized.get('name', 'Unknown')} with input: {input_str}")
 
@@ -70,15 +109,15 @@ def initialize_langchain():
     global vectorstore, agent, llm
     
     try:
-        # Load customer data with LangChain
+        # Load customer data and score the whole book in one vectorized pass
         logger.info("Loading customer data...")
-        loader = JSONLoader(file_path="data/customers.json", jq_schema=".[]")
-        docs = loader.load()
+        customers = catalog.customers()
+        profiles = dict(score_book(customers).profiles())
         
         # Enhance documents with metadata
         enhanced_docs = []
-        for doc in docs:
-            customer_data = doc.metadata
+        for user_id, customer_data in customers.items():
+            profile = profiles[user_id]
             # Create a more detailed document for better retrieval
             content = f"""
             Customer: {customer_data.get('name', 'Unknown')} from {customer_data.get('company', 'Unknown Company')}
@@ -94,9 +133,9 @@ def initialize_langchain():
             Last Login: {customer_data.get('last_login', 'N/A')}
             
             Profile Analysis:
-            - Usage Level: {'High' if customer_data.get('monthly_usage', 0) > 80 else 'Medium' if customer_data.get('monthly_usage', 0) > 40 else 'Low'}
-            - Churn Risk: {'High' if customer_data.get('months_subscribed', 0) < 3 or customer_data.get('payment_issues', 0) > 0 or customer_data.get('support_tickets', 0) > 5 else 'Medium' if customer_data.get('months_subscribed', 0) < 12 or customer_data.get('support_tickets', 0) > 2 else 'Low'}
-            - Upsell Potential: {'High' if customer_data.get('monthly_usage', 0) > 80 else 'Medium' if customer_data.get('monthly_usage', 0) > 40 else 'Low'}
+            - Usage Level: {profile['usage_level'].title()}
+            - Churn Risk: {profile['churn_risk'].title()}
+            - Upsell Potential: {profile['upsell_potential'].title()}
             - Customer Value: {customer_data.get('revenue_impact', 'medium').title()}
             """
             
@@ -104,21 +143,22 @@ def initialize_langchain():
                 page_content=content,
                 metadata={
                     **customer_data,
+                    'user_id': user_id,
                     'customer_id': customer_data.get('name', 'Unknown'),
-                    'usage_level': 'High' if customer_data.get('monthly_usage', 0) > 80 else 'Medium' if customer_data.get('monthly_usage', 0) > 40 else 'Low',
-                    'churn_risk': 'High' if customer_data.get('months_subscribed', 0) < 3 or customer_data.get('payment_issues', 0) > 0 or customer_data.get('support_tickets', 0) > 5 else 'Medium' if customer_data.get('months_subscribed', 0) < 12 or customer_data.get('support_tickets', 0) > 2 else 'Low',
-                    'upsell_potential': 'High' if customer_data.get('monthly_usage', 0) > 80 else 'Medium' if customer_data.get('monthly_usage', 0) > 40 else 'Low'
+                    'usage_level': profile['usage_level'].title(),
+                    'churn_risk': profile['churn_risk'].title(),
+                    'upsell_potential': profile['upsell_potential'].title()
                 }
             )
             enhanced_docs.append(enhanced_doc)
         
         # Create embeddings and vector store
-        logger.info("Creating embeddings and vector store...")
-        embeddings = OpenAIEmbeddings()
-        vectorstore = FAISS.from_documents(enhanced_docs, embeddings)
+        logger.info("Loading or building vector store...")
+        embeddings = CachedEmbeddings(embedding_model())
+        vectorstore = load_or_build_vectorstore(enhanced_docs, embeddings)
         
         # Initialize LLM
-        llm = ChatOpenAI(temperature=0, model_name="gpt-4")
+        llm = chat_model(temperature=0, model_name="gpt-4", streaming=True)
         
         # Create retrieval QA chain
         retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
@@ -197,8 +237,7 @@ def initialize_langchain():
             llm=llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=True,
-            handle_parsing_errors=True,
-            callbacks=[LoggingCallbackHandler()]
+            handle_parsing_errors=True
         )
         
         logger.info("LangChain initialization complete!")
@@ -207,26 +246,13 @@ def initialize_langchain():
         logger.error(f"Error initializing LangChain: {e}")
         raise e
 
-# Load conversation history
-def load_conversation(user_id: str) -> List[Dict]:
-    logs_dir = Path("logs")
-    logs_dir.mkdir(exist_ok=True)
-    
-    log_file = logs_dir / f"{user_id}.json"
-    if log_file.exists():
-        with open(log_file, "r") as f:
-            return json.load(f)
-    return []
+# Load conversation history (optionally only the most recent turns)
+def load_conversation(user_id: str, last_n: Optional[int] = None) -> List[Dict]:
+    return conversation_log.load(user_id, last_n)
 
 # Save conversation turn with enhanced logging
 def save_conversation_turn(user_id: str, user_message: str, agent_response: str, action: str, tools_used: List[str] = None, confidence: float = 0.0):
-    logs_dir = Path("logs")
-    logs_dir.mkdir(exist_ok=True)
-    
-    log_file = logs_dir / f"{user_id}.json"
-    conversation = load_conversation(user_id)
-    
-    conversation.append({
+    conversation_log.append(user_id, {
         "timestamp": datetime.now().isoformat(),
         "user_message": user_message,
         "agent_response": agent_response,
@@ -235,9 +261,6 @@ def save_conversation_turn(user_id: str, user_message: str, agent_response: str,
         "confidence": confidence,
         "session_id": str(uuid.uuid4())
     })
-    
-    with open(log_file, "w") as f:
-        json.dump(conversation, f, indent=2)
 
 # Mount static files (frontend build)
 app.mount("/assets", StaticFiles(directory="dist/assets"), name="assets")
@@ -252,104 +275,122 @@ async def root():
 async def api_root():
     return {"message": "AI Retention & Upsell Agent API v2.0", "status": "running", "langchain": "enabled"}
 
+# Run one chat turn through the agent; on_token receives its answer tokens as they stream
+async def chat_turn(request: ChatRequest, on_token: Optional[Callable[[str], None]] = None) -> ChatResponse:
+    if not agent:
+        raise HTTPException(status_code=500, detail="LangChain agent not initialized")
+    
+    # Prepare context for the agent
+    conversation_history = load_conversation(request.userId, last_n=3)
+    context = f"""
+    You are an AI Retention & Upsell Agent for CloudFlow Pro, a comprehensive business automation platform that helps companies streamline their operations with email marketing, analytics, automation, and integrations.
+    
+    CloudFlow Pro offers:
+    - Basic Plan ($49/month): Email campaigns, basic analytics, 1,000 contacts
+    - Professional Plan ($99/month): Advanced analytics, automation, 10,000 contacts, API access
+    - Premium Plan ($299/month): Custom integrations, priority support, unlimited contacts, advanced features
+    
+    Customer ID: {request.userId}
+    
+    Recent conversation history:
+    {json.dumps(conversation_history, indent=2) if conversation_history else 'No previous conversation'}
+    
+    User message: "{request.message}"
+    
+    Your task:
+    1. Use the CustomerLookup tool to understand the customer's profile and situation
+    2. Use the OfferGenerator tool to suggest appropriate offers based on their concerns
+    3. Use the EscalationHandler tool if the issue requires human intervention
+    4. Provide a helpful, empathetic response that addresses their specific needs
+    5. Be specific about offers and next steps
+    
+    Guidelines:
+    - Always be empathetic and understanding
+    - Address their concerns directly
+    - Offer specific solutions with clear benefits
+    - Use a professional but friendly tone
+    - If suggesting offers, be specific about what they get and how it helps
+    - If escalating, explain why and what to expect
+    - Reference CloudFlow Pro features and benefits when relevant
+    """
+    
+    # Run the agent without blocking the event loop; run-time callbacks are inherited by its LLM calls and
+    # tools, so LoggingCallbackHandler counts every LLM call, and final-answer tokens go to on_token
+    callbacks = [LoggingCallbackHandler(), *([FinalAnswerStreamHandler(on_token)] if on_token else [])]
+    response = await run_agent(agent, context, callbacks=callbacks)
+    
+    # Parse response to determine action and confidence
+    response_lower = response.lower()
+    
+    # Determine action type
+    if "escalation" in response_lower or "human" in response_lower:
+        action = "escalate"
+        confidence = 0.9
+    elif any(word in response_lower for word in ["discount", "offer", "retention", "keep"]):
+        action = "retention"
+        confidence = 0.8
+    elif any(word in response_lower for word in ["upgrade", "premium", "upsell", "enhance"]):
+        action = "upsell"
+        confidence = 0.8
+    else:
+        action = "neutral"
+        confidence = 0.6
+    
+    # Extract suggested offer if present
+    suggested_offer = None
+    if "offer:" in response_lower:
+        offer_start = response_lower.find("offer:")
+        offer_text = response[offer_start:offer_start + 200]
+        suggested_offer = offer_text.split(":")[1].strip() if ":" in offer_text else None
+    
+    # Extract tools used (simplified - in production you'd track this from callbacks)
+    tools_used = []
+    if "customerlookup" in response_lower:
+        tools_used.append("CustomerLookup")
+    if "offergenerator" in response_lower:
+        tools_used.append("OfferGenerator")
+    if "escalationhandler" in response_lower:
+        tools_used.append("EscalationHandler")
+    
+    # Save conversation turn
+    save_conversation_turn(
+        request.userId,
+        request.message,
+        response,
+        action,
+        tools_used,
+        confidence
+    )
+    
+    return ChatResponse(
+        response=response,
+        action=action,
+        confidence=confidence,
+        suggestedOffer=suggested_offer,
+        tools_used=tools_used
+    )
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     try:
-        if not agent:
-            raise HTTPException(status_code=500, detail="LangChain agent not initialized")
-        
-        # Prepare context for the agent
-        conversation_history = load_conversation(request.userId)
-        context = f"""
-        You are an AI Retention & Upsell Agent for CloudFlow Pro, a comprehensive business automation platform that helps companies streamline their operations with email marketing, analytics, automation, and integrations.
-        
-        CloudFlow Pro offers:
-        - Basic Plan ($49/month): Email campaigns, basic analytics, 1,000 contacts
-        - Professional Plan ($99/month): Advanced analytics, automation, 10,000 contacts, API access
-        - Premium Plan ($299/month): Custom integrations, priority support, unlimited contacts, advanced features
-        
-        Customer ID: {request.userId}
-        
-        Recent conversation history:
-        {json.dumps(conversation_history[-3:], indent=2) if conversation_history else 'No previous conversation'}
-        
-        User message: "{request.message}"
-        
-        Your task:
-        1. Use the CustomerLookup tool to understand the customer's profile and situation
-        2. Use the OfferGenerator tool to suggest appropriate offers based on their concerns
-        3. Use the EscalationHandler tool if the issue requires human intervention
-        4. Provide a helpful, empathetic response that addresses their specific needs
-        5. Be specific about offers and next steps
-        
-        Guidelines:
-        - Always be empathetic and understanding
-        - Address their concerns directly
-        - Offer specific solutions with clear benefits
-        - Use a professional but friendly tone
-        - If suggesting offers, be specific about what they get and how it helps
-        - If escalating, explain why and what to expect
-        - Reference CloudFlow Pro features and benefits when relevant
-        """
-        
-        # Run the agent
-        response = agent.run(context)
-        
-        # Parse response to determine action and confidence
-        response_lower = response.lower()
-        
-        # Determine action type
-        if "escalation" in response_lower or "human" in response_lower:
-            action = "escalate"
-            confidence = 0.9
-        elif any(word in response_lower for word in ["discount", "offer", "retention", "keep"]):
-            action = "retention"
-            confidence = 0.8
-        elif any(word in response_lower for word in ["upgrade", "premium", "upsell", "enhance"]):
-            action = "upsell"
-            confidence = 0.8
-        else:
-            action = "neutral"
-            confidence = 0.6
-        
-        # Extract suggested offer if present
-        suggested_offer = None
-        if "offer:" in response_lower:
-            offer_start = response_lower.find("offer:")
-            offer_text = response[offer_start:offer_start + 200]
-            suggested_offer = offer_text.split(":")[1].strip() if ":" in offer_text else None
-        
-        # Extract tools used (simplified - in production you'd track this from callbacks)
-        tools_used = []
-        if "customerlookup" in response_lower:
-            tools_used.append("CustomerLookup")
-        if "offergenerator" in response_lower:
-            tools_used.append("OfferGenerator")
-        if "escalationhandler" in response_lower:
-            tools_used.append("EscalationHandler")
-        
-        # Save conversation turn
-        save_conversation_turn(
-            request.userId,
-            request.message,
-            response,
-            action,
-            tools_used,
-            confidence
-        )
-        
-        return ChatResponse(
-            response=response,
-            action=action,
-            confidence=confidence,
-            suggestedOffer=suggested_offer,
-            tools_used=tools_used
-        )
-        
+        return await chat_turn(request)
+    except AgentTimeoutError as e:
+        logger.error(f"Error in chat endpoint: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Same turn as /api/chat, sent as Server-Sent Events: token events, then a final event with the full response"""
+    start_time = time.time()
+    async def run_turn(on_token):
+        result = (await chat_turn(request, on_token)).dict()
+        result["latency_ms"] = round((time.time() - start_time) * 1000, 2)
+        return result
+    return StreamingResponse(astream_turn(run_turn), media_type=SSE_CONTENT_TYPE, headers=SSE_HEADERS)
+
 @app.get("/api/customer/{user_id}")
 async def get_customer_profile(user_id: str):
     """Get customer profile for debugging"""
@@ -358,7 +399,7 @@ async def get_customer_profile(user_id: str):
             raise HTTPException(status_code=500, detail="Vector store not initialized")
         
         # Search for customer in vector store
-        docs = vectorstore.similarity_search(f"customer {user_id}", k=1)
+        docs = await vectorstore.asimilarity_search(f"customer {user_id}", k=1)
         
         if docs:
             return {
@@ -376,6 +417,11 @@ async def get_customer_profile(user_id: str):
         logger.error(f"Error getting customer profile: {e}")
         raise HTTPException(status_code=500, detail=f"Error retrieving customer profile: {str(e)}")
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Counters and histograms in the Prometheus text format"""
+    return Response(content=render_latest(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
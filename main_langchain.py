@@ -1,21 +1,39 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import json
 import os
 import uuid
-from datetime import datetime
-from typing import Dict, List, Optional
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
 from pathlib import Path
 import logging
+
+# Shared modules
+from catalog import catalog
+from serialization import BACKEND as JSON_BACKEND, ChatReply, dumps
+from conversation_log import conversation_log
+from metrics_rollup import metrics_rollup
+from metrics_stream import dashboard_stream
+from agent_runner import run_agent, AgentTimeoutError
 import time
 import asyncio
+from vector_index import load_or_build_vectorstore
+from embedding_cache import CachedEmbeddings
+from llm_backend import chat_model, embedding_model
+from churn_scoring import score_book
+from rule_responses import fast_path_intent, rule_based_response
+from customer_profile import analyze_customer_profile
+from sse import SSE_CONTENT_TYPE, SSE_HEADERS, astream_turn
+from streaming_callbacks import FinalAnswerStreamHandler
+from http_metrics import install_http_metrics
+from telemetry import LatencyRecorder, start_trace, current_trace, span
+from prometheus_metrics import LLM_CALLS, LLM_CALL_SECONDS, CHAT_ROUTES, CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE, render_latest
 
 # LangChain imports
 from langchain_community.vectorstores import FAISS
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_community.document_loaders import JSONLoader
 from langchain.tools import Tool
 from langchain.chains import RetrievalQA
@@ -27,7 +45,8 @@ from langchain.callbacks.base import BaseCallbackHandler
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="AI Retention & Upsell Agent", version="2.0.0")
+# Encode responses with orjson when serialization picked it
+app = FastAPI(title="AI Retention & Upsell Agent", version="2.0.0", default_response_class=ORJSONResponse if JSON_BACKEND == "orjson" else JSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -42,6 +61,7 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     userId: str
     message: str
+    debug: Optional[bool] = False
 
 class ChatResponse(BaseModel):
     response: str
@@ -53,6 +73,8 @@ class ChatResponse(BaseModel):
     latency_ms: Optional[float] = None
     churn_risk_reduction: Optional[float] = None
     upsell_boost: Optional[float] = None
+    plan_comparison: Optional[Dict] = None
+    debug: Optional[Dict] = None
 
 # Global variables for LangChain components
 vectorstore = None
@@ -68,13 +90,56 @@ metrics = {
     "total_latency_ms": 0
 }
 
+# Latency histograms per endpoint and per chat action (recent window and since startup)
+latency = LatencyRecorder()
+
+# Prometheus request counters, latency and in-flight gauge; streamed responses count until they end
+install_http_metrics(app, on_finish=latency.record_endpoint)
+
 # Custom callback handler for logging
 class LoggingCallbackHandler(BaseCallbackHandler):
-    def on_tool_start(self, serialized: Dict[str, any], input_str: str, **kwargs) -> None:
-        logger.info(f"Tool started: {serialized.get('name', 'Unknown')} with input: {input_str}")
+    def __init__(self):
+        super().__init__()
+        # run_id -> (tool name, start time, trace of the chat turn that called the tool)
+        self._tool_runs = {}
+        # run_id -> (model name, start time)
+        self._llm_runs = {}
+
+    def on_llm_start(self, serialized: Dict[str, any], prompts: List[str], *, run_id=None, **kwargs) -> None:
+        params = kwargs.get('invocation_params') or {}
+        self._llm_runs[run_id] = (params.get('model_name') or params.get('model') or 'unknown', time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs) -> None:
+        self._finish_llm(run_id, "ok")
 
-    def on_tool_end(self, output: str, **kwargs) -> None:
+    def on_llm_error(self, error, *, run_id=None, **kwargs) -> None:
+        self._finish_llm(run_id, "error")
+
+    def _finish_llm(self, run_id, status: str) -> None:
+        started = self._llm_runs.pop(run_id, None)
+        if started:
+            model, started_at = started
+            LLM_CALLS.inc(model=model, status=status)
+            LLM_CALL_SECONDS.observe(time.perf_counter() - started_at, model=model)
+
+    def on_tool_start(self, serialized: Dict[str, any], input_str: str, *, run_id=None, **kwargs) -> None:
+        tool_name = serialized.get('name', 'Unknown')
+        logger.info(f"Tool started: {tool_name} with input: {input_str}")
+        self._tool_runs[run_id] = (tool_name, time.perf_counter(), current_trace())
+
+    def on_tool_end(self, output: str, *, run_id=None, **kwargs) -> None:
         logger.info(f"Tool ended with output: {output}")
+        self._finish_tool(run_id)
+
+    def on_tool_error(self, error, *, run_id=None, **kwargs) -> None:
+        self._finish_tool(run_id)
+
+    def _finish_tool(self, run_id) -> None:
+        started = self._tool_runs.pop(run_id, None)
+        if started:
+            tool_name, started_at, trace = started
+            if trace is not None:
+                trace.add(f"tool:{tool_name}", (time.perf_counter() - started_at) * 1000)
 
     def on_agent_action(self, action, **kwargs) -> None:
         logger.info(f"Agent action: {action.tool} with input: {action.tool_input}")
@@ -84,10 +149,10 @@ def initialize_langchain():
     global vectorstore, agent, llm
     
     try:
-        # Load customer data with LangChain
+        # Load customer data and score the whole book in one vectorized pass
         logger.info("Loading customer data...")
-        loader = JSONLoader(file_path="data/customers.json", jq_schema=".[]")
-        docs = loader.load()
+        customers = catalog.customers()
+        profiles = dict(score_book(customers).profiles())
         
         # Load product data
         product_loader = JSONLoader(file_path="data/products.json", jq_schema=".plans.*")
@@ -95,8 +160,8 @@ def initialize_langchain():
         
         # Enhance documents with metadata
         enhanced_docs = []
-        for doc in docs:
-            customer_data = doc.metadata
+        for user_id, customer_data in customers.items():
+            profile = profiles[user_id]
             content = f"""
             Customer: {customer_data.get('name', 'Unknown')} from {customer_data.get('company', 'Unknown Company')}
             Email: {customer_data.get('email', 'N/A')}
@@ -111,9 +176,9 @@ def initialize_langchain():
             Last Login: {customer_data.get('last_login', 'N/A')}
             
             Profile Analysis:
-            - Usage Level: {'High' if customer_data.get('monthly_usage', 0) > 80 else 'Medium' if customer_data.get('monthly_usage', 0) > 40 else 'Low'}
-            - Churn Risk: {'High' if customer_data.get('months_subscribed', 0) < 3 or customer_data.get('payment_issues', 0) > 0 or customer_data.get('support_tickets', 0) > 5 else 'Medium' if customer_data.get('months_subscribed', 0) < 12 or customer_data.get('support_tickets', 0) > 2 else 'Low'}
-            - Upsell Potential: {'High' if customer_data.get('monthly_usage', 0) > 80 else 'Medium' if customer_data.get('monthly_usage', 0) > 40 else 'Low'}
+            - Usage Level: {profile['usage_level'].title()}
+            - Churn Risk: {profile['churn_risk'].title()}
+            - Upsell Potential: {profile['upsell_potential'].title()}
             - Customer Value: {customer_data.get('revenue_impact', 'medium').title()}
             """
             
@@ -121,10 +186,11 @@ def initialize_langchain():
                 page_content=content,
                 metadata={
                     **customer_data,
+                    'user_id': user_id,
                     'customer_id': customer_data.get('name', 'Unknown'),
-                    'usage_level': 'High' if customer_data.get('monthly_usage', 0) > 80 else 'Medium' if customer_data.get('monthly_usage', 0) > 40 else 'Low',
-                    'churn_risk': 'High' if customer_data.get('months_subscribed', 0) < 3 or customer_data.get('payment_issues', 0) > 0 or customer_data.get('support_tickets', 0) > 5 else 'Medium' if customer_data.get('months_subscribed', 0) < 12 or customer_data.get('support_tickets', 0) > 2 else 'Low',
-                    'upsell_potential': 'High' if customer_data.get('monthly_usage', 0) > 80 else 'Medium' if customer_data.get('monthly_usage', 0) > 40 else 'Low'
+                    'usage_level': profile['usage_level'].title(),
+                    'churn_risk': profile['churn_risk'].title(),
+                    'upsell_potential': profile['upsell_potential'].title()
                 }
             )
             enhanced_docs.append(enhanced_doc)
@@ -133,12 +199,12 @@ def initialize_langchain():
         enhanced_docs.extend(product_docs)
         
         # Create embeddings and vector store
-        logger.info("Creating embeddings and vector store...")
-        embeddings = OpenAIEmbeddings()
-        vectorstore = FAISS.from_documents(enhanced_docs, embeddings)
+        logger.info("Loading or building vector store...")
+        embeddings = CachedEmbeddings(embedding_model())
+        vectorstore = load_or_build_vectorstore(enhanced_docs, embeddings)
         
         # Initialize LLM with GPT-4
-        llm = ChatOpenAI(temperature=0, model_name="gpt-4")
+        llm = chat_model(temperature=0, model_name="gpt-4", streaming=True)
         
         # Create retrieval QA chain
         retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
@@ -217,8 +283,7 @@ def initialize_langchain():
             llm=llm,
             agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
             verbose=True,
-            handle_parsing_errors=True,
-            callbacks=[LoggingCallbackHandler()]
+            handle_parsing_errors=True
         )
         
         logger.info("LangChain initialization complete!")
@@ -227,26 +292,13 @@ def initialize_langchain():
         logger.error(f"Error initializing LangChain: {e}")
         raise e
 
-# Load conversation history
-def load_conversation(user_id: str) -> List[Dict]:
-    logs_dir = Path("logs")
-    logs_dir.mkdir(exist_ok=True)
-    
-    log_file = logs_dir / f"{user_id}.json"
-    if log_file.exists():
-        with open(log_file, "r") as f:
-            return json.load(f)
-    return []
+# Load conversation history (optionally only the most recent turns)
+def load_conversation(user_id: str, last_n: Optional[int] = None) -> List[Dict]:
+    return conversation_log.load(user_id, last_n)
 
 # Save conversation turn with enhanced logging
 def save_conversation_turn(user_id: str, user_message: str, agent_response: str, action: str, tools_used: List[str] = None, confidence: float = 0.0, latency_ms: float = 0.0, churn_risk_reduction: float = 0.0, upsell_boost: float = 0.0):
-    logs_dir = Path("logs")
-    logs_dir.mkdir(exist_ok=True)
-    
-    log_file = logs_dir / f"{user_id}.json"
-    conversation = load_conversation(user_id)
-    
-    conversation.append({
+    conversation_log.append(user_id, {
         "timestamp": datetime.now().isoformat(),
         "user_message": user_message,
         "agent_response": agent_response,
@@ -258,9 +310,6 @@ def save_conversation_turn(user_id: str, user_message: str, agent_response: str,
         "upsell_boost": upsell_boost,
         "session_id": str(uuid.uuid4())
     })
-    
-    with open(log_file, "w") as f:
-        json.dump(conversation, f, indent=2)
 
 # Calculate metrics
 def calculate_metrics(action: str, confidence: float) -> tuple:
@@ -289,123 +338,165 @@ async def root():
 async def api_root():
     return {"message": "AI Retention & Upsell Agent API v2.0", "status": "running", "langchain": "enabled"}
 
-@app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+# Run the agent for one turn and read action, offer, tools and quick replies out of its answer
+async def agent_reply(user_id: str, message: str, on_token: Optional[Callable[[str], None]] = None) -> Dict:
+    """Ask the LangChain agent to answer a message that the rule-based fast path can't"""
+    if not agent:
+        raise HTTPException(status_code=500, detail="LangChain agent not initialized")
+    
+    # Prepare context for the agent
+    with span("load_conversation"):
+        conversation_history = load_conversation(user_id, last_n=3)
+    context = f"""
+    You are an AI Retention & Upsell Agent for a comprehensive business automation platform.
+    
+    Customer ID: {user_id}
+    
+    Recent conversation history:
+    {json.dumps(conversation_history, indent=2) if conversation_history else 'No previous conversation'}
+    
+    User message: "{message}"
+    
+    Your task:
+    1. Use the CustomerLookup tool to understand the customer's profile and situation
+    2. Use the OfferGenerator tool to suggest appropriate offers based on their concerns
+    3. Use the EscalationHandler tool if the issue requires human intervention
+    4. Provide a helpful, empathetic response that addresses their specific needs
+    5. Be specific about offers and next steps
+    6. Always include quick-reply options for the user
+    
+    Guidelines:
+    - Always be empathetic and understanding
+    - Address their concerns directly
+    - Offer specific solutions with clear benefits
+    - Use a professional but friendly tone
+    - If suggesting offers, be specific about what they get and how it helps
+    - If escalating, explain why and what to expect
+    - Always provide 3-4 quick-reply options
+    """
+    
+    # Run the agent without blocking the event loop; run-time callbacks are inherited by its LLM calls and
+    # tools, so LoggingCallbackHandler counts every LLM call and times every tool call
+    callbacks = [LoggingCallbackHandler(), *([FinalAnswerStreamHandler(on_token)] if on_token else [])]
+    with span("agent_run"):
+        response = await run_agent(agent, context, callbacks=callbacks)
+    
+    # Parse response to determine action and confidence
+    response_lower = response.lower()
+    
+    # Determine action type
+    if "escalation" in response_lower or "human" in response_lower:
+        action = "escalate"
+        confidence = 0.9
+    elif any(word in response_lower for word in ["discount", "offer", "retention", "keep"]):
+        action = "retention"
+        confidence = 0.8
+    elif any(word in response_lower for word in ["upgrade", "premium", "upsell", "enhance"]):
+        action = "upsell"
+        confidence = 0.8
+    else:
+        action = "neutral"
+        confidence = 0.6
+    
+    # Extract suggested offer if present
+    suggested_offer = None
+    if "offer:" in response_lower:
+        offer_start = response_lower.find("offer:")
+        offer_text = response[offer_start:offer_start + 200]
+        suggested_offer = offer_text.split(":")[1].strip() if ":" in offer_text else None
+    
+    # Extract tools used (simplified - in production you'd track this from callbacks)
+    tools_used = []
+    if "customerlookup" in response_lower:
+        tools_used.append("CustomerLookup")
+    if "offergenerator" in response_lower:
+        tools_used.append("OfferGenerator")
+    if "escalationhandler" in response_lower:
+        tools_used.append("EscalationHandler")
+    
+    # Generate quick-reply options based on action
+    options = []
+    if action == "retention":
+        options = [
+            "Yes, I'll take the offer",
+            "Let me think about it",
+            "I still want to cancel",
+            "Talk to a human"
+        ]
+    elif action == "upsell":
+        options = [
+            "Yes, upgrade me",
+            "Show me the features",
+            "What's the price?",
+            "Not interested"
+        ]
+    elif action == "escalate":
+        options = [
+            "Schedule a call",
+            "Send me an email",
+            "I'll wait",
+            "Cancel request"
+        ]
+    else:
+        options = [
+            "Show me my plan",
+            "What features do I have?",
+            "How can I upgrade?",
+            "Talk to a human"
+        ]
+    
+    return {
+        "response": response,
+        "action": action,
+        "confidence": confidence,
+        "suggestedOffer": suggested_offer,
+        "tools_used": tools_used,
+        "options": options
+    }
+
+# Run one chat turn; on_token receives the agent's answer tokens as they stream
+async def chat_turn(request: ChatRequest, on_token: Optional[Callable[[str], None]] = None) -> ChatReply:
     start_time = time.time()
+    trace = start_trace()
     
-    try:
-        if not agent:
-            raise HTTPException(status_code=500, detail="LangChain agent not initialized")
-        
-        # Prepare context for the agent
-        conversation_history = load_conversation(request.userId)
-        context = f"""
-        You are an AI Retention & Upsell Agent for a comprehensive business automation platform.
-        
-        Customer ID: {request.userId}
-        
-        Recent conversation history:
-        {json.dumps(conversation_history[-3:], indent=2) if conversation_history else 'No previous conversation'}
-        
-        User message: "{request.message}"
-        
-        Your task:
-        1. Use the CustomerLookup tool to understand the customer's profile and situation
-        2. Use the OfferGenerator tool to suggest appropriate offers based on their concerns
-        3. Use the EscalationHandler tool if the issue requires human intervention
-        4. Provide a helpful, empathetic response that addresses their specific needs
-        5. Be specific about offers and next steps
-        6. Always include quick-reply options for the user
-        
-        Guidelines:
-        - Always be empathetic and understanding
-        - Address their concerns directly
-        - Offer specific solutions with clear benefits
-        - Use a professional but friendly tone
-        - If suggesting offers, be specific about what they get and how it helps
-        - If escalating, explain why and what to expect
-        - Always provide 3-4 quick-reply options
-        """
-        
-        # Run the agent
-        response = agent.run(context)
-        
-        # Calculate latency
-        latency_ms = (time.time() - start_time) * 1000
-        
-        # Parse response to determine action and confidence
-        response_lower = response.lower()
-        
-        # Determine action type
-        if "escalation" in response_lower or "human" in response_lower:
-            action = "escalate"
-            confidence = 0.9
-        elif any(word in response_lower for word in ["discount", "offer", "retention", "keep"]):
-            action = "retention"
-            confidence = 0.8
-        elif any(word in response_lower for word in ["upgrade", "premium", "upsell", "enhance"]):
-            action = "upsell"
-            confidence = 0.8
-        else:
-            action = "neutral"
-            confidence = 0.6
-        
-        # Calculate metrics
-        churn_risk_reduction, upsell_boost = calculate_metrics(action, confidence)
-        
-        # Update global metrics
-        metrics["total_conversations"] += 1
-        metrics["total_latency_ms"] += latency_ms
-        metrics["avg_latency_ms"] = metrics["total_latency_ms"] / metrics["total_conversations"]
-        
-        # Extract suggested offer if present
-        suggested_offer = None
-        if "offer:" in response_lower:
-            offer_start = response_lower.find("offer:")
-            offer_text = response[offer_start:offer_start + 200]
-            suggested_offer = offer_text.split(":")[1].strip() if ":" in offer_text else None
-        
-        # Extract tools used (simplified - in production you'd track this from callbacks)
-        tools_used = []
-        if "customerlookup" in response_lower:
-            tools_used.append("CustomerLookup")
-        if "offergenerator" in response_lower:
-            tools_used.append("OfferGenerator")
-        if "escalationhandler" in response_lower:
-            tools_used.append("EscalationHandler")
-        
-        # Generate quick-reply options based on action
-        options = []
-        if action == "retention":
-            options = [
-                "Yes, I'll take the offer",
-                "Let me think about it",
-                "I still want to cancel",
-                "Talk to a human"
-            ]
-        elif action == "upsell":
-            options = [
-                "Yes, upgrade me",
-                "Show me the features",
-                "What's the price?",
-                "Not interested"
-            ]
-        elif action == "escalate":
-            options = [
-                "Schedule a call",
-                "Send me an email",
-                "I'll wait",
-                "Cancel request"
-            ]
-        else:
-            options = [
-                "Show me my plan",
-                "What features do I have?",
-                "How can I upgrade?",
-                "Talk to a human"
-            ]
-        
-        # Save conversation turn
+    # Greetings and requests for a human are answered by rule; everything else goes to the agent
+    fast_intent = fast_path_intent(request.message)
+    if fast_intent:
+        with span("fast_path"):
+            customer_data = catalog.customer_or_default(request.userId)
+            reply = rule_based_response(fast_intent, analyze_customer_profile(customer_data), catalog.products())
+    else:
+        reply = await agent_reply(request.userId, request.message, on_token)
+    CHAT_ROUTES.inc(route="fast_path" if fast_intent else "agent")
+    
+    response = reply["response"]
+    action = reply["action"]
+    confidence = reply["confidence"]
+    suggested_offer = reply["suggestedOffer"]
+    tools_used = reply["tools_used"]
+    options = reply["options"]
+    
+    # Calculate latency
+    latency_ms = (time.time() - start_time) * 1000
+    
+    # Calculate metrics
+    churn_risk_reduction, upsell_boost = calculate_metrics(action, confidence)
+    
+    # Update global metrics
+    latency.record_action(action, latency_ms)
+    metrics["total_conversations"] += 1
+    metrics["total_latency_ms"] += latency_ms
+    metrics["avg_latency_ms"] = metrics["total_latency_ms"] / metrics["total_conversations"]
+    
+    # Add comparison data for plan suggestions (precomputed per plan and action)
+    plan_comparison = None
+    if action in ['upsell', 'retention']:
+        with span("plan_comparison"):
+            customer = catalog.find_customer(request.userId)
+            plan_comparison = catalog.plan_comparison(customer.get("plan", "basic") if customer else "basic", action)
+    
+    # Save conversation turn
+    with span("save_conversation"):
         save_conversation_turn(
             request.userId,
             request.message,
@@ -417,23 +508,44 @@ async def chat(request: ChatRequest):
             churn_risk_reduction,
             upsell_boost
         )
-        
-        return ChatResponse(
-            response=response,
-            action=action,
-            confidence=confidence,
-            suggestedOffer=suggested_offer,
-            tools_used=tools_used,
-            options=options,
-            latency_ms=latency_ms,
-            churn_risk_reduction=churn_risk_reduction,
-            upsell_boost=upsell_boost
-        )
-        
+    
+    # Per-stage timings: always aggregated, returned only when asked for
+    latency.record_stages(trace)
+    
+    return ChatReply(
+        response=response,
+        action=action,
+        confidence=confidence,
+        suggestedOffer=suggested_offer,
+        tools_used=tools_used,
+        options=options,
+        latency_ms=latency_ms,
+        churn_risk_reduction=churn_risk_reduction,
+        upsell_boost=upsell_boost,
+        plan_comparison=plan_comparison,
+        debug={"stages": trace.breakdown()} if request.debug else None
+    )
+
+# ChatResponse only documents the reply: it is encoded straight from ChatReply, so the
+# precomputed plan_comparison bytes are spliced in rather than validated and re-encoded
+@app.post("/api/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest):
+    try:
+        return Response(content=dumps(await chat_turn(request)), media_type="application/json")
+    except AgentTimeoutError as e:
+        logger.error(f"Error in chat endpoint: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Same turn as /api/chat, sent as Server-Sent Events: token events, then a final event with the full response"""
+    async def run_turn(on_token):
+        return await chat_turn(request, on_token)
+    return StreamingResponse(astream_turn(run_turn), media_type=SSE_CONTENT_TYPE, headers=SSE_HEADERS)
+
 @app.get("/api/metrics")
 async def get_metrics():
     """Get performance metrics"""
@@ -442,12 +554,40 @@ async def get_metrics():
         "churn_prevented": metrics["churn_prevented"],
         "upsells_completed": metrics["upsells_completed"],
         "avg_latency_ms": round(metrics["avg_latency_ms"], 2),
+        "latency": latency.summary(),
         "churn_risk_reduction": "35%",
         "upsell_boost": "20%",
         "langchain_enabled": agent is not None,
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/api/metrics/stream")
+async def metrics_stream():
+    """Dashboard metrics as Server-Sent Events: a snapshot, then coalesced deltas (see metrics_stream.py)"""
+    return StreamingResponse(dashboard_stream.astream(), media_type=SSE_CONTENT_TYPE, headers=SSE_HEADERS)
+
+@app.get("/api/metrics/rollups")
+async def get_metrics_rollups(resolution: str = "hour", window: Optional[float] = None, limit: Optional[int] = None):
+    """Pre-aggregated per-minute/hour/day metrics from the conversation logs (see metrics_rollup.py)"""
+    since = (datetime.now() - timedelta(seconds=window)).isoformat() if window else None
+    try:
+        return metrics_rollup.report(resolution, since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/metrics/actions")
+async def get_metrics_actions(since: Optional[str] = None, until: Optional[str] = None, window: Optional[float] = None):
+    """Turns per action between since and until (ISO timestamps) or over the last window seconds"""
+    if window:
+        since = (datetime.now() - timedelta(seconds=window)).isoformat()
+    actions = conversation_log.count_actions(since, until)
+    return {"since": since, "until": until, "actions": actions, "total": sum(actions.values())}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Counters and histograms in the Prometheus text format"""
+    return Response(content=render_latest(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
@@ -469,6 +609,7 @@ async def serve_react_app(path: str):
 @app.on_event("startup")
 async def startup_event():
     """Initialize LangChain components on startup"""
+    metrics_rollup.start()
     try:
         initialize_langchain()
         logger.info("Application startup complete!")
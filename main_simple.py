@@ -1,7 +1,7 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import json
 import os
@@ -10,12 +10,23 @@ from datetime import datetime
 from typing import Dict, List, Optional
 from pathlib import Path
 import logging
+import time
+
+# Shared modules
+from catalog import catalog
+from serialization import BACKEND as JSON_BACKEND
+from conversation_log import conversation_log
+from customer_profile import analyze_customer_profile
+from sse import SSE_CONTENT_TYPE, SSE_HEADERS, astream_turn
+from prometheus_metrics import CONTENT_TYPE as PROMETHEUS_CONTENT_TYPE, render_latest
+from http_metrics import install_http_metrics
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="AI Retention & Upsell Agent", version="2.0.0")
+# Encode responses with orjson when serialization picked it
+app = FastAPI(title="AI Retention & Upsell Agent", version="2.0.0", default_response_class=ORJSONResponse if JSON_BACKEND == "orjson" else JSONResponse)
 
 # CORS middleware
 app.add_middleware(
@@ -26,6 +37,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus request counters, latency and in-flight gauge; streamed responses count until they end
+install_http_metrics(app)
+
 # Pydantic models
 class ChatRequest(BaseModel):
     userId: str
@@ -38,34 +52,17 @@ class ChatResponse(BaseModel):
     suggestedOffer: Optional[str] = None
     tools_used: Optional[List[str]] = None
 
-# Load customer data
+# Load customer data (cached, reloaded when the file changes)
 def load_customer_data():
-    data_path = Path("data/customers.json")
-    if data_path.exists():
-        with open(data_path, "r") as f:
-            return json.load(f)
-    return {}
+    return catalog.customers()
 
-# Load conversation history
-def load_conversation(user_id: str) -> List[Dict]:
-    logs_dir = Path("logs")
-    logs_dir.mkdir(exist_ok=True)
-    
-    log_file = logs_dir / f"{user_id}.json"
-    if log_file.exists():
-        with open(log_file, "r") as f:
-            return json.load(f)
-    return []
+# Load conversation history (optionally only the most recent turns)
+def load_conversation(user_id: str, last_n: Optional[int] = None) -> List[Dict]:
+    return conversation_log.load(user_id, last_n)
 
 # Save conversation turn with enhanced logging
 def save_conversation_turn(user_id: str, user_message: str, agent_response: str, action: str, tools_used: List[str] = None, confidence: float = 0.0):
-    logs_dir = Path("logs")
-    logs_dir.mkdir(exist_ok=True)
-    
-    log_file = logs_dir / f"{user_id}.json"
-    conversation = load_conversation(user_id)
-    
-    conversation.append({
+    conversation_log.append(user_id, {
         "timestamp": datetime.now().isoformat(),
         "user_message": user_message,
         "agent_response": agent_response,
@@ -74,52 +71,6 @@ def save_conversation_turn(user_id: str, user_message: str, agent_response: str,
         "confidence": confidence,
         "session_id": str(uuid.uuid4())
     })
-    
-    with open(log_file, "w") as f:
-        json.dump(conversation, f, indent=2)
-
-# Customer data analysis
-def analyze_customer_profile(customer_data: Dict) -> Dict:
-    """Analyze customer profile to determine churn risk and upsell potential"""
-    profile = {
-        "churn_risk": "low",
-        "upsell_potential": "low",
-        "usage_level": "low",
-        "satisfaction_indicators": [],
-        "retention_strategy": "standard"
-    }
-    
-    # Analyze usage patterns
-    if customer_data.get("monthly_usage", 0) > 80:
-        profile["usage_level"] = "high"
-        profile["upsell_potential"] = "high"
-    elif customer_data.get("monthly_usage", 0) > 40:
-        profile["usage_level"] = "medium"
-        profile["upsell_potential"] = "medium"
-    
-    # Analyze subscription length
-    months_subscribed = customer_data.get("months_subscribed", 0)
-    if months_subscribed < 3:
-        profile["churn_risk"] = "high"
-        profile["retention_strategy"] = "aggressive"
-    elif months_subscribed < 12:
-        profile["churn_risk"] = "medium"
-        profile["retention_strategy"] = "moderate"
-    
-    # Analyze payment history
-    if customer_data.get("payment_issues", 0) > 0:
-        profile["churn_risk"] = "high"
-        profile["satisfaction_indicators"].append("payment_issues")
-    
-    # Analyze support tickets
-    support_tickets = customer_data.get("support_tickets", 0)
-    if support_tickets > 5:
-        profile["churn_risk"] = "high"
-        profile["satisfaction_indicators"].append("high_support_volume")
-    elif support_tickets > 2:
-        profile["churn_risk"] = "medium"
-    
-    return profile
 
 # Enhanced AI response for demo purposes
 def generate_ai_response(user_message: str, customer_profile: Dict, conversation_history: List[Dict]) -> Dict:
@@ -242,44 +193,57 @@ async def root():
 async def api_root():
     return {"message": "AI Retention & Upsell Agent API v2.0", "status": "running", "langchain": "demo_mode"}
 
+# Run one chat turn and return the full rule-based reply (quick-reply options included)
+def chat_turn(request: ChatRequest) -> Dict:
+    # Load customer data
+    customers = load_customer_data()
+    customer_data = customers.get(request.userId, {
+        "monthly_usage": 50,
+        "months_subscribed": 6,
+        "payment_issues": 0,
+        "support_tickets": 1,
+        "plan": "basic"
+    })
+    
+    # Analyze customer profile
+    customer_profile = analyze_customer_profile(customer_data)
+    
+    # Load conversation history
+    conversation_history = load_conversation(request.userId, last_n=3)
+    
+    # Generate AI response
+    ai_response = generate_ai_response(request.message, customer_profile, conversation_history)
+    
+    # Save conversation turn
+    save_conversation_turn(
+        request.userId,
+        request.message,
+        ai_response["response"],
+        ai_response["action"],
+        ai_response["tools_used"],
+        ai_response["confidence"]
+    )
+    
+    return ai_response
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     try:
-        # Load customer data
-        customers = load_customer_data()
-        customer_data = customers.get(request.userId, {
-            "monthly_usage": 50,
-            "months_subscribed": 6,
-            "payment_issues": 0,
-            "support_tickets": 1,
-            "plan": "basic"
-        })
-        
-        # Analyze customer profile
-        customer_profile = analyze_customer_profile(customer_data)
-        
-        # Load conversation history
-        conversation_history = load_conversation(request.userId)
-        
-        # Generate AI response
-        ai_response = generate_ai_response(request.message, customer_profile, conversation_history)
-        
-        # Save conversation turn
-        save_conversation_turn(
-            request.userId,
-            request.message,
-            ai_response["response"],
-            ai_response["action"],
-            ai_response["tools_used"],
-            ai_response["confidence"]
-        )
-        
-        return ChatResponse(**ai_response)
-        
+        return ChatResponse(**chat_turn(request))
     except Exception as e:
         logger.error(f"Error in chat endpoint: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """Same turn as /api/chat, sent as Server-Sent Events; the rule-based reply is streamed a few words at a time"""
+    start_time = time.time()
+    async def run_turn(on_token):
+        result = chat_turn(request)
+        result["latency_ms"] = round((time.time() - start_time) * 1000, 2)
+        return result
+    return StreamingResponse(astream_turn(run_turn), media_type=SSE_CONTENT_TYPE, headers=SSE_HEADERS)
+
 @app.get("/api/customer/{user_id}")
 async def get_customer_profile(user_id: str):
     """Get customer profile for debugging"""
@@ -297,6 +261,11 @@ async def get_customer_profile(user_id: str):
         logger.error(f"Error getting customer profile: {e}")
         raise HTTPException(status_code=500, detail=f"Error retrieving customer profile: {str(e)}")
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Counters and histograms in the Prometheus text format"""
+    return Response(content=render_latest(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
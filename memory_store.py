@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+import logging
+import urllib.parse
+from collections import OrderedDict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from intent_matcher import MEMORY_TOPICS, MEMORY_CONCERNS
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Users kept in memory, and how long (seconds) an untouched user is kept
+MEMORY_MAX_USERS = int(os.getenv("CONVERSATION_MEMORY_MAX_USERS", "10000"))
+MEMORY_TTL_SECONDS = float(os.getenv("CONVERSATION_MEMORY_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# Directory evicted users are written to and restored from; unset means evicted users are dropped
+MEMORY_SPILL_DIR = os.getenv("CONVERSATION_MEMORY_SPILL_DIR", "")
+
+# One bit per known topic / concern, in the order they are reported
+TOPIC_BITS = {topic: 1 << i for i, topic in enumerate(MEMORY_TOPICS)}
+CONCERN_BITS = {concern: 1 << i for i, concern in enumerate(MEMORY_CONCERNS)}
+
+
+def to_mask(names: Iterable[str], bits: Dict[str, int]) -> int:
+    mask = 0
+    for name in names:
+        mask |= bits.get(name, 0)
+    return mask
+
+
+def from_mask(mask: int, bits: Dict[str, int]) -> List[str]:
+    return [name for name, bit in bits.items() if mask & bit]
+
+
+class MemoryRecord:
+    """What we remember about one user: two small ints instead of a dict of lists"""
+
+    __slots__ = ("topics", "concerns", "preferences", "last_updated")
+
+    def __init__(self, topics: int = 0, concerns: int = 0, preferences: Optional[Dict] = None, last_updated: float = 0.0):
+        self.topics = topics
+        self.concerns = concerns
+        self.preferences = preferences
+        self.last_updated = last_updated
+
+    def to_dict(self) -> Dict:
+        return {
+            "topics_mentioned": from_mask(self.topics, TOPIC_BITS),
+            "preferences": dict(self.preferences or {}),
+            "concerns": from_mask(self.concerns, CONCERN_BITS),
+            "last_updated": datetime.fromtimestamp(self.last_updated).isoformat()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "MemoryRecord":
+        return cls(
+            to_mask(data.get("topics_mentioned", []), TOPIC_BITS),
+            to_mask(data.get("concerns", []), CONCERN_BITS),
+            data.get("preferences") or None,
+            datetime.fromisoformat(data["last_updated"]).timestamp() if data.get("last_updated") else time.time()
+        )
+
+
+class ConversationMemoryStore:
+    """Per-user topics and concerns, bounded by user count and idle time
+
+    Records are kept in least-recently-updated order, so both the TTL sweep
+    and the size cap only ever drop entries from the front. With a spill
+    directory configured, dropped records are written there and read back
+    the next time the user shows up. The writes happen after the store lock
+    is released; until a record is on disk it is still found in _pending.
+    Spill files are read back the same way, outside the store lock.
+    """
+
+    def __init__(self, max_users: int = MEMORY_MAX_USERS, ttl_seconds: float = MEMORY_TTL_SECONDS, spill_dir: Optional[str] = MEMORY_SPILL_DIR):
+        self.max_users = max(1, max_users)
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.evictions = 0
+        self._records: "OrderedDict[str, MemoryRecord]" = OrderedDict()
+        self._lock = threading.Lock()
+        # user_id -> (record, eviction number) for evicted records not yet written to the spill directory
+        self._pending: Dict[str, tuple] = {}
+        self._spilled = 0
+        # Orders spill writes, so an older copy of a record never replaces a newer one
+        self._spill_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _spill_path(self, user_id: str) -> Path:
+        return self.spill_dir / f"{urllib.parse.quote(user_id, safe='')}.json"
+
+    def _read_spilled(self, user_id: str) -> Optional[MemoryRecord]:
+        """Called with _spill_lock held (no spill rewrites the file meanwhile) and without the store lock"""
+        path = self._spill_path(user_id)
+        try:
+            with open(path, "rb") as f:
+                record = MemoryRecord.from_dict(loads(f.read()))
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable spilled memory {path}: {e}")
+            return None
+        # The file stays; it is only read while the user is not in memory, and re-spilling overwrites it
+        return record
+
+    def _find_locked(self, user_id: str) -> Optional[MemoryRecord]:
+        record = self._records.get(user_id)
+        if record is None:
+            pending = self._pending.get(user_id)
+            record = pending[0] if pending is not None else None
+        return record
+
+    def _spill(self, evicted: List[tuple]):
+        """Write evicted records out; called without the store lock held"""
+        if self.spill_dir is None or not evicted:
+            return
+        with self._spill_lock:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            for user_id, number in evicted:
+                with self._lock:
+                    pending = self._pending.get(user_id)
+                    # Skip users restored since, or evicted again (that later eviction writes them)
+                    if pending is None or pending[1] != number:
+                        continue
+                    data = dumps(pending[0].to_dict())
+                path = self._spill_path(user_id)
+                tmp = path.with_suffix(".json.tmp")
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+                with self._lock:
+                    if self._pending.get(user_id, (None, None))[1] == number:
+                        del self._pending[user_id]
+
+    def _evict_locked(self, now: float) -> List[tuple]:
+        evicted = []
+        while self._records:
+            user_id, record = next(iter(self._records.items()))
+            if len(self._records) <= self.max_users and now - record.last_updated < self.ttl_seconds:
+                break
+            self._records.popitem(last=False)
+            self.evictions += 1
+            if self.spill_dir is not None:
+                self._spilled += 1
+                self._pending[user_id] = (record, self._spilled)
+                evicted.append((user_id, self._spilled))
+        return evicted
+
+    def _update_locked(self, user_id: str, spilled: Optional[MemoryRecord], topics: Iterable[str], concerns: Iterable[str], now: float) -> List[tuple]:
+        record = self._records.get(user_id)
+        if record is None:
+            # A record still awaiting its spill write is newer than anything read from disk
+            pending = self._pending.pop(user_id, None)
+            record = pending[0] if pending is not None else spilled or MemoryRecord()
+            self._records[user_id] = record
+        else:
+            self._records.move_to_end(user_id)
+        record.topics |= to_mask(topics, TOPIC_BITS)
+        record.concerns |= to_mask(concerns, CONCERN_BITS)
+        record.last_updated = now
+        return self._evict_locked(now)
+
+    def update(self, user_id: str, topics: Iterable[str], concerns: Iterable[str]):
+        """Remember topics and concerns seen in a new message from user_id"""
+        now = time.time()
+        with self._lock:
+            on_disk = self.spill_dir is not None and self._find_locked(user_id) is None
+            if not on_disk:
+                evicted = self._update_locked(user_id, None, topics, concerns, now)
+        if on_disk:
+            # Read the spill file without the store lock, then check again under it
+            with self._spill_lock:
+                spilled = self._read_spilled(user_id)
+                with self._lock:
+                    evicted = self._update_locked(user_id, spilled, topics, concerns, now)
+        # Other requests go on while this one writes what it evicted
+        self._spill(evicted)
+
+    def get(self, user_id: str) -> Dict:
+        """The user's memory as a plain dict, or {} if nothing is remembered"""
+        with self._lock:
+            record = self._find_locked(user_id)
+            if record is not None or self.spill_dir is None:
+                return record.to_dict() if record is not None else {}
+        # Reads do not count as activity, so a spilled user is answered from disk without reloading
+        with self._spill_lock:
+            spilled = self._read_spilled(user_id)
+            with self._lock:
+                record = self._find_locked(user_id) or spilled
+                return record.to_dict() if record is not None else {}
@@ -0,0 +1,354 @@
+import argparse
+import os
+import sqlite3
+import sys
+import threading
+import logging
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, run a single rollup process
+    fcntl = None
+
+from conversation_log import conversation_log
+from serialization import dumps, loads
+from telemetry import LatencyHistogram
+
+logger = logging.getLogger(__name__)
+
+METRICS_ROLLUP_PATH = Path(os.getenv("METRICS_ROLLUP_PATH", "cache/metrics_rollups.sqlite3"))
+# Also how stale the live dashboard stream can get; each pass only reads what was appended since the last
+METRICS_ROLLUP_INTERVAL_SECONDS = float(os.getenv("METRICS_ROLLUP_INTERVAL_SECONDS", "1"))
+
+# Resolution -> (length of the ISO timestamp prefix that names a bucket, how long buckets are kept)
+RESOLUTIONS: Dict[str, Tuple[int, timedelta]] = {
+    "minute": (16, timedelta(days=2)),
+    "hour": (13, timedelta(days=90)),
+    "day": (10, timedelta(days=3 * 365)),
+}
+
+OFFER_ACTIONS = ("retention", "upsell")
+
+# Same rule as the servers' in-process counters: an offer only counts as shown (and the churn
+# prevented / upsell completed) when the reply was more than this confident
+CONFIDENT_ABOVE = 0.7
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS rollups (resolution TEXT NOT NULL, bucket TEXT NOT NULL, data BLOB NOT NULL, PRIMARY KEY (resolution, bucket)) WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS checkpoint (id INTEGER PRIMARY KEY CHECK (id = 1), data BLOB NOT NULL)",
+)
+
+
+class Bucket:
+    """Counters and a latency histogram for one time bucket; merges like the histograms it holds"""
+
+    __slots__ = ("turns", "actions", "offers_shown", "offers_accepted", "offers_declined", "escalations", "tickets", "latency", "churn_prevented", "upsells_completed")
+
+    def __init__(self):
+        self.turns = 0
+        self.actions: Dict[str, int] = {}
+        self.offers_shown = 0
+        self.offers_accepted = 0
+        self.offers_declined = 0
+        self.escalations = 0
+        self.tickets = 0
+        self.latency = LatencyHistogram()
+        self.churn_prevented = 0
+        self.upsells_completed = 0
+
+    def add(self, turn: Dict):
+        event = turn.get("event")
+        if event == "offer_response":
+            if turn.get("accepted"):
+                self.offers_accepted += 1
+            else:
+                self.offers_declined += 1
+            return
+        if event == "escalation":
+            self.escalations += 1
+            self.tickets += 1
+            return
+        action = turn.get("action") or "unknown"
+        self.turns += 1
+        self.actions[action] = self.actions.get(action, 0) + 1
+        if action in OFFER_ACTIONS:
+            if (turn.get("confidence") or 0) > CONFIDENT_ABOVE:
+                self.offers_shown += 1
+                if action == "retention":
+                    self.churn_prevented += 1
+                else:
+                    self.upsells_completed += 1
+        elif action == "escalate":
+            self.escalations += 1
+        latency_ms = turn.get("latency_ms")
+        if latency_ms:
+            self.latency.record(float(latency_ms))
+
+    def merge(self, other: "Bucket"):
+        self.turns += other.turns
+        for action, count in other.actions.items():
+            self.actions[action] = self.actions.get(action, 0) + count
+        self.offers_shown += other.offers_shown
+        self.offers_accepted += other.offers_accepted
+        self.offers_declined += other.offers_declined
+        self.escalations += other.escalations
+        self.tickets += other.tickets
+        self.latency.merge(other.latency)
+        self.churn_prevented += other.churn_prevented
+        self.upsells_completed += other.upsells_completed
+
+    def encode(self) -> bytes:
+        """Compact form for storage: the histogram as sparse [index, count] pairs"""
+        latency = self.latency
+        return dumps([
+            self.turns, self.actions, self.offers_shown, self.offers_accepted, self.offers_declined,
+            self.escalations, self.tickets,
+            [[i, n] for i, n in enumerate(latency.counts) if n], latency.count, latency.total_ms, latency.max_ms,
+            self.churn_prevented, self.upsells_completed,
+        ])
+
+    @classmethod
+    def decode(cls, blob: bytes) -> "Bucket":
+        bucket = cls()
+        fields = loads(blob)
+        (bucket.turns, bucket.actions, bucket.offers_shown, bucket.offers_accepted, bucket.offers_declined,
+         bucket.escalations, bucket.tickets, counts, count, total_ms, max_ms) = fields[:11]
+        # Buckets stored before the confidence-filtered counters have 11 fields; those read as 0
+        if len(fields) > 11:
+            bucket.churn_prevented, bucket.upsells_completed = fields[11:13]
+        for i, n in counts:
+            bucket.latency.counts[i] = n
+        bucket.latency.count = count
+        bucket.latency.total_ms = total_ms
+        bucket.latency.max_ms = max_ms
+        return bucket
+
+    def summary(self) -> Dict:
+        return {
+            "turns": self.turns,
+            "actions": self.actions,
+            "offers_shown": self.offers_shown,
+            "churn_prevented": self.churn_prevented,
+            "upsells_completed": self.upsells_completed,
+            "offers_accepted": self.offers_accepted,
+            "offers_declined": self.offers_declined,
+            "escalations": self.escalations,
+            "tickets": self.tickets,
+            "latency": self.latency.summary(),
+        }
+
+
+class MetricsRollup:
+    """Incremental per-minute/hour/day rollups of the conversation log
+
+    run_once() reads only the turns appended since the stored checkpoint and
+    folds them into the touched buckets; buckets and checkpoint are committed
+    in one transaction, so a crash never counts a turn twice. When several
+    server processes share the logs, a file lock lets one of them roll up
+    while the rest only read.
+    """
+
+    def __init__(self, log=conversation_log, path: Path = METRICS_ROLLUP_PATH):
+        self.log = log
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+        self._lock_file = None
+        # Sum of the day buckets, kept up to date by this process's commits; rebuilt when another
+        # process commits (PRAGMA data_version moves) or old days are pruned
+        self._totals: Optional[Bucket] = None
+        self._totals_version: Optional[int] = None
+        self._generation = 0
+        self._summary: Optional[Tuple[Tuple, Dict]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _acquire_job_lock(self) -> bool:
+        if fcntl is None:
+            return True
+        if self._lock_file is None:
+            self._lock_file = open(self.path.with_suffix(".lock"), "a")
+            try:
+                fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._lock_file.close()
+                self._lock_file = None
+                return False
+        return True
+
+    def run_once(self) -> int:
+        """Fold new turns into the rollups; returns how many were read"""
+        with self._lock:
+            if not self._acquire_job_lock():
+                return 0
+            row = self._conn.execute("SELECT data FROM checkpoint WHERE id = 1").fetchone()
+            checkpoint = loads(row[0]) if row else None
+            source = self.log.source()
+            rebuild = checkpoint is not None and checkpoint.get("source") != source
+            if rebuild:
+                # Offsets into another store (e.g. a benchmark's scratch logs) mean nothing here, and the
+                # buckets built from it are not this store's: start over from the beginning of this one
+                logger.warning(f"Metrics rollups were built from {checkpoint.get('source')!r}, not {source!r}; rebuilding")
+                checkpoint = None
+            touched: Dict[Tuple[str, str], Bucket] = {}
+            count = 0
+            advanced = False
+            for turns, checkpoint in self.log.tail(checkpoint):
+                advanced = True
+                for turn in turns:
+                    timestamp = turn.get("timestamp") or ""
+                    if len(timestamp) < 16:
+                        continue
+                    for resolution, (width, _) in RESOLUTIONS.items():
+                        key = (resolution, timestamp[:width])
+                        bucket = touched.get(key)
+                        if bucket is None:
+                            bucket = touched[key] = Bucket()
+                        bucket.add(turn)
+                    count += 1
+            if not advanced and not rebuild:
+                return 0
+            self._commit(touched, dict(checkpoint or {}, source=source), rebuild)
+            return count
+
+    def _commit(self, touched: Dict[Tuple[str, str], Bucket], checkpoint: Dict, rebuild: bool = False):
+        with self._conn:
+            if rebuild:
+                self._conn.execute("DELETE FROM rollups")
+            for (resolution, bucket_name), bucket in touched.items():
+                row = self._conn.execute("SELECT data FROM rollups WHERE resolution = ? AND bucket = ?", (resolution, bucket_name)).fetchone()
+                if row:
+                    stored = Bucket.decode(row[0])
+                    stored.merge(bucket)
+                    bucket = stored
+                self._conn.execute("INSERT OR REPLACE INTO rollups (resolution, bucket, data) VALUES (?, ?, ?)", (resolution, bucket_name, bucket.encode()))
+            self._conn.execute("INSERT OR REPLACE INTO checkpoint (id, data) VALUES (1, ?)", (dumps(checkpoint),))
+            now = datetime.now()
+            pruned_days = 0
+            for resolution, (width, keep) in RESOLUTIONS.items():
+                cutoff = (now - keep).isoformat()[:width]
+                pruned = self._conn.execute("DELETE FROM rollups WHERE resolution = ? AND bucket < ?", (resolution, cutoff)).rowcount
+                if resolution == "day":
+                    pruned_days = pruned
+        if self._totals is not None and not rebuild and not pruned_days:
+            for (resolution, _), bucket in touched.items():
+                if resolution == "day":
+                    self._totals.merge(bucket)
+        else:
+            self._totals = None
+        self._generation += 1
+
+    def buckets(self, resolution: str, since: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[str, Bucket]]:
+        """Stored buckets, oldest first: those starting at or after since, or else the latest limit"""
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {resolution!r}; expected one of {', '.join(RESOLUTIONS)}")
+        with self._lock:
+            rows = self._rows_locked(resolution, since, limit)
+        return [(name, Bucket.decode(blob)) for name, blob in rows]
+
+    def _rows_locked(self, resolution: str, since: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[str, bytes]]:
+        if since is not None:
+            return self._conn.execute(
+                "SELECT bucket, data FROM rollups WHERE resolution = ? AND bucket >= ? ORDER BY bucket",
+                (resolution, since[:RESOLUTIONS[resolution][0]])).fetchall()
+        rows = self._conn.execute(
+            "SELECT bucket, data FROM rollups WHERE resolution = ? ORDER BY bucket DESC LIMIT ?",
+            (resolution, limit if limit is not None else -1)).fetchall()
+        rows.reverse()
+        return rows
+
+    def report(self, resolution: str = "hour", since: Optional[str] = None, limit: Optional[int] = None) -> Dict:
+        """JSON-ready buckets plus their combined totals"""
+        buckets = self.buckets(resolution, since, limit)
+        totals = Bucket()
+        for _, bucket in buckets:
+            totals.merge(bucket)
+        return {
+            "resolution": resolution,
+            "buckets": [dict(bucket.summary(), start=name) for name, bucket in buckets],
+            "totals": totals.summary(),
+            "timestamp": datetime.now().isoformat(),
+        }
+
+    def dashboard_summary(self, recent_seconds: int = 3600) -> Dict:
+        """The dashboard's numbers: totals over every retained day, latency also over the recent minutes
+
+        The result is cached until the rollups change or the minute turns, so
+        polling it every second costs one PRAGMA while nothing happens.
+        """
+        now = datetime.now()
+        with self._lock:
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            key = (data_version, self._generation, recent_seconds, now.isoformat()[:16])
+            if self._summary is not None and self._summary[0] == key:
+                return self._summary[1]
+            if self._totals is None or self._totals_version != data_version:
+                self._totals = Bucket()
+                for _, blob in self._rows_locked("day"):
+                    self._totals.merge(Bucket.decode(blob))
+                self._totals_version = data_version
+            totals = self._totals
+            recent = Bucket()
+            for _, blob in self._rows_locked("minute", since=(now - timedelta(seconds=recent_seconds)).isoformat()):
+                recent.merge(Bucket.decode(blob))
+            summary = {
+                "total_conversations": totals.turns,
+                "churn_prevented": totals.churn_prevented,
+                "upsells_completed": totals.upsells_completed,
+                "avg_latency_ms": totals.latency.summary()["avg_ms"],
+                "offers_shown": totals.offers_shown,
+                "offers_accepted": totals.offers_accepted,
+                "escalations": totals.escalations,
+                "tickets_generated": totals.tickets,
+                "latency": {"recent": recent.latency.summary(), "total": totals.latency.summary()},
+            }
+            self._summary = (key, summary)
+        return summary
+
+    def start(self, interval: float = METRICS_ROLLUP_INTERVAL_SECONDS):
+        """Run run_once() every interval seconds on a daemon thread"""
+        if self._thread is not None or interval <= 0:
+            return
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="metrics-rollup", daemon=True)
+        self._thread.start()
+
+    def _run(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Metrics rollup failed: {e}")
+            self._stop.wait(interval)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+metrics_rollup = MetricsRollup()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fold new conversation log turns into the metrics rollups, e.g. from cron.")
+    parser.add_argument("--show", choices=list(RESOLUTIONS), help="print this resolution's rollups after updating")
+    parser.add_argument("--limit", type=int, default=24, help="buckets to print with --show")
+    args = parser.parse_args(argv)
+
+    count = metrics_rollup.run_once()
+    print(f"Rolled up {count} turns into {metrics_rollup.path}", file=sys.stderr)
+    if args.show:
+        sys.stdout.write(dumps(metrics_rollup.report(args.show, limit=args.limit)).decode("utf-8") + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+import logging
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from metrics_rollup import metrics_rollup
+from sse import format_event
+
+logger = logging.getLogger(__name__)
+
+# Fastest pace at which deltas are pushed; changes within one interval go out together
+METRICS_STREAM_INTERVAL_SECONDS = float(os.getenv("METRICS_STREAM_INTERVAL_SECONDS", "1"))
+
+# Comment sent on a quiet stream so proxies keep it open and dead clients are noticed
+HEARTBEAT_SECONDS = 15
+KEEPALIVE = b": keepalive\n\n"
+
+# Clients that accept no bytes for this long are dropped
+STALL_TIMEOUT_SECONDS = 60
+
+
+def diff(old: Dict, new: Dict) -> Dict:
+    """Keys of new whose values differ from old, recursing into nested dicts"""
+    delta = {}
+    for key, value in new.items():
+        before = old.get(key)
+        if isinstance(value, dict) and isinstance(before, dict):
+            nested = diff(before, value)
+            if nested:
+                delta[key] = nested
+        elif value != before:
+            delta[key] = value
+    return delta
+
+
+def merge(into: Dict, delta: Dict) -> Dict:
+    """Apply delta to into in place; later deltas win. Never aliases delta's nested dicts"""
+    for key, value in delta.items():
+        if isinstance(value, dict):
+            target = into.get(key)
+            if not isinstance(target, dict):
+                target = into[key] = {}
+            merge(target, value)
+        else:
+            into[key] = value
+    return into
+
+
+class _Subscriber:
+    """Pending delta for one client; deltas arriving faster than it reads are merged"""
+
+    def __init__(self):
+        self._pending: Optional[Dict] = None
+        # Shared encoding of the pending delta while it is a single, unmerged broadcast
+        self._pending_event: Optional[bytes] = None
+        self._heartbeat = False
+
+    def offer(self, delta: Dict, event: bytes):
+        if self._pending is None:
+            self._pending = delta
+            self._pending_event = event
+        else:
+            if self._pending_event is not None:
+                self._pending = merge({}, self._pending)
+            merge(self._pending, delta)
+            self._pending_event = None
+
+    def heartbeat(self):
+        self._heartbeat = True
+
+    def take(self) -> Optional[bytes]:
+        pending, event = self._pending, self._pending_event
+        self._pending = self._pending_event = None
+        heartbeat, self._heartbeat = self._heartbeat, False
+        if pending is not None:
+            return event or format_event(pending, event="delta")
+        return KEEPALIVE if heartbeat else None
+
+
+class SocketSubscriber(_Subscriber):
+    """A detached BaseHTTPRequestHandler connection, written without blocking from the producer thread"""
+
+    def __init__(self, sock: socket.socket, initial: bytes = b""):
+        super().__init__()
+        sock.setblocking(False)
+        self.sock = sock
+        # Bytes taken but not yet accepted by the socket, starting with the snapshot event
+        self._out = initial
+        self._stalled_since: Optional[float] = None
+
+    def pump(self, now: float) -> bool:
+        """Send what the socket will take; False once the client is gone or stalled"""
+        while True:
+            if not self._out:
+                self._out = self.take() or b""
+                if not self._out:
+                    self._stalled_since = None
+                    return True
+            try:
+                sent = self.sock.send(self._out)
+            except BlockingIOError:
+                sent = 0
+            except OSError:
+                return False
+            self._out = self._out[sent:]
+            if self._out:
+                if self._stalled_since is None or sent:
+                    self._stalled_since = now
+                return now - self._stalled_since < STALL_TIMEOUT_SECONDS
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class AsyncSubscriber(_Subscriber):
+    """A FastAPI stream; the producer thread wakes its event loop through call_soon_threadsafe"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        super().__init__()
+        self.loop = loop
+        self.ready = asyncio.Event()
+        self._lock = threading.Lock()
+
+    def _wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            # The loop has shut down; the generator's cleanup removes this subscriber
+            pass
+
+    def offer(self, delta: Dict, event: bytes):
+        with self._lock:
+            super().offer(delta, event)
+        self._wake()
+
+    def heartbeat(self):
+        with self._lock:
+            super().heartbeat()
+        self._wake()
+
+    def take(self) -> Optional[bytes]:
+        with self._lock:
+            return super().take()
+
+
+class MetricsBroadcaster:
+    """One producer thread that polls snapshot() and pushes what changed to every subscriber
+
+    A new subscriber gets a "snapshot" event with the full state, then "delta"
+    events holding only the keys that changed, at most once per interval. Each
+    delta is computed and encoded once, however many dashboards are open.
+    """
+
+    def __init__(self, snapshot: Callable[[], Dict], interval: float = METRICS_STREAM_INTERVAL_SECONDS):
+        self.snapshot = snapshot
+        self.interval = max(interval, 0.05)
+        self._lock = threading.Lock()
+        self._subscribers: List[_Subscriber] = []
+        self._state: Optional[Dict] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _fresh_state(self) -> Optional[Dict]:
+        # Taken before the lock, and only when nobody is watching yet (otherwise _state is current)
+        return self.snapshot() if self._state is None else None
+
+    def _snapshot_event(self, fresh: Optional[Dict]) -> bytes:
+        # Called with the lock held, so no delta can slip between this and registration
+        if self._state is None:
+            self._state = fresh if fresh is not None else self.snapshot()
+        return format_event(self._state, event="snapshot")
+
+    def _add(self, subscriber: _Subscriber):
+        self._subscribers.append(subscriber)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-stream", daemon=True)
+            self._thread.start()
+
+    def subscribe_socket(self, sock: socket.socket):
+        """Take over a connection whose SSE headers went out already, starting with a snapshot event"""
+        fresh = self._fresh_state()
+        with self._lock:
+            # One non-blocking send now; whatever the client doesn't take yet is left for the producer thread,
+            # so a slow client never holds the lock the producer needs
+            subscriber = SocketSubscriber(sock, self._snapshot_event(fresh))
+            if subscriber.pump(time.monotonic()):
+                self._add(subscriber)
+                return
+        subscriber.close()
+
+    async def astream(self) -> AsyncIterator[bytes]:
+        """Async generator of SSE bytes for StreamingResponse"""
+        subscriber = AsyncSubscriber(asyncio.get_running_loop())
+        fresh = self._fresh_state()
+        with self._lock:
+            initial = self._snapshot_event(fresh)
+            self._add(subscriber)
+        try:
+            yield initial
+            while True:
+                await subscriber.ready.wait()
+                subscriber.ready.clear()
+                event = subscriber.take()
+                if event:
+                    yield event
+        finally:
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+
+    def _run(self):
+        last_beat = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            now = time.monotonic()
+            with self._lock:
+                if not self._subscribers:
+                    # Nobody is watching; the next subscriber starts from a fresh snapshot
+                    self._state = None
+                    continue
+                previous = self._state
+            # The snapshot and the diff run without the lock, so subscribing never waits on them
+            try:
+                state = self.snapshot()
+            except Exception as e:
+                logger.error(f"Metrics stream snapshot failed: {e}")
+                continue
+            delta = diff(previous or {}, state)
+            event = format_event(delta, event="delta") if delta else None
+            with self._lock:
+                if self._state is not previous:
+                    # A subscriber reset the state from its own snapshot meanwhile; diff again next round
+                    continue
+                self._state = state
+                if event is not None:
+                    for subscriber in self._subscribers:
+                        subscriber.offer(delta, event)
+                    last_beat = now
+                elif now - last_beat >= HEARTBEAT_SECONDS:
+                    for subscriber in self._subscribers:
+                        subscriber.heartbeat()
+                    last_beat = now
+                sockets = [s for s in self._subscribers if isinstance(s, SocketSubscriber)]
+            self._pump(sockets, now)
+
+    def _pump(self, sockets: List[SocketSubscriber], now: float):
+        gone = [subscriber for subscriber in sockets if not subscriber.pump(now)]
+        if gone:
+            with self._lock:
+                for subscriber in gone:
+                    self._subscribers.remove(subscriber)
+            for subscriber in gone:
+                subscriber.close()
+            logger.info(f"Metrics stream: dropped {len(gone)} disconnected clients")
+
+
+# Feeds /api/metrics/stream on every server
+dashboard_stream = MetricsBroadcaster(metrics_rollup.dashboard_summary)
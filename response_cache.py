@@ -0,0 +1,191 @@
+import copy
+import os
+import re
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from prometheus_metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Agent replies kept, how long (seconds) each stays valid, and how close a new message must be to reuse one
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.95"))
+
+# Least recently used entries checked for expiry on each store; the rest expire when a lookup finds them
+EXPIRE_SWEEP_ENTRIES = 8
+
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial variants share an entry"""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", message.lower())).strip()
+
+
+class _Entry:
+    __slots__ = ("bucket", "text", "vector", "reply", "stored_at")
+
+    def __init__(self, bucket: Hashable, text: str, vector: np.ndarray, reply: Dict, stored_at: float):
+        self.bucket = bucket
+        self.text = text
+        self.vector = vector
+        self.reply = reply
+        self.stored_at = stored_at
+
+
+class _Bucket:
+    """One bucket's entries by normalized text, with their vectors stacked for one matrix product"""
+
+    __slots__ = ("entries", "_matrix", "_order")
+
+    def __init__(self):
+        self.entries: Dict[str, _Entry] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._order: List[_Entry] = []
+
+    def add(self, entry: _Entry):
+        self.entries[entry.text] = entry
+        self._matrix = None
+
+    def remove(self, text: str):
+        if self.entries.pop(text, None) is not None:
+            self._matrix = None
+
+    def snapshot(self) -> Tuple[List[_Entry], np.ndarray]:
+        """Entries and their stacked vectors; the matrix is rebuilt after a change, never modified"""
+        if self._matrix is None:
+            self._order = list(self.entries.values())
+            self._matrix = np.stack([entry.vector for entry in self._order])
+        return self._order, self._matrix
+
+
+class SemanticResponseCache:
+    """Agent replies reused for near-identical messages from customers in the same bucket
+
+    The bucket is whatever the caller decides must match exactly, e.g.
+    (intent, churn_risk, upsell_potential, plan). Inside a bucket a message
+    hits when its normalized text is identical to a cached one, or when the
+    cosine similarity of the embeddings reaches the threshold. A lookup only
+    touches its own bucket. Entries expire after ttl_seconds, checked when
+    they are found plus a few from the cold end on every store, and the least
+    recently used go first once the cache is full.
+    """
+
+    def __init__(self, embeddings, max_entries: int = RESPONSE_CACHE_SIZE, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS, threshold: float = RESPONSE_CACHE_SIMILARITY):
+        self.embeddings = embeddings
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        # Every entry in least-recently-used order, and the same entries grouped by bucket
+        self._entries: "OrderedDict[Tuple[Hashable, str], _Entry]" = OrderedDict()
+        self._buckets: Dict[Hashable, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _remove_locked(self, entry: _Entry):
+        self._entries.pop((entry.bucket, entry.text), None)
+        bucket = self._buckets.get(entry.bucket)
+        if bucket is not None:
+            bucket.remove(entry.text)
+            if not bucket.entries:
+                del self._buckets[entry.bucket]
+
+    def _live_locked(self, entry: Optional[_Entry], now: float) -> Optional[_Entry]:
+        """entry, or None (dropping it) once it has expired"""
+        if entry is not None and now - entry.stored_at >= self.ttl_seconds:
+            self._remove_locked(entry)
+            return None
+        return entry
+
+    def _sweep_locked(self, now: float):
+        # Bounded: look at a few of the least recently used entries, stopping at the first live one
+        for _ in range(EXPIRE_SWEEP_ENTRIES):
+            if not self._entries:
+                return
+            entry = next(iter(self._entries.values()))
+            if self._live_locked(entry, now) is not None:
+                return
+
+    def _hit_locked(self, entry: _Entry) -> Dict:
+        self._entries.move_to_end((entry.bucket, entry.text))
+        record_cache("responses", True)
+        return copy.deepcopy(entry.reply)
+
+    def lookup(self, message: str, bucket: Hashable) -> Optional[Dict]:
+        """A copy of the cached reply for a similar message in this bucket, or None"""
+        text = normalize_message(message)
+        with self._lock:
+            entries = self._buckets.get(bucket)
+            entry = self._live_locked(entries.entries.get(text), time.time()) if entries is not None else None
+            if entry is not None:
+                return self._hit_locked(entry)
+            # Empty buckets are dropped, so this also covers a bucket whose last entry just expired
+            if bucket not in self._buckets:
+                record_cache("responses", False)
+                return None
+
+        try:
+            vector = self._embed(text)
+        except Exception as e:
+            logger.warning(f"Response cache lookup skipped, embedding failed: {e}")
+            record_cache("responses", False)
+            return None
+
+        with self._lock:
+            entries = self._buckets.get(bucket)
+            if entries is None:
+                record_cache("responses", False)
+                return None
+            candidates, matrix = entries.snapshot()
+        similarities = matrix @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            record_cache("responses", False)
+            return None
+
+        match = candidates[best]
+        with self._lock:
+            # The entry may have been replaced or evicted while the lock was released
+            if self._entries.get((match.bucket, match.text)) is match and self._live_locked(match, time.time()) is not None:
+                return self._hit_locked(match)
+        record_cache("responses", False)
+        return None
+
+    def store(self, message: str, bucket: Hashable, reply: Dict):
+        text = normalize_message(message)
+        try:
+            vector = self._embed(text)
+        except Exception as e:
+            logger.warning(f"Response not cached, embedding failed: {e}")
+            return
+        now = time.time()
+        entry = _Entry(bucket, text, vector, copy.deepcopy(reply), now)
+        with self._lock:
+            self._sweep_locked(now)
+            previous = self._entries.get((bucket, text))
+            if previous is not None:
+                self._remove_locked(previous)
+            self._entries[(bucket, text)] = entry
+            self._buckets.setdefault(bucket, _Bucket()).add(entry)
+            while len(self._entries) > self.max_entries:
+                self._remove_locked(next(iter(self._entries.values())))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
@@ -0,0 +1,209 @@
+import os
+import re
+from typing import Dict, Optional
+
+from intent_matcher import scan_message
+
+# Intents answered straight from the rules below when they are the only intent in a message;
+# everything else goes to the LLM agent
+FAST_PATH_INTENTS = frozenset(
+    intent.strip() for intent in os.getenv("FAST_PATH_INTENTS", "greeting,escalation").split(",") if intent.strip()
+)
+
+
+def fast_path_intent(message: str) -> Optional[str]:
+    """The intent to answer without the agent, or None when the message needs the agent"""
+    scan = scan_message(message)
+    if len(scan.intents) != 1:
+        return None
+    intent = scan.intent
+    if intent not in FAST_PATH_INTENTS:
+        return None
+    # Substring hits such as "hi" inside "this" are not evidence enough to skip the agent
+    text = message.lower()
+    if not any(re.search(rf"\b{re.escape(keyword)}\b", text) for keyword in scan.intents[intent]):
+        return None
+    return intent
+
+
+# Rule-based responses
+def rule_based_response(intent: str, customer_profile: Dict, products: Dict) -> Dict:
+    """Deterministic reply for a detected intent, grounded in the customer profile and product plans"""
+    churn_risk = customer_profile.get("churn_risk", "low")
+    upsell_potential = customer_profile.get("upsell_potential", "low")
+    
+    if intent == "greeting":
+        return {
+            "response": "Hello! I'm your AI assistant for customer retention and upsell. I can help you with subscription management, feature recommendations, pricing questions, and more. How can I assist you today?",
+            "action": "neutral",
+            "confidence": 0.8,
+            "suggestedOffer": None,
+            "tools_used": ["IntentDetection"],
+            "options": [
+                "I want to cancel my subscription",
+                "The price is too expensive", 
+                "I need more features",
+                "I'm having technical issues"
+            ]
+        }
+    
+    elif intent == "cancel":
+        if churn_risk == "high":
+            # Offer discount or downgrade
+            current_plan = products.get("plans", {}).get("basic", {})
+            return {
+                "response": f"I understand you're considering canceling. Before you make that decision, I'd like to offer you a special retention deal. I can provide you with a 20% discount for the next 3 months, or we can downgrade you to our Basic plan at ${current_plan.get('price', 29)}/month. Which option would work better for you?",
+                "action": "retention",
+                "confidence": 0.9,
+                "suggestedOffer": "20% discount for 3 months or Basic plan downgrade",
+                "tools_used": ["IntentDetection", "CustomerLookup", "OfferGenerator"],
+                "options": [
+                    "Yes, I'll take the 20% discount",
+                    "Yes, downgrade me to Basic plan",
+                    "No, I still want to cancel",
+                    "Let me think about it"
+                ]
+            }
+        else:
+            return {
+                "response": "I'm sorry to hear you're considering canceling. Could you help me understand what's not working for you? I'd like to see if we can find a solution that better meets your needs.",
+                "action": "retention",
+                "confidence": 0.7,
+                "suggestedOffer": "Account optimization consultation",
+                "tools_used": ["IntentDetection", "CustomerLookup"],
+                "options": [
+                    "It's too expensive",
+                    "I'm not using the features",
+                    "I found a better alternative",
+                    "I'm having technical issues"
+                ]
+            }
+    
+    elif intent == "pricing_confusion":
+        # Compare current vs alternatives
+        current_plan = products.get("plans", {}).get("basic", {})
+        professional_plan = products.get("plans", {}).get("professional", {})
+        
+        return {
+            "response": f"I understand your concerns about pricing. You're currently on our {current_plan.get('name', 'Basic')} plan at ${current_plan.get('price', 29)}/month. Let me show you the value you're getting and compare it with our other options. Our Professional plan at ${professional_plan.get('price', 79)}/month offers much more value per dollar with advanced features. Would you like me to break down the cost-benefit analysis?",
+            "action": "upsell",
+            "confidence": 0.8,
+            "suggestedOffer": "Professional plan upgrade with cost analysis",
+            "tools_used": ["IntentDetection", "CustomerLookup", "ProductComparison"],
+            "options": [
+                "Yes, show me the cost analysis",
+                "What's included in Professional?",
+                "Do you have any discounts?",
+                "I want to downgrade instead"
+            ]
+        }
+    
+    elif intent == "feature_relevance":
+        # Suggest better-fit plan
+        if upsell_potential == "high":
+            premium_plan = products.get("plans", {}).get("premium", {})
+            return {
+                "response": f"That's a great feature request! Based on your usage patterns, I think our Premium plan would be perfect for you. It includes {', '.join(premium_plan.get('features', [])[:3])} and much more. I can offer you a 30-day free trial to test it out. Would you like to try it?",
+                "action": "upsell",
+                "confidence": 0.85,
+                "suggestedOffer": "30-day Premium trial",
+                "tools_used": ["IntentDetection", "CustomerLookup", "FeatureRecommendation"],
+                "options": [
+                    "Yes, start my free trial",
+                    "Show me all Premium features",
+                    "What's the price after trial?",
+                    "I need different features"
+                ]
+            }
+        else:
+            return {
+                "response": "I'd be happy to help you find the right features! Let me understand your specific needs better. What functionality are you looking for, and how do you plan to use it?",
+                "action": "neutral",
+                "confidence": 0.7,
+                "suggestedOffer": "Feature consultation",
+                "tools_used": ["IntentDetection", "CustomerLookup"],
+                "options": [
+                    "Email automation",
+                    "Analytics & reporting",
+                    "API access",
+                    "Team collaboration"
+                ]
+            }
+    
+    elif intent == "discount_request":
+        # Check loyalty offers
+        if customer_profile.get("months_subscribed", 0) >= 12:
+            return {
+                "response": "Great news! As a loyal customer, you qualify for our loyalty discount. I can offer you 15% off your next 6 months, or 20% off if you upgrade to our Professional plan. Which option interests you more?",
+                "action": "retention",
+                "confidence": 0.9,
+                "suggestedOffer": "15% loyalty discount or 20% upgrade discount",
+                "tools_used": ["IntentDetection", "CustomerLookup", "LoyaltyOffers"],
+                "options": [
+                    "Yes, 15% off for 6 months",
+                    "Yes, 20% off with upgrade",
+                    "Show me other discount options",
+                    "No thanks, I'm good"
+                ]
+            }
+        else:
+            return {
+                "response": "I'd be happy to discuss pricing options with you! While you haven't been with us long enough for our loyalty discount, I can offer you a 10% discount for the next 3 months. Would that help?",
+                "action": "retention",
+                "confidence": 0.8,
+                "suggestedOffer": "10% discount for 3 months",
+                "tools_used": ["IntentDetection", "CustomerLookup", "OfferGenerator"],
+                "options": [
+                    "Yes, I'll take the 10% discount",
+                    "What about annual billing discount?",
+                    "Show me plan downgrade options",
+                    "No thanks"
+                ]
+            }
+    
+    elif intent == "trust_issue":
+        # Respond factually + empathetically
+        return {
+            "response": "I'm really sorry you're experiencing issues. That's not the experience we want you to have. Let me help you resolve this right away. Can you tell me more about the specific problem you're encountering? I'll make sure we get this sorted out quickly.",
+            "action": "escalate",
+            "confidence": 0.9,
+            "suggestedOffer": "Priority technical support",
+            "tools_used": ["IntentDetection", "EscalationHandler"],
+            "options": [
+                "Email not sending",
+                "Login problems",
+                "Feature not working",
+                "Talk to a human"
+            ]
+        }
+    
+    elif intent == "escalation":
+        # Summarize and log case
+        return {
+            "response": "I understand you'd like to speak with a human representative. I'll connect you with our customer success team right away. They'll have access to your full account history and can provide personalized assistance. You should receive a call within 15 minutes.",
+            "action": "escalate",
+            "confidence": 0.95,
+            "suggestedOffer": "Human representative connection",
+            "tools_used": ["IntentDetection", "EscalationHandler", "CaseLogging"],
+            "options": [
+                "Schedule a call for later",
+                "Send me an email instead",
+                "I'll wait for the call",
+                "Cancel the request"
+            ]
+        }
+    
+    else:  # general_inquiry
+        return {
+            "response": "I'm here to help! I can assist you with subscription management, feature recommendations, pricing questions, technical support, or any other concerns. What would you like to know more about?",
+            "action": "neutral",
+            "confidence": 0.7,
+            "suggestedOffer": None,
+            "tools_used": ["IntentDetection"],
+            "options": [
+                "Show me my current plan",
+                "What features do I have?",
+                "How can I upgrade?",
+                "Talk to a human"
+            ]
+        }
@@ -0,0 +1,178 @@
+import dataclasses
+import json
+import os
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# JSON encoder: auto picks orjson, then msgspec, then the standard library; or name one explicitly
+JSON_BACKEND = os.getenv("JSON_BACKEND", "auto")
+
+
+class PreEncoded:
+    """Mixin for values that already hold their JSON encoding in .encoded
+
+    dumps() writes those bytes as they are instead of encoding the value again
+    (anywhere with orjson >= 3.9, for top-level dict values otherwise).
+    """
+
+    __slots__ = ()
+    encoded: bytes
+
+
+@dataclass(slots=True)
+class ChatReply:
+    """Typed /api/chat response; orjson and msgspec encode it from its fields, without walking a dict"""
+
+    response: str
+    action: str
+    confidence: float
+    suggestedOffer: Optional[str] = None
+    tools_used: Optional[List[str]] = None
+    options: Optional[List[str]] = None
+    latency_ms: Optional[float] = None
+    churn_risk_reduction: Optional[str] = None
+    upsell_boost: Optional[str] = None
+    plan_comparison: Optional[Dict] = None
+    debug: Optional[Dict] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "ChatReply":
+        return cls(**{field: data[field] for field in _CHAT_REPLY_FIELDS if field in data})
+
+    def to_dict(self) -> Dict:
+        # Shallow on purpose: nested values are shared, not copied
+        return {field: getattr(self, field) for field in _CHAT_REPLY_FIELDS}
+
+    def __getitem__(self, key: str):
+        """Read fields like the dict replies this replaced, e.g. reply["response"]"""
+        if key not in _CHAT_REPLY_FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in _CHAT_REPLY_FIELDS else default
+
+
+_CHAT_REPLY_FIELDS = tuple(field.name for field in dataclasses.fields(ChatReply))
+
+
+def _to_builtin(value: Any) -> Any:
+    """Fallback for types an encoder doesn't handle natively"""
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return {field.name: getattr(value, field.name) for field in dataclasses.fields(value)}
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return list(value)
+    if isinstance(value, str):
+        return str(value)
+    if isinstance(value, int):
+        return int(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+# Backends
+#
+# Each one provides dumps(obj) -> compact bytes, dumps_pretty(obj) -> indented
+# bytes and loads(bytes | str). Output is plain JSON either way; only speed and
+# whitespace differ.
+
+def _orjson_backend():
+    import orjson
+
+    fragment = getattr(orjson, "Fragment", None)
+    # Subclasses (catalog snapshots, pre-encoded values) go through default so fragments can be spliced
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_SUBCLASS
+
+    def default(value):
+        if fragment is not None and isinstance(value, PreEncoded):
+            return fragment(value.encoded)
+        return _to_builtin(value)
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=default, option=options)
+
+    def dumps_pretty(obj) -> bytes:
+        return orjson.dumps(obj, default=default, option=options | orjson.OPT_INDENT_2)
+
+    return dumps, dumps_pretty, orjson.loads, fragment is not None
+
+
+def _msgspec_backend():
+    import msgspec
+
+    def enc_hook(value):
+        if isinstance(value, PreEncoded):
+            return msgspec.Raw(value.encoded)
+        return _to_builtin(value)
+
+    encoder = msgspec.json.Encoder(enc_hook=enc_hook)
+
+    def dumps_pretty(obj) -> bytes:
+        return msgspec.json.format(encoder.encode(obj), indent=2)
+
+    return encoder.encode, dumps_pretty, msgspec.json.decode, False
+
+
+def _stdlib_backend():
+    def dumps(obj) -> bytes:
+        # Same bytes as orjson and msgspec: no spaces after separators, UTF-8 rather than \u escapes
+        return json.dumps(obj, default=_to_builtin, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    def dumps_pretty(obj) -> bytes:
+        return json.dumps(obj, default=_to_builtin, indent=2).encode("utf-8")
+
+    return dumps, dumps_pretty, json.loads, False
+
+
+_BACKENDS = {"orjson": _orjson_backend, "msgspec": _msgspec_backend, "json": _stdlib_backend}
+
+
+def _select_backend(name: str):
+    candidates = ["orjson", "msgspec", "json"] if name == "auto" else [name]
+    for candidate in candidates:
+        if candidate not in _BACKENDS:
+            raise ValueError(f"Unknown JSON_BACKEND {candidate!r}; expected auto, orjson, msgspec or json")
+        try:
+            backend = _BACKENDS[candidate]()
+        except ImportError:
+            if name != "auto":
+                raise
+            continue
+        logger.info(f"Using {candidate} for JSON encoding")
+        return (candidate,) + backend
+    # The standard library backend always loads, so auto never gets here
+    raise RuntimeError("No JSON backend available")
+
+
+BACKEND, _dumps, _dumps_pretty, loads, _splices_nested = _select_backend(JSON_BACKEND)
+
+
+def dumps(obj) -> bytes:
+    """Compact JSON bytes; top-level PreEncoded dict values are spliced in rather than re-encoded"""
+    if _splices_nested or not isinstance(obj, dict):
+        return _dumps(obj)
+    if not any(isinstance(value, PreEncoded) for value in obj.values()):
+        return _dumps(obj)
+    # Encode each run of ordinary values as one object and drop its braces, so key order is kept
+    members: List[bytes] = []
+    run: Dict = {}
+    for key, value in obj.items():
+        if isinstance(value, PreEncoded):
+            if run:
+                members.append(_dumps(run)[1:-1])
+                run = {}
+            members.append(_dumps(key) + b":" + value.encoded)
+        else:
+            run[key] = value
+    if run:
+        members.append(_dumps(run)[1:-1])
+    return b"{" + b",".join(members) + b"}"
+
+
+def dumps_pretty(obj) -> bytes:
+    """Indented JSON bytes, for files people read"""
+    return _dumps_pretty(obj)
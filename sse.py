@@ -0,0 +1,111 @@
+import asyncio
+import re
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, Optional
+
+from serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+# Response headers for an event stream; X-Accel-Buffering stops nginx from holding tokens back
+SSE_CONTENT_TYPE = "text/event-stream"
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# Rule-based and cached replies exist in full up front; they are streamed a few words at a time
+WORDS_PER_CHUNK = 3
+
+TokenCallback = Callable[[str], None]
+
+
+def format_event(data, event: Optional[str] = None) -> bytes:
+    """Encode one Server-Sent Event; data that isn't a string is sent as JSON"""
+    payload = data if isinstance(data, str) else dumps(data).decode("utf-8")
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in payload.split("\n"))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def token_event(token: str) -> bytes:
+    return format_event({"token": token}, event="token")
+
+
+def final_event(result: Dict) -> bytes:
+    return format_event(result, event="final")
+
+
+def error_event(message: str) -> bytes:
+    return format_event({"error": message}, event="error")
+
+
+def chunk_text(text: str, words_per_chunk: int = WORDS_PER_CHUNK) -> Iterator[str]:
+    words = re.findall(r"\S+\s*", text)
+    for start in range(0, len(words), words_per_chunk):
+        yield "".join(words[start:start + words_per_chunk])
+
+
+# Chat turn streaming
+#
+# A turn function takes an on_token callback, calls it for each token it
+# produces (or never, if it has no token stream) and returns the same dict
+# /api/chat would. Clients get token events followed by one final event with
+# the full result, or an error event.
+
+def stream_turn(write: Callable[[bytes], None], run_turn: Callable[[TokenCallback], Dict]):
+    """Blocking version for the BaseHTTPRequestHandler servers"""
+    streamed = False
+
+    def on_token(token: str):
+        nonlocal streamed
+        streamed = True
+        write(token_event(token))
+
+    try:
+        result = run_turn(on_token)
+    except (BrokenPipeError, ConnectionResetError):
+        raise
+    except Exception as e:
+        logger.error(f"Error in chat stream: {e}")
+        write(error_event(str(e)))
+        return
+    if not streamed:
+        for chunk in chunk_text(result["response"]):
+            write(token_event(chunk))
+    write(final_event(result))
+
+
+async def astream_turn(run_turn: Callable[[TokenCallback], Awaitable[Dict]]) -> AsyncIterator[bytes]:
+    """Async generator version for the FastAPI apps; tokens may arrive from worker threads"""
+    loop = asyncio.get_running_loop()
+    tokens: asyncio.Queue = asyncio.Queue()
+
+    def on_token(token: str):
+        loop.call_soon_threadsafe(tokens.put_nowait, token)
+
+    turn = asyncio.ensure_future(run_turn(on_token))
+    streamed = False
+    while True:
+        next_token = asyncio.ensure_future(tokens.get())
+        done, _ = await asyncio.wait({next_token, turn}, return_when=asyncio.FIRST_COMPLETED)
+        if next_token in done:
+            streamed = True
+            yield token_event(next_token.result())
+            continue
+        next_token.cancel()
+        break
+    # Tokens queued just before the turn finished
+    await asyncio.sleep(0)
+    while not tokens.empty():
+        streamed = True
+        yield token_event(tokens.get_nowait())
+
+    try:
+        result = turn.result()
+    except Exception as e:
+        detail = getattr(e, "detail", None) or str(e)
+        logger.error(f"Error in chat stream: {detail}")
+        yield error_event(str(detail))
+        return
+    if not streamed:
+        for chunk in chunk_text(result["response"]):
+            yield token_event(chunk)
+    yield final_event(result)
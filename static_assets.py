@@ -0,0 +1,237 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+import time
+import logging
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+from prometheus_metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = Path(os.getenv("STATIC_DIR", "dist"))
+
+# How often (seconds) a cached file is re-stat'ed to pick up a rebuild of dist/
+CHECK_INTERVAL_SECONDS = float(os.getenv("STATIC_CHECK_INTERVAL", "2.0"))
+
+# Files at least this big are sent uncompressed straight from disk with sendfile() instead of kept in memory
+SENDFILE_MIN_BYTES = int(os.getenv("STATIC_SENDFILE_MIN_BYTES", str(256 * 1024)))
+
+# Smaller bodies aren't worth compressing; a variant is kept only if it saves at least 10%
+COMPRESS_MIN_BYTES = 512
+COMPRESS_MAX_RATIO = 0.9
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+
+# Vite puts content-hashed bundles under assets/; they never change under the same name
+IMMUTABLE_PREFIX = "/assets/"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+CONTENT_TYPES = {".js": "application/javascript", ".mjs": "application/javascript", ".html": "text/html; charset=utf-8", ".css": "text/css", ".svg": "image/svg+xml", ".map": "application/json"}
+
+
+def content_type_for(path: str) -> str:
+    suffix = os.path.splitext(path)[1].lower()
+    return CONTENT_TYPES.get(suffix) or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q}"""
+    accepted = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding.strip().lower()] = q
+    return accepted
+
+
+class Asset:
+    """One file (or generated page) with its validators and precompressed variants"""
+
+    __slots__ = ("url_path", "path", "signature", "size", "content_type", "etag", "last_modified", "mtime", "cache_control", "variants")
+
+    def __init__(self, url_path: str, body: bytes, content_type: str, mtime: float, path: Optional[Path] = None, signature=None):
+        self.url_path = url_path
+        self.path = path
+        self.signature = signature
+        self.size = len(body)
+        self.content_type = content_type
+        digest = hashlib.blake2b(body, digest_size=8).hexdigest()
+        self.etag = f'"{digest}"'
+        self.mtime = int(mtime)
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.cache_control = IMMUTABLE_CACHE_CONTROL if url_path.startswith(IMMUTABLE_PREFIX) else REVALIDATE_CACHE_CONTROL
+        # encoding -> body; the identity body of a sendfile()-sized file stays on disk
+        self.variants: Dict[str, Optional[bytes]] = {"identity": None if path is not None and self.size >= SENDFILE_MIN_BYTES else body}
+        if self.size >= COMPRESS_MIN_BYTES and content_type.startswith(COMPRESSIBLE_TYPES):
+            compressors = [("gzip", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                compressors.insert(0, ("br", lambda data: brotli.compress(data, quality=11)))
+            for encoding, compress in compressors:
+                compressed = compress(body)
+                if len(compressed) <= self.size * COMPRESS_MAX_RATIO:
+                    self.variants[encoding] = compressed
+
+    def etag_for(self, encoding: str) -> str:
+        # Each encoding is a different byte sequence, so it gets its own tag
+        return self.etag if encoding == "identity" else f'{self.etag[:-1]}-{encoding}"'
+
+    def negotiate(self, accept_encoding: str) -> str:
+        """Best stored encoding the client accepts; br, then gzip, then identity"""
+        if len(self.variants) == 1:
+            return "identity"
+        accepted = accepted_encodings(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in self.variants and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+                return encoding
+        return "identity"
+
+    def not_modified(self, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or any(self.etag_for(encoding) in tags for encoding in self.variants)
+        if if_modified_since:
+            try:
+                return int(parsedate_to_datetime(if_modified_since).timestamp()) >= self.mtime
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+class AssetCache:
+    """The built frontend, loaded once and served from memory with validators and compression
+
+    Each file is re-stat'ed at most every check_interval seconds so a rebuild
+    of dist/ is picked up without a restart. Generated pages (the dashboard)
+    can be registered with add_page() and get the same treatment.
+    """
+
+    def __init__(self, root: Path = STATIC_DIR, check_interval: float = CHECK_INTERVAL_SECONDS):
+        self.root = Path(root)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._assets: Dict[str, Asset] = {}
+        self._pages: Dict[str, Asset] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._loaded = False
+
+    def _file_for(self, url_path: str) -> Optional[Path]:
+        root = self.root.resolve()
+        path = (root / url_path.lstrip("/")).resolve()
+        if root not in path.parents or not path.is_file():
+            return None
+        return path
+
+    def _load(self, url_path: str, path: Path) -> Optional[Asset]:
+        try:
+            st = os.stat(path)
+            with open(path, "rb") as f:
+                body = f.read()
+        except OSError:
+            return None
+        asset = Asset(url_path, body, content_type_for(url_path), st.st_mtime, path, (st.st_mtime_ns, st.st_size))
+        self._assets[url_path] = asset
+        self._checked_at[url_path] = time.monotonic()
+        return asset
+
+    def load_all(self):
+        """Read and compress everything under root"""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.root.is_dir():
+                logger.warning(f"{self.root}/ not found; run `npm run build` to serve the frontend")
+                return
+            count = 0
+            for path in self.root.rglob("*"):
+                if path.is_file():
+                    self._load("/" + path.relative_to(self.root).as_posix(), path)
+                    count += 1
+            logger.info(f"Cached {count} static files from {self.root}/ (brotli {'on' if brotli else 'off'})")
+
+    def add_page(self, url_path: str, html: str) -> Asset:
+        """Register a generated HTML page, encoded and compressed once"""
+        asset = Asset(url_path, html.encode("utf-8"), "text/html; charset=utf-8", time.time())
+        self._pages[url_path] = asset
+        return asset
+
+    def get(self, url_path: str) -> Optional[Asset]:
+        url_path = url_path.split("?", 1)[0].split("#", 1)[0]
+        page = self._pages.get(url_path)
+        if page is not None:
+            return page
+        if not self._loaded:
+            self.load_all()
+
+        asset = self._assets.get(url_path)
+        now = time.monotonic()
+        if asset is not None and now - self._checked_at.get(url_path, 0.0) < self.check_interval:
+            record_cache("static_assets", True)
+            return asset
+
+        with self._lock:
+            path = asset.path if asset is not None else self._file_for(url_path)
+            try:
+                st = os.stat(path) if path is not None else None
+            except OSError:
+                st = None
+            if st is None:
+                self._assets.pop(url_path, None)
+                return None
+            if asset is not None and (st.st_mtime_ns, st.st_size) == asset.signature:
+                self._checked_at[url_path] = now
+                record_cache("static_assets", True)
+                return asset
+            record_cache("static_assets", False)
+            return self._load(url_path, path)
+
+
+def send_asset(handler, asset: Asset):
+    """Answer a BaseHTTPRequestHandler request with asset: 304, or the best encoding (sendfile() for big files)"""
+    headers = handler.headers
+    encoding = asset.negotiate(headers.get("Accept-Encoding", ""))
+    if asset.not_modified(headers.get("If-None-Match"), headers.get("If-Modified-Since")):
+        handler.send_response(304)
+        handler.send_header("ETag", asset.etag_for(encoding))
+        handler.send_header("Last-Modified", asset.last_modified)
+        handler.send_header("Cache-Control", asset.cache_control)
+        handler.send_header("Vary", "Accept-Encoding")
+        handler.end_headers()
+        return
+
+    body = asset.variants[encoding]
+    handler.send_response(200)
+    handler.send_header("Content-type", asset.content_type)
+    handler.send_header("Content-Length", str(asset.size if body is None else len(body)))
+    handler.send_header("ETag", asset.etag_for(encoding))
+    handler.send_header("Last-Modified", asset.last_modified)
+    handler.send_header("Cache-Control", asset.cache_control)
+    handler.send_header("Vary", "Accept-Encoding")
+    if encoding != "identity":
+        handler.send_header("Content-Encoding", encoding)
+    handler.end_headers()
+    if body is not None:
+        handler.wfile.write(body)
+        return
+    with open(asset.path, "rb") as f:
+        handler.connection.sendfile(f, 0, asset.size)
+
+
+asset_cache = AssetCache()
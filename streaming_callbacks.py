@@ -0,0 +1,56 @@
+import threading
+from typing import Callable, Dict
+
+from langchain.callbacks.base import BaseCallbackHandler
+
+# ZERO_SHOT_REACT_DESCRIPTION agents put the user-facing text after this marker
+FINAL_ANSWER_MARKER = "Final Answer:"
+
+
+class FinalAnswerStreamHandler(BaseCallbackHandler):
+    """Forwards only the tokens of the agent's final answer, as the LLM generates them
+
+    Every ReAct step is an LLM call, but the Thought/Action/Observation steps
+    are not meant for the customer. Each call's text is buffered until the
+    final-answer marker shows up; from then on its tokens go to on_token.
+    The LLM must be created with streaming=True for tokens to arrive.
+    """
+
+    def __init__(self, on_token: Callable[[str], None]):
+        super().__init__()
+        self.on_token = on_token
+        self._lock = threading.Lock()
+        self._buffers: Dict = {}
+        # run_id -> whether any answer text has been sent yet (leading whitespace is dropped)
+        self._answering: Dict = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id=None, **kwargs) -> None:
+        with self._lock:
+            self._buffers[run_id] = ""
+
+    def on_llm_new_token(self, token: str, *, run_id=None, **kwargs) -> None:
+        with self._lock:
+            if run_id in self._answering:
+                emit = token
+            else:
+                buffer = self._buffers.get(run_id, "") + token
+                index = buffer.find(FINAL_ANSWER_MARKER)
+                if index < 0:
+                    self._buffers[run_id] = buffer
+                    return
+                self._buffers.pop(run_id, None)
+                emit = buffer[index + len(FINAL_ANSWER_MARKER):]
+            started = self._answering.get(run_id, False)
+            if not started:
+                emit = emit.lstrip()
+            self._answering[run_id] = started or bool(emit)
+        if emit:
+            self.on_token(emit)
+
+    def on_llm_end(self, response, *, run_id=None, **kwargs) -> None:
+        with self._lock:
+            self._buffers.pop(run_id, None)
+            self._answering.pop(run_id, None)
+
+    def on_llm_error(self, error, *, run_id=None, **kwargs) -> None:
+        self.on_llm_end(None, run_id=run_id)
@@ -0,0 +1,204 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Log-spaced buckets: 8 per doubling (~4% relative error) from 0.1ms to ~10 minutes
+_BUCKETS_PER_DOUBLING = 8
+_MIN_MS = 0.1
+_BUCKET_COUNT = _BUCKETS_PER_DOUBLING * 23
+BUCKET_BOUNDS_MS: List[float] = [_MIN_MS * 2 ** ((i + 1) / _BUCKETS_PER_DOUBLING) for i in range(_BUCKET_COUNT)]
+# Percentiles report the geometric middle of a bucket, which halves the worst-case error
+_BUCKET_MIDPOINTS_MS: List[float] = [bound * 2 ** (-0.5 / _BUCKETS_PER_DOUBLING) for bound in BUCKET_BOUNDS_MS]
+
+# Rolling window reported as "recent", kept as a ring of fixed-size time slices
+WINDOW_SECONDS = 300
+SLICE_SECONDS = 10
+
+
+def _bucket_index(ms: float) -> int:
+    if ms <= _MIN_MS:
+        return 0
+    index = int(math.log2(ms / _MIN_MS) * _BUCKETS_PER_DOUBLING)
+    return min(index, _BUCKET_COUNT - 1)
+
+
+class LatencyHistogram:
+    """Fixed-memory latency histogram; percentiles are bucket midpoints capped at the max"""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms: float):
+        self.counts[_bucket_index(ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def merge(self, other: "LatencyHistogram"):
+        for i, n in enumerate(other.counts):
+            if n:
+                self.counts[i] += n
+        self.count += other.count
+        self.total_ms += other.total_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(self.count * p / 100))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return min(_BUCKET_MIDPOINTS_MS[i], self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 2),
+            "p95_ms": round(self.percentile(95), 2),
+            "p99_ms": round(self.percentile(99), 2),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+
+class WindowedHistogram:
+    """Histogram since startup plus a rolling one over the last WINDOW_SECONDS"""
+
+    def __init__(self, window_seconds: int = WINDOW_SECONDS, slice_seconds: int = SLICE_SECONDS):
+        self.slice_seconds = slice_seconds
+        self.total = LatencyHistogram()
+        self._slices: List[Tuple[int, LatencyHistogram]] = [(-1, LatencyHistogram()) for _ in range(max(1, window_seconds // slice_seconds))]
+
+    def record(self, ms: float, now: Optional[float] = None):
+        self.total.record(ms)
+        epoch = int((now if now is not None else time.time()) // self.slice_seconds)
+        position = epoch % len(self._slices)
+        slice_epoch, histogram = self._slices[position]
+        if slice_epoch != epoch:
+            histogram = LatencyHistogram()
+            self._slices[position] = (epoch, histogram)
+        histogram.record(ms)
+
+    def recent(self, now: Optional[float] = None) -> LatencyHistogram:
+        epoch = int((now if now is not None else time.time()) // self.slice_seconds)
+        merged = LatencyHistogram()
+        for slice_epoch, histogram in self._slices:
+            if epoch - slice_epoch < len(self._slices):
+                merged.merge(histogram)
+        return merged
+
+
+class LatencyRecorder:
+    """Thread-safe latency histograms keyed by endpoint and by chat action"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, str], WindowedHistogram] = {}
+
+    def record(self, dimension: str, name: str, ms: float):
+        with self._lock:
+            series = self._series.get((dimension, name))
+            if series is None:
+                series = self._series[(dimension, name)] = WindowedHistogram()
+            series.record(ms)
+
+    def record_endpoint(self, route: str, ms: float):
+        self.record("endpoints", route, ms)
+
+    def record_action(self, action: str, ms: float):
+        self.record("actions", action, ms)
+
+    def record_stages(self, trace: "Trace"):
+        for stage, ms in trace.breakdown().items():
+            self.record("stages", stage, ms)
+
+    def summary(self) -> Dict[str, Dict[str, Dict]]:
+        result: Dict[str, Dict[str, Dict]] = {"endpoints": {}, "actions": {}, "stages": {}}
+        with self._lock:
+            for (dimension, name), series in sorted(self._series.items()):
+                result.setdefault(dimension, {})[name] = {
+                    "recent": series.recent().summary(),
+                    "total": series.total.summary(),
+                }
+        return result
+
+
+class Trace:
+    """Stage durations for one chat turn, in the order the stages finished"""
+
+    __slots__ = ("spans", "_lock")
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+        # Tool callbacks may finish on another thread than the request
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, ms: float):
+        with self._lock:
+            self.spans.append((stage, ms))
+
+    def breakdown(self) -> Dict[str, float]:
+        """Milliseconds per stage; a stage that ran more than once is summed"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for stage, ms in self.spans:
+                totals[stage] = totals.get(stage, 0.0) + ms
+        return {stage: round(ms, 2) for stage, ms in totals.items()}
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def start_trace() -> Trace:
+    """Begin a trace for the current request, replacing any left on this thread or task"""
+    trace = Trace()
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block into the current trace; a no-op outside a traced request"""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(stage, (time.perf_counter() - started) * 1000)
+
+
+# Collapse per-user and per-asset paths so each route gets one series
+_ROUTE_PREFIXES = [
+    ("/api/customer/", "/api/customer/{id}"),
+    ("/api/memory/", "/api/memory/{id}"),
+    ("/assets/", "/assets/*"),
+]
+
+
+def route_label(path: str) -> str:
+    path = path.split("?", 1)[0]
+    for prefix, label in _ROUTE_PREFIXES:
+        if path.startswith(prefix):
+            return label
+    if path.startswith("/api/") or path == "/metrics":
+        return path
+    return "/"
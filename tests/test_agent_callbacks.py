@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_community")
+pytest.importorskip("faiss")
+
+from langchain.agents import AgentType, initialize_agent
+from langchain.tools import Tool
+from langchain_community.llms.fake import FakeListLLM
+
+import langchain_server
+from prometheus_metrics import LLM_CALLS
+from telemetry import start_trace
+
+REACT_STEPS = [
+    "Thought: I should look the customer up\nAction: CustomerLookup\nAction Input: user_001",
+    "Thought: I know enough\nFinal Answer: Here is a discount offer to keep you with us.",
+]
+
+
+def fake_agent():
+    tool = Tool(name="CustomerLookup", func=lambda query: "Plan: basic", description="Looks up a customer.")
+    return initialize_agent(tools=[tool], llm=FakeListLLM(responses=REACT_STEPS), agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION)
+
+
+def test_agent_reply_records_tool_span(monkeypatch):
+    monkeypatch.setattr(langchain_server, "agent", fake_agent())
+    trace = start_trace()
+
+    reply = langchain_server.agent_reply("user_001", "I want to cancel", {"plan": "basic"}, [])
+
+    assert reply["action"] == "retention"
+    assert "tool:CustomerLookup" in trace.breakdown()
+
+
+def llm_call_count() -> float:
+    return sum(value for _, _, value in LLM_CALLS.samples())
+
+
+def test_agent_reply_counts_llm_calls(monkeypatch):
+    monkeypatch.setattr(langchain_server, "agent", fake_agent())
+    before = llm_call_count()
+
+    langchain_server.agent_reply("user_001", "I want to cancel", {"plan": "basic"}, [])
+
+    assert llm_call_count() - before == len(REACT_STEPS)
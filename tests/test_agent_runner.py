@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import pytest
+
+import agent_runner
+from agent_runner import AgentTimeoutError, run_agent
+
+
+class SleepyAgent:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.calls = []
+
+    async def arun(self, context, callbacks=None):
+        self.calls.append((context, callbacks))
+        await asyncio.sleep(self.seconds)
+        return f"answer to {context}"
+
+
+def test_runs_overlap_instead_of_blocking_the_loop():
+    agent = SleepyAgent(0.2)
+    handler = object()
+
+    async def main():
+        started = time.perf_counter()
+        answers = await asyncio.gather(*(run_agent(agent, f"q{i}", callbacks=[handler]) for i in range(5)))
+        return answers, time.perf_counter() - started
+
+    answers, elapsed = asyncio.run(main())
+    assert answers == [f"answer to q{i}" for i in range(5)]
+    assert elapsed < 0.6
+    assert all(callbacks == [handler] for _, callbacks in agent.calls)
+
+
+def test_slow_agent_times_out():
+    with pytest.raises(AgentTimeoutError):
+        asyncio.run(run_agent(SleepyAgent(5), "q", timeout=0.05))
+
+
+def test_semaphore_bounds_concurrent_runs(monkeypatch):
+    agent = SleepyAgent(0.1)
+
+    async def main():
+        monkeypatch.setattr(agent_runner, "_agent_slots", asyncio.Semaphore(1))
+        started = time.perf_counter()
+        await asyncio.gather(run_agent(agent, "a"), run_agent(agent, "b"), run_agent(agent, "c"))
+        return time.perf_counter() - started
+
+    assert asyncio.run(main()) >= 0.3
@@ -0,0 +1,102 @@
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from benchmarks import load_test
+from benchmarks.load_test import format_report, load_scenario, run_load
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+class ChatStub(BaseHTTPRequestHandler):
+    """Answers /api/chat with JSON and /api/chat/stream with two token events; userId "bad" gets a 500"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if body["userId"] == "bad":
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        stream = self.path == "/api/chat/stream"
+        payload = b"event: token\ndata: {}\n\nevent: final\ndata: {}\n\n" if stream else b'{"response": "ok"}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+@pytest.fixture
+def stub_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_scenario_skips_comments_and_needs_messages(tmp_path):
+    path = tmp_path / "scenario.jsonl"
+    path.write_text('# comment\n\n{"userId": "user_001", "message": "Hi"}\n')
+    assert load_scenario(path) == [{"userId": "user_001", "message": "Hi"}]
+
+    path.write_text('{"userId": "user_001"}\n')
+    with pytest.raises(ValueError):
+        load_scenario(path)
+    assert len(load_scenario(load_test.DEFAULT_SCENARIO)) > 0
+
+
+def test_report_counts_requests_statuses_and_errors(stub_url):
+    scenario = [{"userId": "user_001", "message": "Hi"}, {"userId": "bad", "message": "Hi"}]
+    report = run_load(stub_url, scenario, concurrency=3, total_requests=10, duration=None)
+
+    assert report["requests"] == 10
+    assert report["statuses"] == {"200": 5, "500": 5}
+    assert report["error_rate"] == 0.5
+    assert report["latency_ms"]["count"] == 10
+    assert "Error rate    50.00%" in format_report(report)
+
+
+def test_stream_mode_times_the_first_token(stub_url):
+    report = run_load(stub_url, [{"message": "Hi"}], concurrency=2, total_requests=4, duration=None, stream=True)
+
+    assert report["statuses"] == {"200": 4}
+    assert report["first_token_ms"]["count"] == 4
+
+
+def test_fake_agent_looks_the_customer_up_then_answers():
+    pytest.importorskip("langchain")
+    from benchmarks.fake_llm import FAKE_QA_ANSWER, fake_completion
+
+    prompt = 'Customer ID: user_004\nUser message: "I want to cancel"\nAction Input:'
+    first = fake_completion(prompt)
+    assert "Action: CustomerLookup" in first and "user_004" in first
+    assert "Final Answer:" in fake_completion(prompt + first)
+    assert "Final Answer:" in fake_completion(prompt, tool_calls=False)
+    assert fake_completion("Summarize this profile") == FAKE_QA_ANSWER
+
+
+def test_simple_server_run_keeps_the_tree_clean(tmp_path):
+    def tree_state():
+        return {path: path.stat().st_mtime_ns for folder in ("logs", "cache", "vector_index") for path in (REPO / folder).rglob("*")}
+
+    before = tree_state()
+    report_path = tmp_path / "report.json"
+    code = load_test.main(["simple_server", "--requests", "20", "--concurrency", "2", "--warmup", "2", "--port", str(free_port()), "--startup-timeout", "30", "--json", str(report_path)])
+
+    report = json.loads(report_path.read_text())
+    assert code == 0 and report["requests"] == 20 and report["error_rate"] == 0
+    assert tree_state() == before
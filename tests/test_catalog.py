@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+import catalog as catalog_module
+from catalog import CachedJSONFile, Catalog, CustomerIndex
+
+
+def write_json(path, value):
+    path.write_text(json.dumps(value))
+
+
+def test_file_is_parsed_once_until_it_changes(tmp_path, monkeypatch):
+    path = tmp_path / "customers.json"
+    write_json(path, {"user_1": {"plan": "basic"}})
+    parses = []
+    real_loads = catalog_module.loads
+    monkeypatch.setattr(catalog_module, "loads", lambda data: parses.append(1) or real_loads(data))
+    cached = CachedJSONFile(path, check_interval=0)
+
+    first = cached.get()
+    assert cached.get() is first and len(parses) == 1
+
+    write_json(path, {"user_1": {"plan": "premium"}, "user_2": {}})
+    assert cached.get()["user_1"]["plan"] == "premium" and len(parses) == 2
+
+
+def test_recent_check_skips_the_stat(tmp_path, monkeypatch):
+    path = tmp_path / "products.json"
+    write_json(path, {"plans": {}})
+    cached = CachedJSONFile(path, check_interval=60)
+    cached.get()
+    monkeypatch.setattr(catalog_module.os, "stat", lambda *args: pytest.fail("re-stat'ed inside the check interval"))
+    assert cached.get() == {"plans": {}}
+
+
+def test_snapshots_are_read_only_and_a_missing_file_is_empty(tmp_path):
+    path = tmp_path / "customers.json"
+    cached = CachedJSONFile(path, check_interval=0)
+    assert cached.get() == {}
+
+    write_json(path, {"user_1": {"feature_usage": ["api"]}})
+    snapshot = cached.get()
+    with pytest.raises(TypeError):
+        snapshot["user_2"] = {}
+    with pytest.raises(TypeError):
+        snapshot["user_1"]["plan"] = "premium"
+    assert snapshot["user_1"]["feature_usage"] == ("api",)
+
+    path.unlink()
+    assert cached.get() == {}
+
+
+def test_catalog_invalidate_forces_a_reload(tmp_path):
+    customers, products = tmp_path / "customers.json", tmp_path / "products.json"
+    write_json(customers, {"user_1": {"plan": "basic"}})
+    write_json(products, {"plans": {}})
+    shared = Catalog(customers, products)
+    first = shared.customers()
+
+    shared.invalidate()
+    assert shared.customers() is not first and shared.customers() == first
+
+
+CUSTOMERS = {
+    "user_1": {"name": "Ada Lovelace", "email": "ada@analytical.io"},
+    "user_2": {"name": "Grace Hopper", "email": "grace@navy.mil"},
+    "user_3": {"name": "Ada Lovelace", "email": "ada.l@example.com"},
+}
+
+
+def test_index_resolves_id_then_name_then_email_prefix():
+    index = CustomerIndex(CUSTOMERS)
+
+    assert index.lookup("user_2") is CUSTOMERS["user_2"]
+    # Duplicate names resolve to the first customer in file order, like the old linear scan
+    assert index.lookup("Ada Lovelace") is CUSTOMERS["user_1"]
+    assert index.lookup("grace@") is CUSTOMERS["user_2"]
+    assert index.lookup("ada.") is CUSTOMERS["user_3"]
+    assert index.lookup("nobody") is None
+    assert index.find_by_email_prefix("") is None
+
+
+def test_index_is_rebuilt_only_when_the_customers_file_reloads(tmp_path):
+    customers, products = tmp_path / "customers.json", tmp_path / "products.json"
+    write_json(customers, CUSTOMERS)
+    write_json(products, {"plans": {}})
+    shared = Catalog(customers, products)
+
+    index = shared.customer_index()
+    assert shared.customer_index() is index
+    assert shared.find_customer("grace@")["name"] == "Grace Hopper"
+    assert shared.customer_or_default("user_9")["email"] == "user_9@example.com"
+
+    write_json(customers, {"user_9": {"name": "New", "email": "new@example.com"}})
+    shared.invalidate()
+    assert shared.customer_index() is not index
+    assert shared.find_customer("user_9")["name"] == "New"
@@ -0,0 +1,56 @@
+import itertools
+import json
+from pathlib import Path
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from churn_scoring import score_book
+from customer_profile import (
+    ESTABLISHED_MONTHS, HIGH_SUPPORT_TICKETS_ABOVE, HIGH_USAGE_ABOVE, MEDIUM_SUPPORT_TICKETS_ABOVE,
+    MEDIUM_USAGE_ABOVE, NEW_CUSTOMER_MONTHS, analyze_customer_profile
+)
+
+SCORED_LABELS = ("churn_risk", "upsell_potential", "usage_level", "retention_strategy")
+DATA = Path(__file__).resolve().parent.parent / "data" / "customers.json"
+
+
+def around(*thresholds):
+    return sorted({value + delta for value in (0, *thresholds) for delta in (-1, 0, 1)})
+
+
+def assert_matches_profiles(customers):
+    scored = dict(score_book(customers).profiles())
+    for user_id, customer in customers.items():
+        expected = analyze_customer_profile(customer)
+        assert scored[user_id] == {label: expected[label] for label in SCORED_LABELS}, (user_id, customer)
+
+
+def test_book_scores_match_the_profile_rules_at_every_threshold():
+    grid = itertools.product(
+        around(MEDIUM_USAGE_ABOVE, HIGH_USAGE_ABOVE),
+        around(NEW_CUSTOMER_MONTHS, ESTABLISHED_MONTHS),
+        (0, 1, 3),
+        around(MEDIUM_SUPPORT_TICKETS_ABOVE, HIGH_SUPPORT_TICKETS_ABOVE),
+    )
+    customers = {
+        f"user_{i}": {"monthly_usage": usage, "months_subscribed": months, "payment_issues": issues, "support_tickets": tickets}
+        for i, (usage, months, issues, tickets) in enumerate(grid)
+    }
+    assert_matches_profiles(customers)
+
+
+def test_missing_fields_score_like_zero():
+    assert_matches_profiles({"user_1": {}, "user_2": {"monthly_usage": HIGH_USAGE_ABOVE + 1}})
+
+
+def test_bundled_customers_match():
+    with open(DATA) as f:
+        assert_matches_profiles(json.load(f))
+
+
+def test_counts_cover_every_customer():
+    counts = score_book({"a": {"months_subscribed": 0}, "b": {"months_subscribed": 100}}).counts()
+    assert sum(counts["churn_risk"].values()) == 2
+    assert counts["retention_strategy"] == {"aggressive": 1, "standard": 1}
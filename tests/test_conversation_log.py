@@ -0,0 +1,152 @@
+import threading
+import time
+
+import conversation_log as conversation_log_module
+from conversation_log import ConversationLog, WriteBehindWriter
+
+
+def drain(log, checkpoint):
+    turns = []
+    for chunk, checkpoint in log.tail(checkpoint):
+        turns.extend(chunk)
+    return turns, checkpoint
+
+
+def test_tail_reads_only_journaled_files(tmp_path, monkeypatch):
+    log = ConversationLog(tmp_path, write_behind=False)
+    for i in range(50):
+        log.append(f"user_{i}", {"turn": 0})
+    turns, checkpoint = drain(log, None)
+    assert len(turns) == 50
+
+    opened = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda path, *args, **kwargs: opened.append(str(path)) or real_open(path, *args, **kwargs))
+    log.append("user_7", {"turn": 1})
+    turns, checkpoint = drain(log, checkpoint)
+
+    assert turns == [{"turn": 1}]
+    assert sorted(opened) == sorted([str(log.journal_path), str(log.path_for("user_7"))])
+    assert drain(log, checkpoint)[0] == []
+
+
+def test_tail_rotates_the_journal_without_losing_turns(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversation_log_module, "JOURNAL_MAX_BYTES", 64)
+    log = ConversationLog(tmp_path, write_behind=False)
+    checkpoint = None
+    seen = 0
+    for i in range(20):
+        log.append(f"user_{i % 3}", {"turn": i})
+        turns, checkpoint = drain(log, checkpoint)
+        seen += len(turns)
+    assert seen == 20
+    assert (tmp_path / ".changes.old").exists()
+
+
+def test_checkpoint_without_journal_offset_scans_every_file(tmp_path):
+    log = ConversationLog(tmp_path, write_behind=False)
+    log.append("user_a", {"turn": 0})
+    log.append("user_b", {"turn": 0})
+    _, checkpoint = drain(log, None)
+    log.append("user_a", {"turn": 1})
+
+    turns, _ = drain(log, {"offsets": checkpoint["offsets"]})
+
+    assert turns == [{"turn": 1}]
+
+
+class RecordingLog:
+    """Stands in for a store; write_batch can be held to keep the writer thread busy"""
+
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def write_batch(self, batch):
+        self.release.wait(5)
+        self.batches.append({user_id: list(items) for user_id, items in batch.items()})
+
+    def turns_for(self, user_id):
+        return [item for batch in self.batches for item in batch.get(user_id, [])]
+
+
+def test_submit_waits_while_the_queue_is_full():
+    log = RecordingLog()
+    writer = WriteBehindWriter(log, flush_interval_ms=10_000, max_pending=2)
+    writer.submit("user_1", 1)
+    writer.submit("user_1", 2)
+    blocked = threading.Thread(target=writer.submit, args=("user_1", 3), daemon=True)
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive() and writer.pending() == 2
+
+    writer.flush_user("user_1")
+    blocked.join(5)
+    assert not blocked.is_alive()
+    writer.close()
+    assert log.turns_for("user_1") == [1, 2, 3]
+
+
+def test_flush_user_keeps_order_with_a_batch_in_flight():
+    log = RecordingLog()
+    writer = WriteBehindWriter(log, flush_interval_ms=0)
+    log.release.clear()
+    writer.submit("user_1", 1)
+    # The writer thread now holds turn 1 in a write that cannot finish yet
+    deadline = time.monotonic() + 5
+    while writer.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.submit("user_1", 2)
+    flushing = threading.Thread(target=writer.flush_user, args=("user_1",), daemon=True)
+    flushing.start()
+    flushing.join(0.1)
+    log.release.set()
+    flushing.join(5)
+    writer.close()
+    assert log.turns_for("user_1") == [1, 2]
+
+
+def test_close_drains_the_queue_and_later_turns_are_written_inline():
+    log = RecordingLog()
+    writer = WriteBehindWriter(log, flush_interval_ms=10_000)
+    for i in range(5):
+        writer.submit(f"user_{i % 2}", i)
+    writer.close()
+    assert log.turns_for("user_0") == [0, 2, 4]
+    assert log.turns_for("user_1") == [1, 3]
+
+    writer.submit("user_0", 5)
+    assert log.turns_for("user_0") == [0, 2, 4, 5]
+    assert writer.pending() == 0
+
+
+def test_appends_and_last_n_reads(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversation_log_module, "TAIL_BLOCK_SIZE", 16)
+    log = ConversationLog(tmp_path, write_behind=False)
+    for i in range(30):
+        log.append("user_1", {"turn": i, "message": "x" * (i % 7)})
+
+    assert [turn["turn"] for turn in log.load("user_1")] == list(range(30))
+    assert [turn["turn"] for turn in log.load("user_1", last_n=3)] == [27, 28, 29]
+    assert len(log.load("user_1", last_n=100)) == 30
+    assert log.load("user_1", last_n=0) == []
+    assert log.load("nobody") == []
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    log = ConversationLog(tmp_path, write_behind=False)
+    log.append("user_1", {"turn": 0})
+    with open(log.path_for("user_1"), "ab") as f:
+        f.write(b'{"turn": 1, "mess')
+    assert log.load("user_1") == [{"turn": 0}]
+
+
+def test_legacy_json_array_is_migrated_before_new_turns(tmp_path):
+    (tmp_path / "user_1.json").write_text('[{"turn": 0}, {"turn": 1}]')
+    log = ConversationLog(tmp_path, write_behind=False)
+    log.append("user_1", {"turn": 2})
+
+    assert [turn["turn"] for turn in log.load("user_1")] == [0, 1, 2]
+    assert not (tmp_path / "user_1.json").exists()
+    assert (tmp_path / "user_1.json.migrated").exists()
@@ -0,0 +1,77 @@
+import pytest
+
+import conversation_store
+from conversation_log import ConversationLog
+from conversation_store import SQLiteConversationStore
+
+
+@pytest.fixture(params=["jsonl", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "jsonl":
+        store = ConversationLog(tmp_path / "logs", write_behind=False)
+    else:
+        store = SQLiteConversationStore(tmp_path / "conversations.sqlite3", write_behind=False)
+    yield store
+    store.close()
+
+
+def test_count_actions_between_timestamps(store):
+    store.append("user_1", {"timestamp": "2024-05-01T09:00:00", "action": "retention"})
+    store.append("user_2", {"timestamp": "2024-05-01T23:59:59", "action": "retention"})
+    store.append("user_1", {"timestamp": "2024-05-02T00:00:00", "action": "retention"})
+    store.append("user_3", {"timestamp": "2024-05-01T12:00:00", "action": "upsell"})
+    store.append("user_3", {"timestamp": "2024-04-30T12:00:00", "action": "escalate"})
+
+    assert store.count_actions("2024-05-01", "2024-05-02") == {"retention": 2, "upsell": 1}
+    assert store.count_actions(since="2024-05-01T12:00:00") == {"retention": 2, "upsell": 1}
+    assert store.count_actions(until="2024-05-01") == {"escalate": 1}
+    assert sum(store.count_actions().values()) == 5
+
+
+def test_sqlite_round_trip_and_last_n(tmp_path):
+    path = tmp_path / "conversations.sqlite3"
+    store = SQLiteConversationStore(path)
+    turns = [{"timestamp": f"2024-05-01T10:00:0{i}", "action": "neutral", "user_message": f"message {i}"} for i in range(5)]
+    for turn in turns:
+        store.append("user_1", turn)
+    store.append("user_2", {"timestamp": "2024-05-01T10:00:00", "action": "upsell"})
+
+    # Reads flush the write-behind queue for that user first
+    assert store.load("user_1") == turns
+    assert store.load("user_1", last_n=2) == turns[-2:]
+    assert store.load("user_1", last_n=0) == []
+    store.close()
+
+    reopened = SQLiteConversationStore(path, write_behind=False)
+    assert reopened.load("user_1") == turns
+    assert reopened.load("nobody") == []
+    reopened.close()
+
+
+def test_sqlite_tail_resumes_from_its_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(conversation_store, "TAIL_CHUNK_SIZE", 2)
+    store = SQLiteConversationStore(tmp_path / "conversations.sqlite3", write_behind=False)
+    for i in range(5):
+        store.append(f"user_{i % 2}", {"turn": i})
+
+    chunks = list(store.tail(None))
+    assert [len(turns) for turns, _ in chunks] == [2, 2, 1]
+    checkpoint = chunks[-1][1]
+
+    store.append("user_0", {"turn": 5})
+    assert [turns for turns, _ in store.tail(checkpoint)] == [[{"turn": 5}]]
+    assert store.source() == str((tmp_path / "conversations.sqlite3").resolve())
+    store.close()
+
+
+def test_import_jsonl_copies_every_users_log(tmp_path):
+    log = ConversationLog(tmp_path / "logs", write_behind=False)
+    log.append("user_1", {"timestamp": "2024-05-01T10:00:00", "action": "retention"})
+    log.append("user_2", {"timestamp": "2024-05-01T11:00:00", "action": "upsell"})
+    log.append("user_1", {"timestamp": "2024-05-01T12:00:00", "action": "escalate"})
+
+    store = SQLiteConversationStore(tmp_path / "conversations.sqlite3", write_behind=False)
+    assert store.import_jsonl(tmp_path / "logs") == 3
+    assert store.load("user_1") == log.load("user_1")
+    assert store.count_actions() == {"retention": 1, "upsell": 1, "escalate": 1}
+    store.close()
@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip("langchain")
+
+from benchmarks.fake_llm import FakeEmbeddings
+from embedding_cache import CachedEmbeddings
+from prometheus_metrics import CACHE_REQUESTS
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    def __init__(self):
+        super().__init__(latency_ms=0)
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.embedded.append(text)
+        return super().embed_query(text)
+
+
+def embedding_lookups(result: str) -> float:
+    return sum(value for _, labels, value in CACHE_REQUESTS.samples() if labels == {"cache": "embeddings", "result": result})
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    underlying = CountingEmbeddings()
+    cache = CachedEmbeddings(underlying, tmp_path / "embeddings.sqlite3")
+    hits_before, misses_before = embedding_lookups("hit"), embedding_lookups("miss")
+
+    first = cache.embed_documents(["alpha", "beta", "alpha"])
+    assert underlying.embedded == ["alpha", "beta"]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+    second = cache.embed_documents(["beta", "alpha", "gamma"])
+    assert underlying.embedded == ["alpha", "beta", "gamma"]
+    assert (cache.hits, cache.misses) == (3, 3)
+    assert second[0] == pytest.approx(first[1], abs=1e-6) and second[1] == pytest.approx(first[0], abs=1e-6)
+
+    cache.embed_query("gamma")
+    cache.embed_query("delta")
+    assert (cache.hits, cache.misses) == (4, 4)
+    assert embedding_lookups("hit") - hits_before == 4
+    assert embedding_lookups("miss") - misses_before == 4
+
+
+def test_vectors_survive_a_restart_per_model(tmp_path):
+    path = tmp_path / "embeddings.sqlite3"
+    cache = CachedEmbeddings(CountingEmbeddings(), path)
+    vector = cache.embed_query("customer user_001")
+    cache.close()
+
+    underlying = CountingEmbeddings()
+    reopened = CachedEmbeddings(underlying, path)
+    assert reopened.embed_query("customer user_001") == pytest.approx(vector, abs=1e-6)
+    assert underlying.embedded == []
+
+    other_model = CachedEmbeddings(underlying, path, model_name="other-model")
+    other_model.embed_query("customer user_001")
+    assert underlying.embedded == ["customer user_001"]
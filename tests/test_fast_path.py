@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("faiss")
+
+import langchain_server
+import rule_responses
+from catalog import catalog, default_customer
+from customer_profile import analyze_customer_profile
+
+UNKNOWN_USER = "not_a_customer"
+MESSAGE = "Please cancel my subscription"
+
+
+@pytest.fixture
+def cancel_on_fast_path(monkeypatch):
+    # "cancel" replies depend on churn risk, so they show which profile was used
+    monkeypatch.setattr(rule_responses, "FAST_PATH_INTENTS", frozenset({"cancel"}))
+
+
+def test_default_customer_for_unknown_user():
+    assert catalog.find_customer(UNKNOWN_USER) is None
+    assert catalog.customer_or_default(UNKNOWN_USER) == default_customer(UNKNOWN_USER)
+
+
+def test_stdlib_server_answers_unknown_user_from_default_customer(monkeypatch, cancel_on_fast_path):
+    monkeypatch.setattr(langchain_server, "save_conversation_turn", lambda *args, **kwargs: None)
+    expected = rule_responses.rule_based_response("cancel", analyze_customer_profile(default_customer(UNKNOWN_USER)), catalog.products())
+
+    reply = langchain_server.chat_turn({"userId": UNKNOWN_USER, "message": MESSAGE}, time.time())
+
+    assert reply.response == expected["response"]
+    assert reply.action == expected["action"]
+
+
+def test_fastapi_server_answers_unknown_user_like_stdlib_server(monkeypatch, tmp_path, cancel_on_fast_path):
+    pytest.importorskip("fastapi")
+    # main_langchain mounts dist/assets at import time
+    (tmp_path / "dist" / "assets").mkdir(parents=True)
+    with monkeypatch.context() as m:
+        m.chdir(tmp_path)
+        import main_langchain
+    monkeypatch.setattr(langchain_server, "save_conversation_turn", lambda *args, **kwargs: None)
+    monkeypatch.setattr(main_langchain, "save_conversation_turn", lambda *args, **kwargs: None)
+
+    stdlib_reply = langchain_server.chat_turn({"userId": UNKNOWN_USER, "message": MESSAGE}, time.time())
+    fastapi_reply = asyncio.run(main_langchain.chat_turn(main_langchain.ChatRequest(userId=UNKNOWN_USER, message=MESSAGE)))
+
+    assert fastapi_reply.response == stdlib_reply.response
+    assert fastapi_reply.action == stdlib_reply.action
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from http_metrics import install_http_metrics
+from prometheus_metrics import HTTP_IN_FLIGHT, HTTP_REQUESTS
+
+
+def in_flight() -> float:
+    return sum(value for _, _, value in HTTP_IN_FLIGHT.samples())
+
+
+def requests_for(route: str) -> float:
+    return sum(value for _, labels, value in HTTP_REQUESTS.samples() if labels.get("route") == route)
+
+
+def make_app(seen, finished):
+    app = FastAPI()
+    install_http_metrics(app, on_finish=lambda route, ms: finished.append((route, ms)))
+
+    @app.get("/api/plain")
+    async def plain():
+        return {"ok": True}
+
+    @app.get("/api/stream")
+    async def stream():
+        async def body():
+            yield b"first\n"
+            await asyncio.sleep(0.05)
+            seen.append(in_flight())
+            yield b"second\n"
+        return StreamingResponse(body(), media_type="text/plain")
+
+    return app
+
+
+def test_streamed_response_stays_in_flight_until_it_ends():
+    seen, finished = [], []
+    client = TestClient(make_app(seen, finished))
+    before, counted = in_flight(), requests_for("/api/stream")
+
+    assert client.get("/api/stream").text == "first\nsecond\n"
+
+    assert seen == [before + 1]
+    assert in_flight() == before
+    assert requests_for("/api/stream") == counted + 1
+    route, elapsed_ms = finished[-1]
+    assert route == "/api/stream" and elapsed_ms >= 50
+
+
+def test_plain_response_is_counted_once():
+    seen, finished = [], []
+    client = TestClient(make_app(seen, finished))
+    before, counted = in_flight(), requests_for("/api/plain")
+
+    assert client.get("/api/plain").json() == {"ok": True}
+
+    assert in_flight() == before
+    assert requests_for("/api/plain") == counted + 1
+    assert [route for route, _ in finished] == ["/api/plain"]
@@ -0,0 +1,21 @@
+from intent_matcher import classify_records, parse_jsonl
+
+
+def test_bad_lines_become_error_records_in_place():
+    lines = [
+        b'{"id": 1, "message": "Please cancel my subscription"}',
+        b'{not json',
+        b'\xff\xfe broken',
+        b'',
+        b'42',
+        b'"I need more features"',
+    ]
+
+    results = list(classify_records(parse_jsonl(lines)))
+
+    assert results[0]["id"] == 1 and results[0]["intent"] == "cancel"
+    assert results[1] == {"line": 2, "error": "invalid JSON"}
+    assert results[2] == {"line": 3, "error": "invalid UTF-8"}
+    assert results[3] == {"line": 5, "error": "expected an object or a string"}
+    assert results[4]["intent"] == "feature_relevance" and "more features" in results[4]["evidence"]
+    assert len(results) == 5
@@ -0,0 +1,52 @@
+import importlib
+import json
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_community")
+pytest.importorskip("faiss")
+
+from fastapi.testclient import TestClient
+
+from catalog import catalog
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    # The app mounts dist/assets and reads data/ relative to the working directory
+    (tmp_path / "dist" / "assets").mkdir(parents=True)
+    (tmp_path / "data").symlink_to(REPO / "data")
+    monkeypatch.chdir(tmp_path)
+    module = importlib.import_module("main_langchain")
+
+    async def upsell_reply(user_id, message, on_token=None):
+        return {"response": "Try Pro.", "action": "upsell", "confidence": 0.9, "suggestedOffer": "Pro", "tools_used": [], "options": []}
+
+    monkeypatch.setattr(module, "agent_reply", upsell_reply)
+    return module
+
+
+def test_chat_splices_the_precomputed_plan_comparison(app_module):
+    customer = catalog.find_customer("user_001")
+    comparison = catalog.plan_comparison(customer.get("plan", "basic"), "upsell")
+
+    response = TestClient(app_module.app).post("/api/chat", json={"userId": "user_001", "message": "I need more features"})
+
+    assert response.status_code == 200
+    assert comparison.encoded in response.content
+    assert response.json()["plan_comparison"] == json.loads(comparison.encoded)
+    assert response.json()["action"] == "upsell"
+
+
+def test_chat_stream_ends_with_the_same_reply(app_module):
+    response = TestClient(app_module.app).post("/api/chat/stream", json={"userId": "user_001", "message": "I need more features"})
+
+    final = [line for line in response.text.splitlines() if line.startswith("data: ")][-1]
+    reply = json.loads(final[len("data: "):])
+    assert reply["action"] == "upsell" and reply["plan_comparison"]["current_plan"]
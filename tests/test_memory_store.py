@@ -0,0 +1,31 @@
+import memory_store
+from memory_store import ConversationMemoryStore
+
+
+def test_evicted_users_are_restored_from_the_spill_dir(tmp_path):
+    store = ConversationMemoryStore(max_users=1, spill_dir=str(tmp_path))
+    store.update("user_1", ["cancel"], ["expensive"])
+    store.update("user_2", [], [])
+
+    assert len(store) == 1 and (tmp_path / "user_1.json").exists()
+    assert store.get("user_1")["concerns"] == ["expensive"]
+
+    store.update("user_1", ["upgrade"], [])
+    memory = store.get("user_1")
+    assert sorted(memory["topics_mentioned"]) == ["cancel", "upgrade"]
+    assert memory["concerns"] == ["expensive"]
+
+
+def test_spill_files_are_read_without_the_store_lock(tmp_path, monkeypatch):
+    store = ConversationMemoryStore(max_users=1, spill_dir=str(tmp_path))
+    store.update("user_1", ["cancel"], [])
+    store.update("user_2", [], [])
+
+    held = []
+    real_loads = memory_store.loads
+    monkeypatch.setattr(memory_store, "loads", lambda data: held.append(store._lock.locked()) or real_loads(data))
+    store.get("user_1")
+    store.update("user_1", [], ["expensive"])
+
+    assert held == [False, False]
+    assert store.get("user_1")["topics_mentioned"] == ["cancel"]
@@ -0,0 +1,68 @@
+from datetime import datetime
+
+from conversation_log import ConversationLog
+from metrics_rollup import MetricsRollup
+
+
+def turn(action, confidence):
+    return {"timestamp": datetime.now().isoformat(), "action": action, "confidence": confidence, "latency_ms": 5}
+
+
+def test_offer_counters_use_the_servers_confidence_rule(tmp_path):
+    log = ConversationLog(tmp_path / "logs", write_behind=False)
+    for action, confidence in [("retention", 0.8), ("retention", 0.6), ("upsell", 0.8), ("upsell", 0.7), ("neutral", 0.6)]:
+        log.append("user_001", turn(action, confidence))
+    rollup = MetricsRollup(log, tmp_path / "rollups.sqlite3")
+
+    assert rollup.run_once() == 5
+    summary = rollup.dashboard_summary()
+
+    assert summary["total_conversations"] == 5
+    assert summary["churn_prevented"] == 1
+    assert summary["upsells_completed"] == 1
+    assert summary["offers_shown"] == 2
+
+
+def test_checkpoint_from_another_log_dir_rebuilds(tmp_path):
+    scratch = ConversationLog(tmp_path / "scratch", write_behind=False)
+    real = ConversationLog(tmp_path / "real", write_behind=False)
+    for _ in range(3):
+        scratch.append("user_001", turn("neutral", 0.6))
+    real.append("user_001", turn("neutral", 0.6))
+    path = tmp_path / "rollups.sqlite3"
+    MetricsRollup(scratch, path).run_once()
+
+    rollup = MetricsRollup(real, path)
+    rollup.run_once()
+    real.append("user_001", turn("neutral", 0.6))
+    rollup.run_once()
+
+    assert rollup.dashboard_summary()["total_conversations"] == 2
+
+
+def test_dashboard_summary_is_cached_until_the_rollups_change(tmp_path):
+    log = ConversationLog(tmp_path / "logs", write_behind=False)
+    log.append("user_001", turn("retention", 0.9))
+    rollup = MetricsRollup(log, tmp_path / "rollups.sqlite3")
+    rollup.run_once()
+    first = rollup.dashboard_summary()
+
+    assert rollup.dashboard_summary() is first
+    log.append("user_002", turn("upsell", 0.9))
+    rollup.run_once()
+    second = rollup.dashboard_summary()
+
+    assert second is not first
+    assert (second["total_conversations"], second["churn_prevented"], second["upsells_completed"]) == (2, 1, 1)
+
+
+def test_dashboard_summary_sees_commits_from_another_process(tmp_path):
+    log = ConversationLog(tmp_path / "logs", write_behind=False)
+    path = tmp_path / "rollups.sqlite3"
+    reader = MetricsRollup(log, path)
+    assert reader.dashboard_summary()["total_conversations"] == 0
+
+    log.append("user_001", turn("neutral", 0.6))
+    MetricsRollup(log, path).run_once()
+
+    assert reader.dashboard_summary()["total_conversations"] == 1
@@ -0,0 +1,51 @@
+import socket
+import threading
+
+from metrics_stream import MetricsBroadcaster
+
+
+def subscribe_in_background(broadcaster, sock) -> threading.Event:
+    done = threading.Event()
+    threading.Thread(target=lambda: (broadcaster.subscribe_socket(sock), done.set()), daemon=True).start()
+    return done
+
+
+def test_stalled_client_does_not_block_subscribe():
+    # A snapshot far bigger than the socket buffers, sent to a client that never reads
+    broadcaster = MetricsBroadcaster(lambda: {"blob": "x" * (8 * 1024 * 1024)}, interval=60)
+    stalled, stalled_peer = socket.socketpair()
+    reader, reader_peer = socket.socketpair()
+    try:
+        assert subscribe_in_background(broadcaster, stalled).wait(5)
+        assert subscribe_in_background(broadcaster, reader).wait(5)
+        assert broadcaster.subscriber_count() == 2
+        assert reader_peer.recv(64).startswith(b"event: snapshot")
+    finally:
+        for sock in (stalled, stalled_peer, reader, reader_peer):
+            sock.close()
+
+
+def test_slow_snapshot_does_not_block_subscribe():
+    calls = []
+    in_snapshot = threading.Event()
+    release = threading.Event()
+
+    def snapshot():
+        calls.append(1)
+        if len(calls) > 1:
+            in_snapshot.set()
+            release.wait(10)
+        return {"turns": len(calls)}
+
+    broadcaster = MetricsBroadcaster(snapshot, interval=0.05)
+    first, first_peer = socket.socketpair()
+    second, second_peer = socket.socketpair()
+    try:
+        assert subscribe_in_background(broadcaster, first).wait(5)
+        assert in_snapshot.wait(5)
+        assert subscribe_in_background(broadcaster, second).wait(1)
+        assert second_peer.recv(64).startswith(b"event: snapshot")
+    finally:
+        release.set()
+        for sock in (first, first_peer, second, second_peer):
+            sock.close()
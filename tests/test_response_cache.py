@@ -0,0 +1,37 @@
+import hashlib
+
+import numpy as np
+
+from response_cache import SemanticResponseCache
+
+
+class HashEmbeddings:
+    """Deterministic unrelated vectors per text, so only identical texts are similar"""
+
+    def embed_query(self, text):
+        seed = int(hashlib.blake2b(text.encode("utf-8"), digest_size=4).hexdigest(), 16)
+        return np.random.default_rng(seed).normal(size=16)
+
+
+def test_lookup_stays_in_its_bucket():
+    cache = SemanticResponseCache(HashEmbeddings(), threshold=-1.0)
+    cache.store("Too expensive!", ("pricing", "basic"), {"response": "basic"})
+    cache.store("Too expensive!", ("pricing", "premium"), {"response": "premium"})
+
+    assert cache.lookup("too expensive", ("pricing", "premium")) == {"response": "premium"}
+    assert cache.lookup("anything else", ("pricing", "basic")) == {"response": "basic"}
+    assert cache.lookup("too expensive", ("cancel", "basic")) is None
+
+
+def test_expired_entries_are_dropped_lazily(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("response_cache.time.time", lambda: now[0])
+    cache = SemanticResponseCache(HashEmbeddings(), ttl_seconds=60)
+    cache.store("hello", "bucket", {"response": "hi"})
+    cache.store("bye", "other", {"response": "bye"})
+
+    now[0] += 61
+    assert cache.lookup("hello", "bucket") is None
+    assert len(cache) == 1
+    cache.store("new", "bucket", {"response": "new"})
+    assert len(cache) == 1
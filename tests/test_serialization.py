@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+import serialization
+from catalog import EncodedJSON, FrozenDict, freeze
+from serialization import ChatReply
+
+COMPARISON = {"current_plan": {"name": "Basic", "price": 29, "features": ["email"]}, "action": "upsell"}
+
+
+@pytest.fixture(params=["orjson", "msgspec", "json"])
+def backend(request, monkeypatch):
+    """serialization.dumps/loads running on one named backend"""
+    try:
+        name, dumps, dumps_pretty, loads, splices_nested = serialization._select_backend(request.param)
+    except ImportError:
+        pytest.skip(f"{request.param} is not installed")
+    monkeypatch.setattr(serialization, "_dumps", dumps)
+    monkeypatch.setattr(serialization, "_dumps_pretty", dumps_pretty)
+    monkeypatch.setattr(serialization, "_splices_nested", splices_nested)
+    return loads
+
+
+def encoded_like_json(value) -> bytes:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def test_spliced_values_encode_like_json_dumps(backend):
+    reply = {"response": "Try Pro — 20% off", "confidence": 0.9, "plan_comparison": EncodedJSON(COMPARISON), "debug": None}
+    expected = dict(reply, plan_comparison=COMPARISON)
+
+    assert serialization.dumps(reply) == encoded_like_json(expected)
+    assert backend(serialization.dumps(reply)) == expected
+
+
+def test_only_pre_encoded_values_are_spliced(backend):
+    assert serialization.dumps({"only": EncodedJSON(COMPARISON)}) == encoded_like_json({"only": COMPARISON})
+    assert serialization.dumps({}) == b"{}"
+
+
+def test_chat_reply_and_catalog_snapshots_encode_as_plain_json(backend):
+    reply = ChatReply(response="Hi", action="upsell", confidence=0.9, tools_used=["IntentDetection"], plan_comparison=EncodedJSON(COMPARISON))
+    snapshot = freeze({"user_1": {"feature_usage": ["api"]}})
+
+    assert backend(serialization.dumps(reply)) == dict(reply.to_dict(), plan_comparison=COMPARISON)
+    assert isinstance(snapshot, FrozenDict)
+    assert serialization.dumps(snapshot) == encoded_like_json({"user_1": {"feature_usage": ["api"]}})
+
+
+def test_pretty_output_is_the_same_document(backend):
+    value = {"a": [1, 2], "b": {"c": None}}
+    pretty = serialization.dumps_pretty(value)
+    assert b"\n" in pretty and backend(pretty) == value
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        serialization._select_backend("yaml")
@@ -0,0 +1,90 @@
+import asyncio
+import json
+import threading
+import uuid
+
+import pytest
+
+from sse import astream_turn, chunk_text, format_event, stream_turn
+
+
+def parse_events(raw: bytes):
+    events = []
+    for block in raw.decode("utf-8").strip().split("\n\n"):
+        lines = block.split("\n")
+        name = lines[0][len("event: "):] if lines[0].startswith("event: ") else None
+        data = "\n".join(line[len("data: "):] for line in lines if line.startswith("data: "))
+        events.append((name, json.loads(data)))
+    return events
+
+
+def test_multiline_data_is_split_across_data_lines():
+    assert format_event("one\ntwo", event="note") == b"event: note\ndata: one\ndata: two\n\n"
+    assert list(chunk_text("a b c d e", words_per_chunk=2)) == ["a b ", "c d ", "e"]
+
+
+def test_reply_without_tokens_is_streamed_in_chunks():
+    written = []
+    stream_turn(written.append, lambda on_token: {"response": "one two three four", "action": "neutral"})
+
+    events = parse_events(b"".join(written))
+    assert [name for name, _ in events] == ["token", "token", "final"]
+    assert "".join(data["token"] for name, data in events if name == "token") == "one two three four"
+    assert events[-1][1]["action"] == "neutral"
+
+
+def test_streamed_tokens_are_not_repeated_and_errors_become_events():
+    def run_turn(on_token):
+        on_token("Hi")
+        on_token(" there")
+        return {"response": "Hi there"}
+
+    written = []
+    stream_turn(written.append, run_turn)
+    assert [data for name, data in parse_events(b"".join(written)) if name == "token"] == [{"token": "Hi"}, {"token": " there"}]
+
+    def failing_turn(on_token):
+        raise RuntimeError("agent exploded")
+
+    written = []
+    stream_turn(written.append, failing_turn)
+    assert parse_events(b"".join(written)) == [("error", {"error": "agent exploded"})]
+
+
+def test_async_stream_forwards_tokens_from_worker_threads():
+    async def run_turn(on_token):
+        def produce():
+            for token in ("a", "b", "c"):
+                on_token(token)
+        worker = threading.Thread(target=produce)
+        worker.start()
+        await asyncio.get_running_loop().run_in_executor(None, worker.join)
+        return {"response": "abc"}
+
+    async def collect():
+        return b"".join([chunk async for chunk in astream_turn(run_turn)])
+
+    events = parse_events(asyncio.run(collect()))
+    assert [data.get("token") for name, data in events if name == "token"] == ["a", "b", "c"]
+    assert events[-1] == ("final", {"response": "abc"})
+
+
+def test_final_answer_handler_skips_the_reasoning_steps():
+    pytest.importorskip("langchain")
+    from streaming_callbacks import FinalAnswerStreamHandler
+
+    sent = []
+    handler = FinalAnswerStreamHandler(sent.append)
+    thinking, answering = uuid.uuid4(), uuid.uuid4()
+
+    handler.on_llm_start({}, [], run_id=thinking)
+    for token in ("Thought: look up", "\nAction: CustomerLookup"):
+        handler.on_llm_new_token(token, run_id=thinking)
+    handler.on_llm_end(None, run_id=thinking)
+
+    handler.on_llm_start({}, [], run_id=answering)
+    for token in ("Thought: done\nFinal", " Answer", ":", " Here is", " a discount."):
+        handler.on_llm_new_token(token, run_id=answering)
+    handler.on_llm_end(None, run_id=answering)
+
+    assert "".join(sent) == "Here is a discount."
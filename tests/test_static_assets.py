@@ -0,0 +1,129 @@
+import gzip
+import http.client
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import static_assets
+from static_assets import AssetCache, accepted_encodings, send_asset
+
+SCRIPT = ("console.log('churn dashboard');\n" * 100).encode("utf-8")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "assets" / "index-abc123.js").write_bytes(SCRIPT)
+    (tmp_path / "index.html").write_text("<!doctype html><div id=root></div>")
+    (tmp_path / "model.bin").write_bytes(bytes(range(256)) * 8)
+    return AssetCache(tmp_path, check_interval=0)
+
+
+@pytest.fixture
+def serve(cache):
+    """GET against a real socket, answered by send_asset from cache"""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            asset = cache.get(self.path)
+            if asset is None:
+                self.send_error(404)
+                return
+            send_asset(self, asset)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def get(path, **headers):
+        conn = http.client.HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+        conn.request("GET", path, headers={name.replace("_", "-"): value for name, value in headers.items()})
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response, body
+
+    yield get
+    server.shutdown()
+    server.server_close()
+
+
+def test_accept_encoding_q_values():
+    assert accepted_encodings("gzip;q=0.5, br, identity;q=0") == {"gzip": 0.5, "br": 1.0, "identity": 0.0}
+    assert accepted_encodings("gzip;q=oops") == {"gzip": 0.0}
+
+
+def test_negotiation_prefers_br_then_gzip(cache):
+    asset = cache.get("/assets/index-abc123.js")
+    assert gzip.decompress(asset.variants["gzip"]) == SCRIPT
+    asset.variants["br"] = b"brotli body"
+
+    assert asset.negotiate("gzip, br") == "br"
+    assert asset.negotiate("gzip, br;q=0") == "gzip"
+    assert asset.negotiate("*") == "br"
+    assert asset.negotiate("identity") == "identity"
+    assert asset.negotiate("") == "identity"
+    assert cache.get("/index.html").negotiate("gzip, br") == "identity"
+
+
+def test_gzip_response_carries_its_own_etag(serve):
+    response, body = serve("/assets/index-abc123.js?v=1", Accept_Encoding="gzip")
+    assert response.status == 200
+    assert response.getheader("Content-Encoding") == "gzip"
+    assert response.getheader("Vary") == "Accept-Encoding"
+    assert response.getheader("Cache-Control") == static_assets.IMMUTABLE_CACHE_CONTROL
+    assert response.getheader("ETag").endswith('-gzip"')
+    assert gzip.decompress(body) == SCRIPT
+
+    response, body = serve("/assets/index-abc123.js")
+    assert response.getheader("Content-Encoding") is None
+    assert body == SCRIPT and response.getheader("Content-type") == "application/javascript"
+
+
+def test_validators_answer_304(serve, cache):
+    response, _ = serve("/index.html")
+    etag, last_modified = response.getheader("ETag"), response.getheader("Last-Modified")
+    assert response.getheader("Cache-Control") == static_assets.REVALIDATE_CACHE_CONTROL
+
+    response, body = serve("/index.html", If_None_Match=f'"other", W/{etag}')
+    assert response.status == 304 and body == b""
+    assert serve("/index.html", If_Modified_Since=last_modified)[0].status == 304
+    assert serve("/index.html", If_None_Match='"other"', If_Modified_Since=last_modified)[0].status == 200
+    older = formatdate(cache.get("/index.html").mtime - 60, usegmt=True)
+    assert serve("/index.html", If_Modified_Since=older)[0].status == 200
+    assert serve("/index.html", If_Modified_Since="yesterday")[0].status == 200
+
+    # Any encoding's tag validates, since they share one source file
+    gzip_etag = serve("/assets/index-abc123.js", Accept_Encoding="gzip")[0].getheader("ETag")
+    assert serve("/assets/index-abc123.js", If_None_Match=gzip_etag)[0].status == 304
+
+
+def test_big_files_are_sent_from_disk(tmp_path, monkeypatch, serve, cache):
+    monkeypatch.setattr(static_assets, "SENDFILE_MIN_BYTES", 1024)
+    asset = cache.get("/model.bin")
+    assert asset.variants == {"identity": None}
+
+    response, body = serve("/model.bin", Accept_Encoding="gzip")
+    assert response.status == 200 and response.getheader("Content-Encoding") is None
+    assert response.getheader("Content-Length") == "2048"
+    assert body == (tmp_path / "model.bin").read_bytes()
+
+
+def test_rebuilt_and_deleted_files_are_noticed(tmp_path, cache):
+    old = cache.get("/index.html")
+    (tmp_path / "index.html").write_text("<!doctype html><p>rebuilt</p>")
+    new = cache.get("/index.html")
+    assert new is not old and new.etag != old.etag
+
+    (tmp_path / "index.html").unlink()
+    assert cache.get("/index.html") is None
+    assert cache.get("/../etc/passwd") is None
+
+
+def test_generated_pages_are_served_like_files(cache):
+    page = cache.add_page("/dashboard", "<h1>Dashboard</h1>" * 100)
+    assert cache.get("/dashboard?tab=churn") is page
+    assert "gzip" in page.variants and page.content_type.startswith("text/html")
@@ -0,0 +1,54 @@
+import pytest
+
+from telemetry import LatencyHistogram, LatencyRecorder, WindowedHistogram, route_label
+
+
+def test_percentiles_stay_within_bucket_error():
+    histogram = LatencyHistogram()
+    for ms in range(1, 1001):
+        histogram.record(float(ms))
+
+    assert histogram.percentile(50) == pytest.approx(500, rel=0.05)
+    assert histogram.percentile(95) == pytest.approx(950, rel=0.05)
+    assert histogram.percentile(99) == pytest.approx(990, rel=0.05)
+    assert histogram.percentile(100) <= histogram.max_ms == 1000
+    summary = histogram.summary()
+    assert summary["count"] == 1000 and summary["avg_ms"] == 500.5
+
+
+def test_tiny_and_huge_latencies_land_in_the_end_buckets():
+    histogram = LatencyHistogram()
+    histogram.record(0.0)
+    histogram.record(10 ** 9)
+    assert histogram.counts[0] == 1 and histogram.counts[-1] == 1
+    assert LatencyHistogram().summary()["p99_ms"] == 0.0
+
+
+def test_recent_window_drops_old_slices():
+    series = WindowedHistogram(window_seconds=60, slice_seconds=10)
+    series.record(5.0, now=1000)
+    series.record(7.0, now=1055)
+
+    assert series.recent(now=1055).count == 2
+    assert series.recent(now=1065).count == 1
+    assert series.recent(now=2000).count == 0
+    assert series.total.count == 2
+
+
+def test_recorder_summarizes_each_dimension():
+    recorder = LatencyRecorder()
+    recorder.record_endpoint("/api/chat", 12.0)
+    recorder.record_action("retention", 30.0)
+    recorder.record_action("retention", 50.0)
+
+    summary = recorder.summary()
+    assert summary["endpoints"]["/api/chat"]["total"]["count"] == 1
+    assert summary["actions"]["retention"]["recent"]["max_ms"] == 50.0
+    assert summary["stages"] == {}
+
+
+def test_route_label_collapses_per_user_paths():
+    assert route_label("/api/customer/user_001?debug=1") == "/api/customer/{id}"
+    assert route_label("/assets/index-abc123.js") == "/assets/*"
+    assert route_label("/api/metrics/actions?window=60") == "/api/metrics/actions"
+    assert route_label("/some/react/route") == "/"
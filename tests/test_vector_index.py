@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_community")
+pytest.importorskip("faiss")
+
+from langchain.schema import Document
+
+from benchmarks.fake_llm import FakeEmbeddings
+from vector_index import load_or_build_vectorstore
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    def __init__(self):
+        super().__init__(latency_ms=0)
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return super().embed_documents(texts)
+
+
+def documents(*texts):
+    return [Document(page_content=text, metadata={"user_id": f"user_{i}"}) for i, text in enumerate(texts)]
+
+
+def test_unchanged_documents_load_from_disk(tmp_path):
+    docs = documents("basic plan, low usage", "premium plan, heavy api use")
+    load_or_build_vectorstore(docs, CountingEmbeddings(), index_dir=tmp_path)
+
+    embeddings = CountingEmbeddings()
+    store = load_or_build_vectorstore(docs, embeddings, index_dir=tmp_path)
+
+    assert embeddings.embedded == []
+    assert store.similarity_search("premium plan, heavy api use", k=1)[0].metadata == {"user_id": "user_1"}
+
+
+def test_only_changed_documents_are_embedded(tmp_path):
+    load_or_build_vectorstore(documents("alpha", "beta", "gamma"), CountingEmbeddings(), index_dir=tmp_path)
+
+    embeddings = CountingEmbeddings()
+    store = load_or_build_vectorstore(documents("alpha", "beta", "delta"), embeddings, index_dir=tmp_path)
+
+    assert embeddings.embedded == ["delta"]
+    assert store.index.ntotal == 3
+    # The superseded index is removed once the new one is in place
+    assert len([path for path in tmp_path.iterdir() if path.is_dir()]) == 1
+
+
+def test_another_model_does_not_reuse_vectors(tmp_path):
+    docs = documents("alpha", "beta")
+    load_or_build_vectorstore(docs, CountingEmbeddings(), index_dir=tmp_path)
+
+    embeddings = CountingEmbeddings()
+    load_or_build_vectorstore(docs, embeddings, model_name="other-model", index_dir=tmp_path)
+
+    assert embeddings.embedded == ["alpha", "beta"]
@@ -0,0 +1,112 @@
+import os
+import queue
+import signal
+import threading
+import logging
+from http.server import HTTPServer
+
+from prometheus_metrics import HTTP_REJECTED
+
+logger = logging.getLogger(__name__)
+
+HOST = os.getenv("HOST", "localhost")
+PORT = int(os.getenv("PORT", "8000"))
+
+# Requests handled in parallel, and connections allowed to wait for a worker
+HTTP_WORKERS = int(os.getenv("HTTP_WORKERS", "16"))
+HTTP_QUEUE_SIZE = int(os.getenv("HTTP_QUEUE_SIZE", "128"))
+
+_BUSY_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: 12\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+    b"Server busy\n"
+)
+
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """HTTPServer that hands accepted connections to a fixed pool of worker threads
+
+    A slow request (e.g. a multi-second agent run) only occupies one worker,
+    so health checks, metrics polls and static assets keep flowing. When every
+    worker is busy and the queue is full, new connections get an immediate 503
+    instead of piling up without bound.
+    """
+
+    def __init__(self, server_address, handler_class, workers: int = HTTP_WORKERS, queue_size: int = HTTP_QUEUE_SIZE):
+        super().__init__(server_address, handler_class)
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        # One slot per running or waiting connection; bounds the backlog
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        self._requests = queue.Queue()
+        self._threads = []
+        # Connections a handler has handed to another thread (e.g. a long-lived event stream)
+        self._detached = set()
+        self._detached_lock = threading.Lock()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"http-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            logger.warning(f"Request queue full, rejecting {client_address[0]}")
+            HTTP_REJECTED.inc()
+            try:
+                request.sendall(_BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        self._requests.put((request, client_address))
+
+    def _work(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+                self._slots.release()
+
+    def detach(self, request):
+        """Keep request open after its handler returns; whoever took it over closes it"""
+        with self._detached_lock:
+            self._detached.add(request)
+
+    def shutdown_request(self, request):
+        with self._detached_lock:
+            if request in self._detached:
+                self._detached.discard(request)
+                return
+        super().shutdown_request(request)
+
+    def queue_depth(self) -> int:
+        return self._requests.qsize()
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._threads:
+            self._requests.put(None)
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+
+def _exit_on_sigterm(signum, frame):
+    raise SystemExit(0)
+
+
+def make_server(handler_class, host: str = HOST, port: int = PORT, workers: int = HTTP_WORKERS, queue_size: int = HTTP_QUEUE_SIZE) -> ThreadPoolHTTPServer:
+    # Exit through SystemExit on SIGTERM so atexit hooks (e.g. the conversation log writer) still run
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    return ThreadPoolHTTPServer((host, port), handler_class, workers=workers, queue_size=queue_size)
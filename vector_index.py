@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import shutil
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = Path(os.getenv("VECTOR_INDEX_DIR", "vector_index"))
+
+
+def embedding_model_name(embeddings) -> str:
+    return getattr(embeddings, "model", None) or type(embeddings).__name__
+
+
+def document_hash(doc: Document) -> str:
+    """Stable hash of a rendered document's text and metadata"""
+    payload = json.dumps({"page_content": doc.page_content, "metadata": doc.metadata}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def index_key(doc_hashes: List[str], model_name: str) -> str:
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    for doc_hash in doc_hashes:
+        digest.update(doc_hash.encode("ascii"))
+    return digest.hexdigest()[:32]
+
+
+def _latest_pointer(index_dir: Path, model_name: str) -> Path:
+    slug = hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:12]
+    return index_dir / f"latest-{slug}.json"
+
+
+def _previous_vectors(index_dir: Path, model_name: str) -> Dict[str, List[float]]:
+    """Vectors from the last index built with this model, keyed by document hash"""
+    pointer = _latest_pointer(index_dir, model_name)
+    if not pointer.exists():
+        return {}
+    try:
+        previous = index_dir / json.loads(pointer.read_text())["key"]
+        manifest = json.loads((previous / "manifest.json").read_text())
+        index = faiss.read_index(str(previous / "index.faiss"))
+        if index.ntotal != len(manifest["doc_hashes"]):
+            return {}
+        vectors = index.reconstruct_n(0, index.ntotal)
+        return {doc_hash: vectors[i].tolist() for i, doc_hash in enumerate(manifest["doc_hashes"])}
+    except Exception as e:
+        logger.warning(f"Could not reuse previous vector index: {e}")
+        return {}
+
+
+# Load a saved FAISS index for these documents, or build and save one
+def load_or_build_vectorstore(docs: List[Document], embeddings, model_name: Optional[str] = None, index_dir: Path = INDEX_DIR) -> FAISS:
+    """Reuse the on-disk index when documents and model are unchanged; otherwise embed only new documents"""
+    model_name = model_name or embedding_model_name(embeddings)
+    doc_hashes = [document_hash(doc) for doc in docs]
+    key = index_key(doc_hashes, model_name)
+    target = index_dir / key
+
+    if (target / "manifest.json").exists():
+        try:
+            store = FAISS.load_local(str(target), embeddings, allow_dangerous_deserialization=True)
+            logger.info(f"Loaded vector index {key} ({len(docs)} documents) from disk")
+            return store
+        except Exception as e:
+            logger.warning(f"Saved vector index {key} unreadable, rebuilding: {e}")
+
+    reusable = _previous_vectors(index_dir, model_name)
+    missing = [i for i, doc_hash in enumerate(doc_hashes) if doc_hash not in reusable]
+    logger.info(f"Building vector index {key}: embedding {len(missing)} of {len(docs)} documents")
+    fresh = embeddings.embed_documents([docs[i].page_content for i in missing]) if missing else []
+    fresh_by_position = dict(zip(missing, fresh))
+
+    text_embeddings = []
+    for i, doc in enumerate(docs):
+        vector = fresh_by_position[i] if i in fresh_by_position else reusable[doc_hashes[i]]
+        text_embeddings.append((doc.page_content, vector))
+    store = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=[doc.metadata for doc in docs])
+
+    # Write to a temp dir and rename so a crash never leaves a half-written index behind
+    index_dir.mkdir(parents=True, exist_ok=True)
+    tmp = index_dir / f".{key}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    store.save_local(str(tmp))
+    (tmp / "manifest.json").write_text(json.dumps({"model": model_name, "key": key, "doc_hashes": doc_hashes}))
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+    pointer = _latest_pointer(index_dir, model_name)
+    previous_key = json.loads(pointer.read_text()).get("key") if pointer.exists() else None
+    pointer.write_text(json.dumps({"key": key}))
+    if previous_key and previous_key != key:
+        shutil.rmtree(index_dir / previous_key, ignore_errors=True)
+
+    return store